@@ -0,0 +1,64 @@
+"""论坛帖子列表基准测试：OFFSET 分页与游标分页在深页上的耗时对比
+
+paginate() 每页都统计总数并跳过前面的所有行；游标分页沿复合索引从上一页末尾继续读取。
+运行: python benchmarks/bench_forum_listing.py
+"""
+
+import os
+import random
+from datetime import datetime, timedelta
+
+from common import create_benchmark_app, timed
+from bench_forum_unread import seed
+
+NUM_POSTS = 100_000
+PER_PAGE = 20
+PAGES = [1, 100, 1_000, 4_000]
+REPEATS = 20
+
+
+def main():
+    app, db_path = create_benchmark_app()
+    try:
+        from src.database import db
+        from src.models.forum import ForumPost
+        from src.utils.pagination import keyset_page
+
+        random.seed(15)
+        start = datetime(2025, 1, 1)
+        with app.app_context():
+            course_id, student_ids = seed(20)
+            db.session.execute(ForumPost.__table__.insert(), [
+                {'course_id': course_id, 'user_id': random.choice(student_ids), 'title': f'Post {i}',
+                 'content': 'Benchmark post', 'created_at': start + timedelta(seconds=i),
+                 'is_pinned': i % 5000 == 0, 'reply_count': 0}
+                for i in range(NUM_POSTS)
+            ])
+            db.session.commit()
+
+            columns = [ForumPost.is_pinned, ForumPost.created_at, ForumPost.id]
+            query = ForumPost.query.filter_by(course_id=course_id)
+            # 预先走一遍游标，记录每个目标页的起始游标
+            cursors = {}
+            cursor = None
+            for page in range(1, max(PAGES) + 1):
+                if page in PAGES:
+                    cursors[page] = cursor
+                _, cursor = keyset_page(query, columns, cursor=cursor, limit=PER_PAGE, descending=True)
+
+            print(f'{"page":>6} {"offset_ms":>11} {"cursor_ms":>11}')
+            for page in PAGES:
+                with timed() as offset:
+                    for _ in range(REPEATS):
+                        query.order_by(ForumPost.is_pinned.desc(), ForumPost.created_at.desc())\
+                            .paginate(page=page, per_page=PER_PAGE, error_out=False)
+                with timed() as keyset:
+                    for _ in range(REPEATS):
+                        keyset_page(query, columns, cursor=cursors[page], limit=PER_PAGE, descending=True)
+                print(f'{page:>6} {offset["ms"] / REPEATS:>11.2f} {keyset["ms"] / REPEATS:>11.2f}')
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""论坛搜索基准测试：对比原来的 LIKE '%q%' 扫描与全文索引搜索
+
+原实现只搜索帖子标题和正文；索引搜索同时覆盖回复并返回排序、高亮和总数。
+运行: python benchmarks/bench_forum_search.py
+"""
+
+import os
+import random
+from datetime import datetime, timedelta
+
+from common import create_benchmark_app, timed
+from bench_forum_unread import seed
+
+POST_COUNTS = [1_000, 10_000, 50_000]
+REPLIES_PER_POST = 3
+SEARCHES = 50
+WORDS = ['recursion', 'pointer', 'array', 'closure', 'lambda', 'graph', 'heap', 'queue',
+         'stack', 'tree', 'hash', 'sort', 'search', 'matrix', 'vector', 'thread']
+
+
+def sentence(words=12):
+    return ' '.join(random.choice(WORDS) + str(random.randint(0, 500)) for _ in range(words))
+
+
+def grow_forum(course_id, author_ids, target_posts, existing_posts, start):
+    from src.database import db
+    from src.models.forum import ForumPost, ForumReply
+
+    needed = target_posts - existing_posts
+    db.session.execute(ForumPost.__table__.insert(), [
+        {'course_id': course_id, 'user_id': random.choice(author_ids), 'title': sentence(4),
+         'content': sentence(), 'created_at': start + timedelta(seconds=existing_posts + i),
+         'is_pinned': False, 'reply_count': REPLIES_PER_POST}
+        for i in range(needed)
+    ])
+    new_ids = [pid for (pid,) in db.session.query(ForumPost.id).filter(ForumPost.course_id == course_id)
+               .order_by(ForumPost.id.desc()).limit(needed)]
+    db.session.execute(ForumReply.__table__.insert(), [
+        {'post_id': pid, 'user_id': random.choice(author_ids), 'content': sentence(),
+         'created_at': start}
+        for pid in new_ids for _ in range(REPLIES_PER_POST)
+    ])
+    db.session.commit()
+
+
+def legacy_search(course_id, q):
+    """原实现：标题/正文 LIKE 扫描后分页"""
+    from sqlalchemy import or_
+    from src.models.forum import ForumPost
+    query = ForumPost.query.filter_by(course_id=course_id).filter(
+        or_(ForumPost.title.contains(q), ForumPost.content.contains(q))
+    ).order_by(ForumPost.is_pinned.desc(), ForumPost.created_at.desc())
+    page = query.paginate(page=1, per_page=20, error_out=False)
+    return page.total
+
+
+def main():
+    app, db_path = create_benchmark_app()
+    try:
+        from src.database import db
+        from src.utils.forum_search import rebuild_search_index, search_forum
+
+        random.seed(14)
+        start = datetime(2025, 1, 1)
+        with app.app_context():
+            course_id, student_ids = seed(50)
+            queries = [f'{random.choice(WORDS)}{random.randint(0, 500)}' for _ in range(SEARCHES)]
+
+            print(f'{"posts":>8} {"legacy_ms":>11} {"indexed_ms":>12}')
+            existing = 0
+            for target in POST_COUNTS:
+                grow_forum(course_id, student_ids, target, existing, start)
+                existing = target
+                # 批量插入绕过了模型事件，这里重建索引
+                rebuild_search_index([course_id])
+                db.session.commit()
+
+                with timed() as legacy:
+                    for q in queries:
+                        legacy_search(course_id, q)
+                with timed() as indexed:
+                    for q in queries:
+                        search_forum(course_id, q)
+                print(f'{target:>8} {legacy["ms"] / SEARCHES:>11.2f} {indexed["ms"] / SEARCHES:>12.2f}')
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""论坛未读检查基准测试：论坛增长到5万条回复时检查耗时保持不变
+
+对比原来扫描帖子/回复表的 COUNT 查询与基于 ForumActivity 水位的主键查询。
+运行: python benchmarks/bench_forum_unread.py
+"""
+
+import os
+import random
+from datetime import datetime, timedelta
+
+from common import create_benchmark_app, timed
+
+REPLY_COUNTS = [0, 1_000, 10_000, 50_000]
+REPLIES_PER_POST = 20
+CHECKS = 200
+
+
+def seed(num_students):
+    from src.database import db
+    from src.models.user import User
+    from src.models.course import Course
+
+    teacher = User(username='bench_teacher', email='bench_teacher@example.com',
+                   full_name='Bench Teacher', role='teacher', password_hash='x')
+    db.session.add(teacher)
+    db.session.flush()
+    course = Course(course_code='FORUM', course_name='Forum Bench', teacher_id=teacher.id,
+                    semester='Fall', academic_year='2025-26')
+    db.session.add(course)
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'bench_forum_{i}', 'email': f'bench_forum_{i}@example.com',
+         'password_hash': 'x', 'role': 'student', 'full_name': f'Student {i}',
+         'created_at': datetime.utcnow()}
+        for i in range(num_students)
+    ])
+    db.session.commit()
+    student_ids = [row.id for row in User.query.filter(User.username.like('bench_forum_%'))]
+    return course.id, student_ids
+
+
+def grow_forum(course_id, author_ids, target_replies, existing_replies, start):
+    """批量插入帖子和回复直到回复数达到 target_replies"""
+    from src.database import db
+    from src.models.forum import ForumPost, ForumReply
+
+    needed = target_replies - existing_replies
+    if needed <= 0:
+        return
+    num_posts = max(1, needed // REPLIES_PER_POST)
+    db.session.execute(ForumPost.__table__.insert(), [
+        {'course_id': course_id, 'user_id': random.choice(author_ids), 'title': f'Post {i}',
+         'content': 'Benchmark post', 'created_at': start + timedelta(seconds=i),
+         'is_pinned': False, 'reply_count': 0}
+        for i in range(num_posts)
+    ])
+    post_ids = [pid for (pid,) in db.session.query(ForumPost.id).filter(ForumPost.course_id == course_id)]
+    db.session.execute(ForumReply.__table__.insert(), [
+        {'post_id': random.choice(post_ids), 'user_id': random.choice(author_ids),
+         'content': 'Benchmark reply', 'created_at': start + timedelta(seconds=existing_replies + i)}
+        for i in range(needed)
+    ])
+    db.session.commit()
+
+
+def legacy_unread(user_id, course_id, last_read_at):
+    """原实现：两条 COUNT 查询扫描帖子和回复"""
+    from src.models.forum import ForumPost, ForumReply
+    has_new_posts = ForumPost.query.filter(
+        ForumPost.course_id == course_id,
+        ForumPost.created_at > last_read_at,
+        ForumPost.user_id != user_id
+    ).count() > 0
+    has_new_replies = ForumReply.query.join(ForumPost).filter(
+        ForumPost.course_id == course_id,
+        ForumReply.created_at > last_read_at,
+        ForumReply.user_id != user_id
+    ).count() > 0
+    return has_new_posts or has_new_replies
+
+
+def main():
+    app, db_path = create_benchmark_app()
+    try:
+        from src.database import db
+        from src.models.forum import UserForumRead
+        from src.utils.forum_unread import forum_unread_status, rebuild_forum_activity
+
+        random.seed(12)
+        start = datetime(2025, 1, 1)
+        with app.app_context():
+            course_id, student_ids = seed(50)
+            reader = student_ids[0]
+            # 读者在所有内容之后阅读过，检查需要确认没有新内容（最坏情况）
+            db.session.add(UserForumRead(user_id=reader, course_id=course_id,
+                                         last_read_at=start + timedelta(days=365)))
+            db.session.commit()
+
+            print(f'{"replies":>10} {"legacy_ms":>12} {"watermark_ms":>14}')
+            existing = 0
+            for target in REPLY_COUNTS:
+                grow_forum(course_id, student_ids[1:], target, existing, start)
+                existing = max(existing, target)
+                # 批量插入绕过了模型事件，这里重建水位
+                rebuild_forum_activity([course_id])
+                db.session.commit()
+                last_read_at = db.session.query(UserForumRead.last_read_at).filter_by(
+                    user_id=reader, course_id=course_id).scalar()
+
+                with timed() as legacy:
+                    for _ in range(CHECKS):
+                        assert not legacy_unread(reader, course_id, last_read_at)
+                with timed() as watermark:
+                    for _ in range(CHECKS):
+                        assert not forum_unread_status(reader, [course_id])[course_id]['has_unread']
+                print(f'{target:>10} {legacy["ms"] / CHECKS:>12.3f} {watermark["ms"] / CHECKS:>14.3f}')
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""排行榜基准测试：SQL语句数不随学生人数增长
+
+运行: python benchmarks/bench_leaderboard.py
+"""
+
+import os
+from datetime import datetime
+
+from common import create_benchmark_app, QueryCounter, timed, login
+
+STUDENT_COUNTS = [50, 100, 200, 400]
+ACTIVITIES_PER_COURSE = 10
+
+
+def seed_course(num_students, tag):
+    """创建一门课程：num_students 名学生，每人回答所有活动"""
+    from src.database import db
+    from src.models.user import User
+    from src.models.course import Course, course_enrollments
+    from src.models.activity import Activity
+    from src.models.response import ActivityResponse
+
+    teacher = User(username=f'bench_teacher_{tag}', email=f'bench_teacher_{tag}@example.com',
+                   full_name='Bench Teacher', role='teacher', password_hash='x')
+    db.session.add(teacher)
+    db.session.flush()
+
+    course = Course(course_code=f'BENCH{tag}', course_name=f'Bench {tag}', teacher_id=teacher.id,
+                    semester='Fall', academic_year='2025-26')
+    db.session.add(course)
+    db.session.flush()
+
+    activities = [Activity(title=f'Quiz {i}', activity_type='quiz', course_id=course.id,
+                           creator_id=teacher.id, status='completed')
+                  for i in range(ACTIVITIES_PER_COURSE)]
+    db.session.add_all(activities)
+    db.session.flush()
+
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'bench_{tag}_{i}', 'email': f'bench_{tag}_{i}@example.com',
+         'password_hash': 'x', 'role': 'student', 'full_name': f'Student {i}',
+         'created_at': datetime.utcnow()}
+        for i in range(num_students)
+    ])
+    student_ids = [row.id for row in User.query.filter(User.username.like(f'bench_{tag}_%'))]
+
+    db.session.execute(course_enrollments.insert(), [
+        {'course_id': course.id, 'user_id': sid, 'enrolled_at': datetime.utcnow()}
+        for sid in student_ids
+    ])
+    db.session.execute(ActivityResponse.__table__.insert(), [
+        {'activity_id': activity.id, 'student_id': sid, 'response_data': {},
+         'score': float((sid * 7 + activity.id) % 100), 'submitted_at': datetime.utcnow()}
+        for activity in activities for sid in student_ids
+    ])
+    db.session.commit()
+    return teacher.id, course.id
+
+
+def main():
+    app, db_path = create_benchmark_app()
+    try:
+        from src.database import db
+        print(f'{"students":>10} {"statements":>12} {"time_ms":>10}')
+        for num_students in STUDENT_COUNTS:
+            with app.app_context():
+                teacher_id, course_id = seed_course(num_students, num_students)
+                engine = db.engine
+
+            client = app.test_client()
+            login(client, teacher_id)
+            client.get(f'/api/analytics/leaderboard/{course_id}')  # 预热
+
+            with QueryCounter(engine) as counter, timed() as elapsed:
+                response = client.get(f'/api/analytics/leaderboard/{course_id}')
+            assert response.status_code == 200, response.get_data(as_text=True)
+            assert len(response.get_json()['leaderboard']) == num_students
+            print(f'{num_students:>10} {counter.count:>12} {elapsed["ms"]:>10.1f}')
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
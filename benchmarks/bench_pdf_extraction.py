@@ -0,0 +1,73 @@
+"""PDF文本提取基准测试：旧的整文件 += 拼接、逐页流式、字符上限和并行提取的耗时对比
+
+运行: python benchmarks/bench_pdf_extraction.py
+"""
+
+import os
+import tempfile
+
+from common import timed
+
+NUM_PAGES = 400
+LINE = 'Lecture notes on algorithms and data structures with worked examples'
+
+
+def make_pdf(page_texts):
+    """生成每页一行文字的简单PDF（Helvetica），返回字节内容"""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in page_texts:
+        stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>')
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    output += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('latin-1')
+    output += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    return bytes(output)
+
+
+def legacy_extract(path):
+    import PyPDF2
+    text = ""
+    with open(path, 'rb') as file:
+        for page in PyPDF2.PdfReader(file).pages:
+            text += page.extract_text() + "\n"
+    return text
+
+
+def main():
+    from src.utils.document_text import read_pdf_text
+
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    with os.fdopen(fd, 'wb') as file:
+        file.write(make_pdf([f'{LINE} page {i}' for i in range(1, NUM_PAGES + 1)]))
+    try:
+        with timed() as legacy:
+            expected = legacy_extract(path)
+        with timed() as streaming:
+            assert read_pdf_text(path, parallel=False) == expected
+        with timed() as budget:
+            read_pdf_text(path, max_chars=2000)
+        with timed() as parallel:
+            assert read_pdf_text(path, parallel=True) == expected
+        print(f'pages={NUM_PAGES}')
+        print(f'legacy +=          {legacy["ms"]:>9.1f} ms')
+        print(f'streaming (mmap)   {streaming["ms"]:>9.1f} ms')
+        print(f'2000-char budget   {budget["ms"]:>9.1f} ms')
+        print(f'parallel           {parallel["ms"]:>9.1f} ms')
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""课程问答检索基准测试：旧的“每个文档前2000字符”上下文与检索前K个分块的对比
+
+统计发送给AI的资料字符数和检索耗时（首次查询包含建立索引）。
+运行: python benchmarks/bench_retrieval.py
+"""
+
+import os
+import random
+import tempfile
+
+from common import create_benchmark_app, timed
+from bench_forum_unread import seed
+
+NUM_DOCUMENTS = 40
+CHUNKS_PER_DOCUMENT = 200
+REPEATS = 50
+TOPICS = ['sorting', 'graphs', 'hashing', 'recursion', 'dynamic programming', '二分查找', '链表', '数据库索引']
+WORDS = 'algorithm data structure complexity memory pointer array tree node edge weight cache query'.split()
+
+
+def main():
+    app, db_path = create_benchmark_app()
+    app.config['RETRIEVAL_INDEX_DIR'] = tempfile.mkdtemp()
+    try:
+        from src.database import db
+        from src.models.document import Document, DocumentChunk
+        from src.ai.retrieval import retrieve_chunks
+
+        random.seed(23)
+        with app.app_context():
+            course_id, _ = seed(1)
+            for d in range(NUM_DOCUMENTS):
+                document = Document(course_id=course_id, uploader_id=1, filename=f'lecture{d}.pdf',
+                                    stored_filename=f'lecture{d}.pdf', file_path=f'{course_id}/lecture{d}.pdf',
+                                    file_size=1, file_type='pdf', title=f'Lecture {d}')
+                db.session.add(document)
+                db.session.flush()
+                db.session.execute(DocumentChunk.__table__.insert(), [
+                    {'document_id': document.id, 'course_id': course_id, 'chunk_index': c, 'page_number': c // 3 + 1,
+                     'content': f'{random.choice(TOPICS)} ' + ' '.join(random.choices(WORDS, k=150))}
+                    for c in range(CHUNKS_PER_DOCUMENT)
+                ])
+            db.session.commit()
+
+            legacy_chars = NUM_DOCUMENTS * 2000
+            for mode in ('none', 'hashed'):
+                app.config['RETRIEVAL_EMBEDDINGS'] = mode
+                app.extensions.pop('retrieval_indexes', None)
+                with timed() as first:
+                    retrieve_chunks(course_id, 'How does dynamic programming reuse results?')
+                with timed() as warm:
+                    for _ in range(REPEATS):
+                        chunks, _ = retrieve_chunks(course_id, '二分查找的复杂度是多少？')
+                context_chars = sum(len(chunk['content']) for chunk in chunks)
+                print(f'embeddings={mode:<6} chunks={NUM_DOCUMENTS * CHUNKS_PER_DOCUMENT} '
+                      f'build+query={first["ms"]:.1f}ms query={warm["ms"] / REPEATS:.2f}ms '
+                      f'context_chars={context_chars} (legacy {legacy_chars})')
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""用户活动时间序列基准测试：10万用户 × 36个月
+
+对比原来逐月遍历全部用户的实现与数据库分组统计的实现。
+运行: python benchmarks/bench_user_activity.py
+"""
+
+import calendar
+import os
+import random
+from datetime import datetime, timedelta
+
+from common import create_benchmark_app, QueryCounter, timed
+
+NUM_USERS = 100_000
+MONTHS = 36
+BATCH_SIZE = 10_000
+
+
+def seed_users(start_date, end_date):
+    """批量插入注册时间和最近登录时间随机分布的用户"""
+    from src.database import db
+    from src.models.user import User
+
+    random.seed(5241)
+    span = int((end_date - start_date).total_seconds())
+    for batch_start in range(0, NUM_USERS, BATCH_SIZE):
+        rows = []
+        for i in range(batch_start, min(batch_start + BATCH_SIZE, NUM_USERS)):
+            created_at = start_date + timedelta(seconds=random.randrange(span))
+            last_login = None
+            if random.random() < 0.7:
+                remaining = int((end_date - created_at).total_seconds()) or 1
+                last_login = created_at + timedelta(seconds=random.randrange(remaining))
+            rows.append({'username': f'bench_user_{i}', 'email': f'bench_user_{i}@example.com',
+                         'password_hash': 'x', 'role': 'student', 'full_name': f'User {i}',
+                         'created_at': created_at, 'last_login': last_login, 'is_active': True})
+        db.session.execute(User.__table__.insert(), rows)
+    db.session.commit()
+
+
+def legacy_series(start_date, end_date):
+    """原实现：加载全部用户后逐月扫描两遍"""
+    from src.models.user import User
+
+    users = User.query.with_entities(User.created_at, User.last_login).all()
+    series = []
+    cumulative_users = 0
+    month_start = start_date.replace(day=1)
+    while month_start <= end_date:
+        month_end = datetime(month_start.year, month_start.month,
+                             calendar.monthrange(month_start.year, month_start.month)[1], 23, 59, 59)
+        cumulative_users += sum(1 for user in users if month_start <= user.created_at <= month_end)
+        active = sum(1 for user in users
+                     if user.last_login and month_start <= user.last_login <= month_end)
+        series.append({'month': f'{month_start.year}-{month_start.month:02d}',
+                       'total_users': cumulative_users, 'active_users': active})
+        if month_start.month == 12:
+            month_start = month_start.replace(year=month_start.year + 1, month=1)
+        else:
+            month_start = month_start.replace(month=month_start.month + 1)
+    return series
+
+
+def main():
+    app, db_path = create_benchmark_app()
+    try:
+        from src.database import db
+        from src.utils.system_overview import compute_user_activity_series
+
+        end_date = datetime(2025, 12, 31, 23, 59, 59)
+        start_date = datetime(2023, 1, 1)
+        with app.app_context():
+            with timed() as elapsed:
+                seed_users(start_date, end_date)
+            print(f'seeded {NUM_USERS} users in {elapsed["ms"] / 1000:.1f}s')
+
+            with QueryCounter(db.engine) as counter, timed() as legacy_elapsed:
+                legacy = legacy_series(start_date, end_date)
+            print(f'{"legacy":>10}: {counter.count:>3} statements {legacy_elapsed["ms"]:>10.1f} ms')
+
+            for granularity in ('month', 'week', 'day'):
+                with QueryCounter(db.engine) as counter, timed() as elapsed:
+                    series = compute_user_activity_series(start_date, end_date, granularity)
+                print(f'{granularity:>10}: {counter.count:>3} statements {elapsed["ms"]:>10.1f} ms '
+                      f'({len(series)} buckets)')
+                if granularity == 'month':
+                    assert len(series) == MONTHS
+                    assert [(s['month'], s['total_users'], s['active_users']) for s in series] == \
+                        [(s['month'], s['total_users'], s['active_users']) for s in legacy]
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
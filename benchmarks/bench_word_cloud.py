@@ -0,0 +1,61 @@
+"""词云词频基准测试：每次读取全量解析响应与按水位增量合并的耗时对比
+
+模拟活动进行中教师页面反复刷新词云：每轮新增一批提交后读取一次前50个词。
+运行: python benchmarks/bench_word_cloud.py
+"""
+
+import os
+import random
+from collections import Counter
+
+from common import create_benchmark_app, timed
+from bench_forum_unread import seed
+
+NUM_STUDENTS = 5_000
+ROUNDS = 10
+VOCABULARY = ['Python', 'python ', '数据', '机器学习', 'AI', 'ＡＩ', 'Flask', '数据库', 'SQL', '算法',
+              '深度学习', 'web', 'API', '测试', 'Git'] + [f'term{i}' for i in range(500)]
+
+
+def main():
+    app, db_path = create_benchmark_app()
+    try:
+        from src.database import db
+        from src.models.activity import Activity
+        from src.models.response import ActivityResponse
+        from src.utils.word_cloud import response_terms, word_cloud_summary
+
+        random.seed(20)
+        with app.app_context():
+            course_id, student_ids = seed(NUM_STUDENTS)
+            activity = Activity(title='Word cloud', activity_type='word_cloud', course_id=course_id,
+                                creator_id=1, status='active', config={'max_words': 5, 'min_word_length': 2})
+            db.session.add(activity)
+            db.session.commit()
+
+            batch = NUM_STUDENTS // ROUNDS
+            print(f'{"responses":>10} {"full_ms":>9} {"incremental_ms":>15}')
+            for round_index in range(ROUNDS):
+                db.session.execute(ActivityResponse.__table__.insert(), [
+                    {'activity_id': activity.id, 'student_id': student_id,
+                     'response_data': {'words': random.sample(VOCABULARY, 5)}}
+                    for student_id in student_ids[round_index * batch:(round_index + 1) * batch]
+                ])
+                db.session.commit()
+
+                with timed() as full:
+                    counts = Counter()
+                    for (data,) in db.session.query(ActivityResponse.response_data)\
+                            .filter(ActivityResponse.activity_id == activity.id):
+                        counts.update(response_terms(data, 2, 5))
+                    full_top = counts.most_common(50)
+                with timed() as incremental:
+                    summary = word_cloud_summary(activity, 50)
+                assert [t['count'] for t in summary['terms']] == [c for _, c in full_top]
+                print(f'{summary["response_count"]:>10} {full["ms"]:>9.2f} {incremental["ms"]:>15.2f}')
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""基准测试公共工具：临时数据库应用与SQL语句计数"""
+
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+# 允许直接以 `python benchmarks/xxx.py` 运行
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# 各基准脚本从这里导入，与测试共用同一个实现
+from src.utils.query_counter import QueryCounter  # noqa: E402
+
+
+def create_benchmark_app():
+    """创建使用临时SQLite数据库的应用，返回 (app, 数据库文件路径)"""
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+    from main import create_app
+    app = create_app({'TESTING': True})
+    return app, db_path
+
+
+@contextmanager
+def timed():
+    """计时上下文，结果以毫秒存放在返回的字典中"""
+    result = {}
+    start = time.perf_counter()
+    yield result
+    result['ms'] = (time.perf_counter() - start) * 1000
+
+
+def login(client, user_id):
+    """为测试客户端设置登录会话"""
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
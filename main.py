@@ -5,8 +5,8 @@ from src.models.course import Course, course_enrollments
 from src.models.activity import Activity
 from src.models.response import ActivityResponse
 from src.models.analytics import Leaderboard, ActivityAnalytics
-from src.models.document import Document
-from src.models.forum import ForumPost, ForumReply, UserForumRead
+from src.models.document import Document, DocumentChunk
+from src.models.forum import ForumPost, ForumReply, UserForumRead, ForumActivity, ForumThreadRead
 from src.routes.auth import auth_bp
 from src.routes.course import course_bp
 from src.routes.activity import activity_bp
@@ -16,13 +16,18 @@ from src.routes.admin import admin_bp
 from src.routes.document import document_bp
 from src.routes.ai_qa import ai_qa_bp
 from src.routes.forum import forum_bp
+from src.routes.events import events_bp
+from src.utils.analytics_cache import init_analytics_cache
+from src.utils.events import init_events
+from src.utils.document_ingestion import init_ingestion
+from src.utils.storage import init_storage
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__, static_folder='src/static', template_folder='src/static')
     
     # 确保数据库目录存在（仅SQLite备用）
@@ -34,9 +39,25 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = 'smart-classroom-secret-key-2024'
     
+    # 额外配置（测试等），在初始化各项服务之前应用
+    if config:
+        app.config.update(config)
+    
     # 初始化数据库
     db.init_app(app)
     
+    # 初始化统计缓存
+    init_analytics_cache(app)
+    
+    # 初始化实时事件推送
+    init_events(app)
+    
+    # 初始化文件存储
+    init_storage(app)
+    
+    # 初始化文档处理流水线
+    init_ingestion(app)
+    
     # 注册蓝图
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(course_bp, url_prefix='/api/courses')
@@ -47,6 +68,7 @@ def create_app():
     app.register_blueprint(document_bp, url_prefix='/api/documents')
     app.register_blueprint(ai_qa_bp, url_prefix='/api/ai-qa')
     app.register_blueprint(forum_bp, url_prefix='/api/forum')
+    app.register_blueprint(events_bp, url_prefix='/api/events')
     
     # 主页路由
     @app.route('/')
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Database Migration Script: document text cache
+
+Adds the content_hash, extracted_text and text_extracted_at columns to
+document. Text is extracted and cached the first time a document is used
+for AI Q&A or activity generation; run this once after upgrading an
+existing database.
+"""
+
+from dotenv import load_dotenv
+from sqlalchemy import inspect, text
+from main import create_app
+from src.database import db
+
+# Load environment variables
+load_dotenv()
+
+NEW_COLUMNS = {
+    'content_hash': 'VARCHAR(64)',
+    'extracted_text': 'TEXT',
+    'text_extracted_at': 'TIMESTAMP',
+}
+
+
+def migrate():
+    app = create_app()
+
+    with app.app_context():
+        existing = {column['name'] for column in inspect(db.engine).get_columns('document')}
+        with db.engine.begin() as connection:
+            for name, definition in NEW_COLUMNS.items():
+                if name not in existing:
+                    connection.execute(text(f"ALTER TABLE document ADD COLUMN {name} {definition}"))
+                    print(f"Added column document.{name}")
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_document_content_hash ON document (content_hash)"
+            ))
+
+    print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
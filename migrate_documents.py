@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
-Migration script to upload existing local documents to Supabase storage
-and update database records.
+Migration script to upload existing local documents to the configured
+storage backend (Supabase by default) and update database records.
 """
 
 import os
@@ -13,16 +13,16 @@ sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
 from src.database import db
 from src.models.document import Document
-from src.utils.supabase_storage import supabase, BUCKET_NAME
+from src.utils.storage import get_storage
 from main import create_app
 
 def migrate_documents():
-    """Migrate existing documents from local storage to Supabase"""
+    """Migrate existing documents from local storage to the storage backend"""
     app = create_app()
     
     with app.app_context():
         documents = Document.query.all()
-        bucket = supabase.storage.from_(BUCKET_NAME)
+        storage = get_storage()
         
         migrated_count = 0
         failed_count = 0
@@ -40,27 +40,26 @@ def migrate_documents():
                 continue
             
             try:
-                # Read file data
-                with open(doc.file_path, 'rb') as f:
-                    file_data = f.read()
-                
-                # Upload to Supabase
-                supabase_path = f"{doc.course_id}/{doc.stored_filename}"
-                bucket.upload(
-                    supabase_path, 
-                    file_data, 
-                    file_options={"content-type": f"application/{doc.file_type}"}
-                )
+                # Upload to storage, streaming the file in chunks
+                local_path = doc.file_path
+                storage_path = f"{doc.course_id}/{doc.stored_filename}"
+                with open(local_path, 'rb') as f:
+                    storage.upload(
+                        storage_path,
+                        f,
+                        content_type=f"application/{doc.file_type}",
+                        size=os.path.getsize(local_path)
+                    )
                 
                 # Update database
-                doc.file_path = supabase_path
+                doc.file_path = storage_path
                 db.session.commit()
                 
                 # Optionally delete local file
-                os.remove(doc.file_path)
+                os.remove(local_path)
                 
                 migrated_count += 1
-                print(f"Migrated: {doc.filename} -> {supabase_path}")
+                print(f"Migrated: {doc.filename} -> {storage_path}")
                 
             except Exception as e:
                 print(f"Failed to migrate {doc.filename}: {str(e)}")
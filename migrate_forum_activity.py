@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Database Migration Script: forum activity watermarks
+
+Creates the forum_activity table and backfills one row per course from the
+existing forum posts and replies. New posts and replies keep the table up to
+date automatically; run this once after upgrading an existing database.
+Courses without a row are also backfilled lazily on the first unread check.
+"""
+
+from dotenv import load_dotenv
+from main import create_app
+from src.database import db
+from src.utils.forum_unread import rebuild_forum_activity
+
+# Load environment variables
+load_dotenv()
+
+
+def migrate():
+    app = create_app()  # create_app() also creates the missing table
+
+    with app.app_context():
+        count = rebuild_forum_activity()
+        db.session.commit()
+        print(f"Backfilled forum activity for {count} courses")
+
+    print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
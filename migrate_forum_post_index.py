@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Database Migration Script: forum post listing index
+
+Adds the composite index forum_post(course_id, is_pinned, created_at, id)
+used by cursor pagination of forum post listings. db.create_all() only
+creates indexes together with new tables, so run this once on an existing
+database.
+"""
+
+from dotenv import load_dotenv
+from main import create_app
+from src.database import db
+from src.models.forum import ForumPost
+
+# Load environment variables
+load_dotenv()
+
+
+def migrate():
+    app = create_app()
+
+    with app.app_context():
+        for index in ForumPost.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+            print(f"Ensured index {index.name}")
+
+    print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Database Migration Script: stored forum reply depth
+
+Adds the depth, root_reply_id and path columns to forum_reply and backfills
+them from the existing parent_reply_id chains. New replies get these values
+at insert time; run this once after upgrading an existing database.
+"""
+
+from dotenv import load_dotenv
+from sqlalchemy import inspect, text
+from main import create_app
+from src.database import db
+from src.utils.forum_threads import rebuild_reply_positions
+
+# Load environment variables
+load_dotenv()
+
+NEW_COLUMNS = {
+    'depth': 'INTEGER NOT NULL DEFAULT 0',
+    'root_reply_id': 'INTEGER',
+    'path': "TEXT NOT NULL DEFAULT ''",
+}
+
+
+def migrate():
+    app = create_app()
+
+    with app.app_context():
+        existing = {column['name'] for column in inspect(db.engine).get_columns('forum_reply')}
+        with db.engine.begin() as connection:
+            for name, definition in NEW_COLUMNS.items():
+                if name not in existing:
+                    connection.execute(text(f"ALTER TABLE forum_reply ADD COLUMN {name} {definition}"))
+                    print(f"Added column forum_reply.{name}")
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_forum_reply_root_reply_id ON forum_reply (root_reply_id)"
+            ))
+
+        count = rebuild_reply_positions()
+        db.session.commit()
+        print(f"Backfilled depth and path for {count} replies")
+
+    print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Database Migration Script: forum full-text search index
+
+Creates the forum_search_index table (a tsvector/GIN table on PostgreSQL, an
+FTS5 virtual table on SQLite) and indexes the existing forum posts and
+replies. New and edited content keeps the index up to date automatically;
+run this once after upgrading an existing database.
+"""
+
+from dotenv import load_dotenv
+from main import create_app
+from src.database import db
+from src.utils.forum_search import rebuild_search_index
+
+# Load environment variables
+load_dotenv()
+
+
+def migrate():
+    app = create_app()  # create_app() also creates the missing index table
+
+    with app.app_context():
+        count = rebuild_search_index()
+        db.session.commit()
+        print(f"Indexed {count} forum posts and replies")
+
+    print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
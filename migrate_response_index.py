@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Database Migration Script: activity response index
+
+Adds the composite index activity_response(activity_id, student_id) used by
+per-activity statistics and the duplicate-submission check. db.create_all()
+only creates indexes together with new tables, so run this once on an
+existing database.
+"""
+
+from dotenv import load_dotenv
+from main import create_app
+from src.database import db
+from src.models.response import ActivityResponse
+
+# Load environment variables
+load_dotenv()
+
+
+def migrate():
+    app = create_app()
+
+    with app.app_context():
+        for index in ActivityResponse.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+            print(f"Ensured index {index.name}")
+
+    print("Migration completed successfully!")
+
+
+if __name__ == '__main__':
+    migrate()
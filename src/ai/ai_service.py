@@ -337,6 +337,14 @@ class AIService:
                     context_text += f"\n  内容摘要：{content}\n"
                 context_text += "\n"
         
+        # 添加检索到的资料片段
+        chunks = course_context.get('chunks', [])
+        if chunks:
+            context_text += "\n与问题相关的资料片段：\n"
+            for i, chunk in enumerate(chunks, 1):
+                page = f"（第{chunk['page_number']}页）" if chunk.get('page_number') else ""
+                context_text += f"[{i}] {chunk.get('title', '未知')}{page}：\n{chunk.get('content', '')}\n\n"
+        
         # 添加活动信息
         if activities:
             context_text += "\n课程活动：\n"
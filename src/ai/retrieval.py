@@ -0,0 +1,238 @@
+"""课程资料检索
+
+AI问答不再把每个文档的前2000个字符全部放进提示词，而是在课程的文档分块（DocumentChunk）上
+检索与问题最相关的K个片段。
+
+- 默认使用BM25：英文按单词、中文按相邻两个字切分，倒排索引在进程内按课程缓存，
+  分块变化（文档重新处理、下架）后自动重建。
+- RETRIEVAL_EMBEDDINGS=hashed 时另外计算本地向量（词的哈希特征，不依赖外部模型），
+  按课程以 .npy 文件保存在 RETRIEVAL_INDEX_DIR 中，查询时内存映射读取，与BM25分数加权合并。
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from collections import Counter, OrderedDict
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+from src.database import app_data_path, db
+from src.models.document import Document, DocumentChunk
+
+DEFAULT_TOP_K = 6
+BM25_K1 = 1.5
+BM25_B = 0.75
+EMBEDDING_DIM = 512
+# 向量相似度在合并分数中的权重（BM25分数先按最高分归一化）
+EMBEDDING_WEIGHT = 0.5
+MAX_CACHED_COURSES = 64
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+|[\u3400-\u4dbf\u4e00-\u9fff]+')
+
+
+def tokenize(text):
+    """英文和数字按单词切分，中文按相邻两个字切分（单字保留）"""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(unicodedata.normalize('NFKC', text or '').lower()):
+        run = match.group()
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    """分块文本的BM25倒排索引，文档位置即分块在列表中的下标"""
+
+    def __init__(self, texts):
+        self.postings = {}
+        self.lengths = []
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings.setdefault(term, []).append((position, frequency))
+        total = len(self.lengths)
+        self.average_length = (sum(self.lengths) / total) if total else 1.0
+        self.idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def scores(self, terms):
+        """返回 {位置: 分数}，只包含至少命中一个词的分块"""
+        scores = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for position, frequency in postings:
+                norm = frequency + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[position] / self.average_length)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (BM25_K1 + 1) / norm
+        return scores
+
+
+def hashed_embedding(tokens, dim=EMBEDDING_DIM):
+    """词的哈希特征向量（L2归一化），用CRC32保证不同进程结果一致"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token, count in Counter(tokens).items():
+        code = zlib.crc32(token.encode('utf-8'))
+        vector[code % dim] += (1.0 if code & 0x80000000 else -1.0) * (1.0 + math.log(count))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class CourseIndex:
+    """单个课程的检索索引"""
+
+    def __init__(self, signature, chunk_ids, document_ids, texts):
+        self.signature = signature
+        self.chunk_ids = chunk_ids
+        self.document_ids = set(document_ids)
+        self.bm25 = BM25Index(texts)
+        self.embeddings = None
+
+    def top_positions(self, question, k):
+        terms = tokenize(question)
+        scores = self.bm25.scores(terms)
+        if self.embeddings is None:
+            return [position for position, _ in heapq.nlargest(k, scores.items(), key=lambda item: item[1])]
+
+        combined = np.asarray(self.embeddings @ hashed_embedding(terms)) * EMBEDDING_WEIGHT
+        if scores:
+            best = max(scores.values())
+            positions = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+            combined[positions] += np.fromiter(scores.values(), dtype=np.float32, count=len(scores)) / best
+        k = min(k, len(combined))
+        top = np.argpartition(-combined, k - 1)[:k]
+        return [int(position) for position in top[np.argsort(-combined[top])] if combined[position] > 0]
+
+
+class IndexRegistry:
+    """进程内的课程索引缓存（最近使用的保留）"""
+
+    def __init__(self, max_size=MAX_CACHED_COURSES):
+        self.max_size = max_size
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, course_id):
+        with self._lock:
+            index = self._indexes.get(course_id)
+            if index is not None:
+                self._indexes.move_to_end(course_id)
+            return index
+
+    def put(self, course_id, index):
+        with self._lock:
+            self._indexes[course_id] = index
+            self._indexes.move_to_end(course_id)
+            while len(self._indexes) > self.max_size:
+                self._indexes.popitem(last=False)
+
+
+def get_index_registry():
+    return current_app.extensions.setdefault('retrieval_indexes', IndexRegistry())
+
+
+def _embeddings_enabled():
+    return current_app.config.get('RETRIEVAL_EMBEDDINGS', os.environ.get('RETRIEVAL_EMBEDDINGS', 'none')) == 'hashed'
+
+
+def _index_dir(course_id):
+    # 默认放在数据库文件旁边或应用实例目录中，连接不同数据库的应用不会共用同一课程ID的索引
+    root = current_app.config.get('RETRIEVAL_INDEX_DIR') or app_data_path(current_app, 'retrieval')
+    return os.path.join(root, f'course_{course_id}')
+
+
+def _active_chunks(course_id):
+    return db.session.query(DocumentChunk).join(Document, Document.id == DocumentChunk.document_id)\
+        .filter(DocumentChunk.course_id == course_id, Document.is_active.is_(True))
+
+
+def _chunk_signature(course_id):
+    """课程当前可检索分块的特征（数量、最大ID、ID之和），分块变化后随之改变"""
+    count, max_id, id_sum = _active_chunks(course_id).with_entities(
+        func.count(DocumentChunk.id), func.max(DocumentChunk.id), func.sum(DocumentChunk.id)
+    ).one()
+    return [count, max_id or 0, int(id_sum or 0)]
+
+
+def _load_embeddings(course_id, signature, texts):
+    """读取磁盘上的向量矩阵（内存映射），不存在或已过期时重新计算并保存"""
+    directory = _index_dir(course_id)
+    matrix_path = os.path.join(directory, 'embeddings.npy')
+    meta_path = os.path.join(directory, 'meta.json')
+    try:
+        with open(meta_path) as meta_file:
+            if json.load(meta_file).get('signature') == signature:
+                return np.load(matrix_path, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(directory, exist_ok=True)
+    matrix = np.vstack([hashed_embedding(tokenize(text)) for text in texts]).astype(np.float32)
+    # 先写临时文件再替换，其他进程不会读到写了一半的文件
+    temp_path = f'{matrix_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as matrix_file:
+        np.save(matrix_file, matrix)
+    os.replace(temp_path, matrix_path)
+    temp_path = f'{meta_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as meta_file:
+        json.dump({'signature': signature, 'dim': EMBEDDING_DIM}, meta_file)
+    os.replace(temp_path, meta_path)
+    return np.load(matrix_path, mmap_mode='r')
+
+
+def get_course_index(course_id):
+    """获取课程的检索索引，分块有变化时重建；课程没有分块时返回None"""
+    signature = _chunk_signature(course_id)
+    if signature[0] == 0:
+        return None
+    registry = get_index_registry()
+    index = registry.get(course_id)
+    if index is not None and index.signature == signature:
+        return index
+
+    rows = _active_chunks(course_id).with_entities(
+        DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.content
+    ).order_by(DocumentChunk.id).all()
+    texts = [row.content for row in rows]
+    index = CourseIndex(signature, [row.id for row in rows], [row.document_id for row in rows], texts)
+    if _embeddings_enabled():
+        index.embeddings = _load_embeddings(course_id, signature, texts)
+    registry.put(course_id, index)
+    return index
+
+
+def retrieve_chunks(course_id, question, k=DEFAULT_TOP_K):
+    """检索与问题最相关的分块，返回 (分块列表, 已建立索引的文档ID集合)"""
+    index = get_course_index(course_id)
+    if index is None:
+        return [], set()
+    positions = index.top_positions(question, k)
+    if not positions:
+        return [], index.document_ids
+
+    ranked_ids = [index.chunk_ids[position] for position in positions]
+    rows = db.session.query(DocumentChunk, Document.title, Document.filename)\
+        .join(Document, Document.id == DocumentChunk.document_id)\
+        .filter(DocumentChunk.id.in_(ranked_ids)).all()
+    by_id = {chunk.id: (chunk, title or filename) for chunk, title, filename in rows}
+    chunks = []
+    for chunk_id in ranked_ids:
+        if chunk_id not in by_id:
+            continue
+        chunk, title = by_id[chunk_id]
+        item = chunk.to_dict()
+        item['title'] = title
+        chunks.append(item)
+    return chunks, index.document_ids
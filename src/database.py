@@ -1,4 +1,34 @@
+import hashlib
+import os
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.engine import make_url
 
 # 创建全局数据库实例
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+
+def database_key(app):
+    """当前数据库的标识（连接地址的哈希），区分同一主机上连接不同数据库的应用"""
+    return hashlib.sha256(app.config['SQLALCHEMY_DATABASE_URI'].encode('utf-8')).hexdigest()[:16]
+
+
+def app_data_path(app, name):
+    """应用本地数据文件（任务队列、索引等）的默认路径
+
+    SQLite数据库放在数据库文件旁边（以数据库文件名为前缀），其他数据库放在应用的实例目录中。
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+        return f'{os.path.splitext(os.path.abspath(url.database))[0]}_{name}'
+    return os.path.join(app.instance_path, name)
+
+
+def prepare_data_path(path):
+    """创建数据文件所在的目录；目录不可写（如无服务器平台的只读文件系统）时返回False"""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return False
+    return os.access(directory, os.W_OK)
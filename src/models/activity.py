@@ -30,6 +30,7 @@ class Activity(db.Model):
     
     # 关系
     responses = db.relationship('ActivityResponse', backref='activity', lazy=True, cascade='all, delete-orphan')
+    analytics = db.relationship('ActivityAnalytics', backref='activity', lazy=True, cascade='all, delete-orphan')
     
     def set_config(self, config_dict):
         """设置活动配置"""
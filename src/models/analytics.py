@@ -22,6 +22,10 @@ class Leaderboard(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 关系
+    course = db.relationship('Course', backref=db.backref('leaderboards', lazy=True, cascade='all, delete-orphan'))
+    entries = db.relationship('LeaderboardEntry', backref='leaderboard', lazy=True, cascade='all, delete-orphan')
+    
     def set_config(self, config_dict):
         """设置排行榜配置"""
         self.config = config_dict
@@ -30,6 +34,16 @@ class Leaderboard(db.Model):
         """获取排行榜配置"""
         return self.config or {}
     
+    def covers(self, moment):
+        """判断时间点是否落在排行榜的时间范围内"""
+        if moment is None:
+            return False
+        if self.start_date and moment < self.start_date:
+            return False
+        if self.end_date and moment > self.end_date:
+            return False
+        return True
+    
     def __repr__(self):
         return f'<Leaderboard {self.name}>'
     
@@ -40,7 +54,8 @@ class Leaderboard(db.Model):
             'course_name': self.course.course_name if self.course else None,
             'name': self.name,
             'description': self.description,
-            'config': self.get_config(),
+            # 物化的排名数据体积较大，不随配置一起返回
+            'config': {k: v for k, v in self.get_config().items() if k != 'standings'},
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
             'is_active': self.is_active,
@@ -48,6 +63,23 @@ class Leaderboard(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class LeaderboardEntry(db.Model):
+    """排行榜中单个学生的累计数据（名次在读取时计算）"""
+    __tablename__ = 'leaderboard_entry'
+    __table_args__ = (
+        db.UniqueConstraint('leaderboard_id', 'student_id', name='uq_leaderboard_entry_student'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    leaderboard_id = db.Column(db.Integer, db.ForeignKey('leaderboard.id'), nullable=False, index=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    participation_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0.0)
+    scored_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<LeaderboardEntry {self.leaderboard_id}:{self.student_id}>'
+
 class ActivityAnalytics(db.Model):
     """活动分析模型"""
     id = db.Column(db.Integer, primary_key=True)
@@ -18,26 +18,81 @@ class Course(db.Model):
     activities = db.relationship('Activity', backref='course', lazy=True, cascade='all, delete-orphan')
     forum_posts = db.relationship('ForumPost', backref='course', lazy=True, cascade='all, delete-orphan')
     forum_reads = db.relationship('UserForumRead', backref='course', lazy=True, cascade='all, delete-orphan')
+    forum_activity = db.relationship('ForumActivity', backref='course', lazy=True, uselist=False, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Course {self.course_code}: {self.course_name}>'
     
-    def to_dict(self):
+    def to_dict(self, summary=None):
+        """序列化课程；summary 为批量查询得到的教师姓名和计数，省略时按关系加载"""
+        if summary is None:
+            summary = {
+                'teacher_name': self.teacher.full_name if self.teacher else None,
+                'student_count': len(self.students),
+                'activity_count': len(self.activities)
+            }
         return {
             'id': self.id,
             'course_code': self.course_code,
             'course_name': self.course_name,
             'description': self.description,
             'teacher_id': self.teacher_id,
-            'teacher_name': self.teacher.full_name if self.teacher else None,
+            'teacher_name': summary['teacher_name'],
             'semester': self.semester,
             'academic_year': self.academic_year,
             'is_active': self.is_active,
-            'student_count': len(self.students),
-            'activity_count': len(self.activities),
+            'student_count': summary['student_count'],
+            'activity_count': summary['activity_count'],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+    
+    @staticmethod
+    def to_dict_list(courses):
+        """批量序列化课程列表：教师姓名、学生数和活动数由一条分组查询得到"""
+        from src.models.user import User
+        from src.models.activity import Activity
+        
+        course_ids = [course.id for course in courses]
+        if not course_ids:
+            return []
+        
+        student_counts = db.session.query(
+            course_enrollments.c.course_id.label('course_id'),
+            db.func.count().label('student_count')
+        ).filter(
+            course_enrollments.c.course_id.in_(course_ids)
+        ).group_by(course_enrollments.c.course_id).subquery()
+        
+        activity_counts = db.session.query(
+            Activity.course_id.label('course_id'),
+            db.func.count(Activity.id).label('activity_count')
+        ).filter(
+            Activity.course_id.in_(course_ids)
+        ).group_by(Activity.course_id).subquery()
+        
+        rows = db.session.query(
+            Course.id,
+            User.full_name,
+            db.func.coalesce(student_counts.c.student_count, 0),
+            db.func.coalesce(activity_counts.c.activity_count, 0)
+        ).outerjoin(
+            User, User.id == Course.teacher_id
+        ).outerjoin(
+            student_counts, student_counts.c.course_id == Course.id
+        ).outerjoin(
+            activity_counts, activity_counts.c.course_id == Course.id
+        ).filter(Course.id.in_(course_ids)).all()
+        
+        summaries = {
+            course_id: {
+                'teacher_name': teacher_name,
+                'student_count': student_count,
+                'activity_count': activity_count
+            }
+            for course_id, teacher_name, student_count, activity_count in rows
+        }
+        return [course.to_dict(summaries[course.id]) for course in courses]
 
 # 课程注册关联表
 course_enrollments = db.Table('course_enrollments',
@@ -17,12 +17,17 @@ class Document(db.Model):
     description = db.Column(db.Text, nullable=True)  # 文档描述
     is_active = db.Column(db.Boolean, default=True)  # 是否可用（下架功能）
     download_count = db.Column(db.Integer, default=0)  # 下载次数
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # 文件内容的SHA-256
+    # 提取的文本缓存（可能很大，列表查询不加载）
+    extracted_text = db.deferred(db.Column(db.Text, nullable=True))
+    text_extracted_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关系
-    course = db.relationship('Course', backref='documents', lazy=True)
+    course = db.relationship('Course', backref=db.backref('documents', lazy=True, cascade='all, delete-orphan'))
     uploader = db.relationship('User', backref='uploaded_documents', lazy=True)
+    chunks = db.relationship('DocumentChunk', backref='document', lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Document {self.filename} for Course {self.course_id}>'
@@ -48,3 +53,28 @@ class Document(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+
+class DocumentChunk(db.Model):
+    """文档文本分块（由文档处理流水线生成，用于检索）"""
+    __tablename__ = 'document_chunk'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False, index=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False, index=True)
+    chunk_index = db.Column(db.Integer, nullable=False)  # 在文档中的顺序
+    page_number = db.Column(db.Integer, nullable=True)  # 起始页码（从1开始，无分页的文档为空）
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DocumentChunk {self.document_id}#{self.chunk_index}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'course_id': self.course_id,
+            'chunk_index': self.chunk_index,
+            'page_number': self.page_number,
+            'content': self.content
+        }
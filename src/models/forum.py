@@ -1,5 +1,8 @@
+import sqlite3
 from src.database import db
 from datetime import datetime
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.dialects import postgresql, sqlite
 
 class ForumPost(db.Model):
     """论坛帖子模型"""
@@ -15,6 +18,12 @@ class ForumPost(db.Model):
     
     # 关系
     replies = db.relationship('ForumReply', backref='post', lazy=True, cascade='all, delete-orphan', order_by='ForumReply.created_at')
+    thread_reads = db.relationship('ForumThreadRead', backref='post', lazy=True, cascade='all, delete-orphan')
+    
+    # 帖子列表排序键（置顶、创建时间、ID）的复合索引，游标分页按索引顺序读取
+    __table_args__ = (
+        db.Index('ix_forum_post_course_listing', 'course_id', 'is_pinned', 'created_at', 'id'),
+    )
     
     def __repr__(self):
         return f'<ForumPost {self.title} by {self.user.full_name if self.user else "Unknown"}>'
@@ -42,6 +51,10 @@ class ForumReply(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     parent_reply_id = db.Column(db.Integer, db.ForeignKey('forum_reply.id'), nullable=True)  # 用于线程化回复
+    # 插入时根据父回复确定：嵌套深度（0为顶级回复）、所属顶级回复ID（顶级回复为空）、祖先路径
+    depth = db.Column(db.Integer, nullable=False, default=0)
+    root_reply_id = db.Column(db.Integer, nullable=True, index=True)
+    path = db.Column(db.Text, nullable=False, default='')
     
     # 关系
     child_replies = db.relationship('ForumReply', backref=db.backref('parent_reply', remote_side=[id]), lazy=True, cascade='all, delete-orphan', order_by='ForumReply.created_at')
@@ -58,8 +71,14 @@ class ForumReply(db.Model):
             'content': self.content,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'parent_reply_id': self.parent_reply_id
+            'parent_reply_id': self.parent_reply_id,
+            'depth': self.depth
         }
+    
+    @property
+    def child_path(self):
+        """子回复的祖先路径；所有后代回复的 path 都以此为前缀"""
+        return f"{self.path or ''}{self.id:010d}/"
 
 class UserForumRead(db.Model):
     """用户论坛阅读记录 - 用于通知"""
@@ -80,4 +99,301 @@ class UserForumRead(db.Model):
             'user_id': self.user_id,
             'course_id': self.course_id,
             'last_read_at': self.last_read_at.isoformat() if self.last_read_at else None
-        }
\ No newline at end of file
+        }
+
+class ForumThreadRead(db.Model):
+    """用户帖子阅读记录 - 按帖子记录已读状态
+
+    存在记录即表示帖子本身已读；id 不大于 read_up_to_reply_id 的回复已读，
+    read_reply_ids 保存高于该水位但已单独阅读的少量回复ID。
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('forum_post.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+    read_up_to_reply_id = db.Column(db.Integer, nullable=False, default=0)
+    read_reply_ids = db.Column(db.JSON, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'post_id', name='unique_user_post_read'),)
+    
+    def __repr__(self):
+        return f"ForumThreadRead(user={self.user_id}, post={self.post_id})"
+    
+    def get_read_reply_ids(self):
+        """获取水位之上已读的回复ID集合"""
+        return set(self.read_reply_ids or [])
+    
+    def is_reply_read(self, reply_id):
+        return reply_id <= (self.read_up_to_reply_id or 0) or reply_id in self.get_read_reply_ids()
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'post_id': self.post_id,
+            'course_id': self.course_id,
+            'read_up_to_reply_id': self.read_up_to_reply_id,
+            'read_reply_ids': sorted(self.get_read_reply_ids()),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class ForumActivity(db.Model):
+    """课程论坛最新动态水位 - 用于O(1)未读检查
+
+    记录课程论坛最后一次发帖/回复的时间和作者，以及最后一位作者之外的其他作者的最新发言时间，
+    这样排除用户自己的内容时也只需比较时间戳。由 ForumPost/ForumReply 的插入事件维护。
+    """
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    last_activity_at = db.Column(db.DateTime, nullable=True)
+    # 作者ID只用于比较，不加外键，删除用户时不受影响
+    last_author_id = db.Column(db.Integer, nullable=True)
+    prev_activity_at = db.Column(db.DateTime, nullable=True)
+    prev_author_id = db.Column(db.Integer, nullable=True)
+    
+    def __repr__(self):
+        return f"ForumActivity(course={self.course_id}, last={self.last_activity_at})"
+    
+    def has_unread_for(self, user_id, last_read_at):
+        """判断在 last_read_at 之后是否有其他用户的新内容（last_read_at 为空表示从未阅读）"""
+        if self.last_author_id != user_id:
+            latest = self.last_activity_at
+        else:
+            latest = self.prev_activity_at
+        if latest is None:
+            return False
+        return last_read_at is None or latest > last_read_at
+    
+    def to_dict(self):
+        return {
+            'course_id': self.course_id,
+            'last_activity_at': self.last_activity_at.isoformat() if self.last_activity_at else None,
+            'last_author_id': self.last_author_id,
+            'prev_activity_at': self.prev_activity_at.isoformat() if self.prev_activity_at else None,
+            'prev_author_id': self.prev_author_id
+        }
+
+
+def advance_watermark(state, author_id, created_at):
+    """把一条新内容合并进水位状态 (last_at, last_author, prev_at, prev_author)
+
+    last 为最新内容；prev 为最后一位作者之外的其他作者的最新内容。
+    """
+    last_at, last_author, prev_at, prev_author = state
+    if last_at is None:
+        return created_at, author_id, prev_at, prev_author
+    if author_id == last_author:
+        return max(last_at, created_at), last_author, prev_at, prev_author
+    if created_at >= last_at:
+        return created_at, author_id, last_at, last_author
+    # 时间早于当前最新内容（并发插入乱序），只可能更新 prev
+    if prev_at is None or created_at > prev_at:
+        return last_at, last_author, created_at, author_id
+    return state
+
+
+def _record_forum_activity(connection, course_id, author_id, created_at):
+    """在同一事务内更新课程论坛水位"""
+    table = ForumActivity.__table__
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    connection.execute(dialect.insert(table).values(course_id=course_id).on_conflict_do_nothing())
+
+    row = connection.execute(
+        select(table.c.last_activity_at, table.c.last_author_id,
+                  table.c.prev_activity_at, table.c.prev_author_id)
+        .where(table.c.course_id == course_id).with_for_update()
+    ).one()
+    state = tuple(row)
+    new_state = advance_watermark(state, author_id, created_at)
+    if new_state != state:
+        connection.execute(table.update().where(table.c.course_id == course_id).values(
+            last_activity_at=new_state[0], last_author_id=new_state[1],
+            prev_activity_at=new_state[2], prev_author_id=new_state[3]
+        ))
+
+
+@event.listens_for(ForumPost, 'after_insert')
+def _post_inserted(mapper, connection, target):
+    _record_forum_activity(connection, target.course_id, target.user_id, target.created_at)
+
+
+@event.listens_for(ForumReply, 'before_insert')
+def _set_reply_position(mapper, connection, target):
+    """根据父回复写入深度、顶级回复ID和祖先路径，之后无需递归查找"""
+    if target.parent_reply_id is None:
+        target.depth, target.root_reply_id, target.path = 0, None, ''
+        return
+    # 父回复已在会话中时直接使用，否则查询父回复的一行
+    parent = inspect(target).dict.get('parent_reply')
+    if parent is None or parent.id != target.parent_reply_id:
+        table = ForumReply.__table__
+        parent = connection.execute(
+            select(table.c.id, table.c.depth, table.c.root_reply_id, table.c.path)
+            .where(table.c.id == target.parent_reply_id)
+        ).one()
+    target.depth = (parent.depth or 0) + 1
+    target.root_reply_id = parent.root_reply_id or parent.id
+    target.path = f"{parent.path or ''}{parent.id:010d}/"
+
+
+@event.listens_for(ForumReply, 'after_insert')
+def _reply_inserted(mapper, connection, target):
+    course_id = connection.execute(
+        select(ForumPost.__table__.c.course_id).where(ForumPost.__table__.c.id == target.post_id)
+    ).scalar()
+    if course_id is not None:
+        _record_forum_activity(connection, course_id, target.user_id, target.created_at)
+
+
+# ---------------------------------------------------------------------------
+# 论坛全文搜索索引：每个帖子/回复一行（帖子含标题），由模型事件在同一事务内维护。
+# PostgreSQL 使用 tsvector 生成列 + GIN 索引；SQLite 使用 FTS5 虚拟表（trigram 分词，
+# 支持中文和子串匹配）。表在 db.create_all() 时一并创建。
+# ---------------------------------------------------------------------------
+
+FORUM_SEARCH_TABLE = 'forum_search_index'
+
+# 软删除后替换的内容，对应的帖子和回复不进入索引
+DELETED_CONTENT_MESSAGES = frozenset({
+    'The post is deleted by the teacher',
+    'The post is deleted by owner',
+    'The reply is deleted by the teacher',
+    'The reply is deleted by owner',
+})
+
+# trigram 分词需要 SQLite 3.34+，更早的版本退回 unicode61 分词
+SQLITE_TRIGRAM = sqlite3.sqlite_version_info >= (3, 34, 0)
+
+_POSTGRES_SEARCH_DDL = (
+    f"""CREATE TABLE IF NOT EXISTS {FORUM_SEARCH_TABLE} (
+        doc_type VARCHAR(10) NOT NULL,
+        doc_id INTEGER NOT NULL,
+        post_id INTEGER NOT NULL,
+        course_id INTEGER NOT NULL,
+        title TEXT NOT NULL DEFAULT '',
+        body TEXT NOT NULL DEFAULT '',
+        document tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+        ) STORED,
+        PRIMARY KEY (doc_type, doc_id)
+    )""",
+    f"CREATE INDEX IF NOT EXISTS ix_{FORUM_SEARCH_TABLE}_document ON {FORUM_SEARCH_TABLE} USING GIN (document)",
+    f"CREATE INDEX IF NOT EXISTS ix_{FORUM_SEARCH_TABLE}_course ON {FORUM_SEARCH_TABLE} (course_id)",
+    # 中日韩文字的搜索使用 ILIKE，由 pg_trgm 的 trigram 索引支持；没有安装或无权创建扩展时跳过
+    f"""DO $$
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS ix_{FORUM_SEARCH_TABLE}_title_trgm
+            ON {FORUM_SEARCH_TABLE} USING GIN (title gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS ix_{FORUM_SEARCH_TABLE}_body_trgm
+            ON {FORUM_SEARCH_TABLE} USING GIN (body gin_trgm_ops);
+    EXCEPTION WHEN OTHERS THEN
+        RAISE NOTICE USING MESSAGE = 'pg_trgm indexes not created: ' || SQLERRM;
+    END $$""",
+)
+
+_SQLITE_SEARCH_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FORUM_SEARCH_TABLE} USING fts5(
+        title, body, doc_type UNINDEXED, doc_id UNINDEXED, post_id UNINDEXED, course_id UNINDEXED,
+        tokenize = '{"trigram" if SQLITE_TRIGRAM else "unicode61"}'
+    )""",
+)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    statements = _POSTGRES_SEARCH_DDL if connection.dialect.name == 'postgresql' else _SQLITE_SEARCH_DDL
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FORUM_SEARCH_TABLE}")
+
+
+def search_rowid(doc_type, doc_id):
+    """SQLite 索引行的 rowid：帖子为偶数、回复为奇数，按主键直接定位"""
+    return doc_id * 2 + (1 if doc_type == 'reply' else 0)
+
+
+def index_search_document(connection, doc_type, doc_id, post_id, course_id, title, body):
+    """写入或更新一条搜索索引记录"""
+    if body in DELETED_CONTENT_MESSAGES:
+        # 软删除的帖子标题和内容都不再可搜索
+        title, body = '', ''
+    params = {'doc_type': doc_type, 'doc_id': doc_id, 'post_id': post_id,
+              'course_id': course_id, 'title': title or '', 'body': body or ''}
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(
+            f"INSERT INTO {FORUM_SEARCH_TABLE} (doc_type, doc_id, post_id, course_id, title, body) "
+            "VALUES (:doc_type, :doc_id, :post_id, :course_id, :title, :body) "
+            "ON CONFLICT (doc_type, doc_id) DO UPDATE SET post_id = excluded.post_id, "
+            "course_id = excluded.course_id, title = excluded.title, body = excluded.body"
+        ), params)
+    else:
+        params['rowid'] = search_rowid(doc_type, doc_id)
+        connection.execute(text(f"DELETE FROM {FORUM_SEARCH_TABLE} WHERE rowid = :rowid"), params)
+        connection.execute(text(
+            f"INSERT INTO {FORUM_SEARCH_TABLE} (rowid, doc_type, doc_id, post_id, course_id, title, body) "
+            "VALUES (:rowid, :doc_type, :doc_id, :post_id, :course_id, :title, :body)"
+        ), params)
+
+
+def remove_search_document(connection, doc_type, doc_id):
+    """删除一条搜索索引记录"""
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(
+            f"DELETE FROM {FORUM_SEARCH_TABLE} WHERE doc_type = :doc_type AND doc_id = :doc_id"
+        ), {'doc_type': doc_type, 'doc_id': doc_id})
+    else:
+        connection.execute(text(f"DELETE FROM {FORUM_SEARCH_TABLE} WHERE rowid = :rowid"),
+                           {'rowid': search_rowid(doc_type, doc_id)})
+
+
+def _content_changed(target, *keys):
+    state = inspect(target)
+    return any(state.attrs[key].history.has_changes() for key in keys)
+
+
+def _index_reply(connection, target):
+    course_id = connection.execute(
+        select(ForumPost.__table__.c.course_id).where(ForumPost.__table__.c.id == target.post_id)
+    ).scalar()
+    if course_id is not None:
+        index_search_document(connection, 'reply', target.id, target.post_id, course_id, '', target.content)
+
+
+@event.listens_for(ForumPost, 'after_insert')
+def _post_search_inserted(mapper, connection, target):
+    index_search_document(connection, 'post', target.id, target.id, target.course_id,
+                          target.title, target.content)
+
+
+@event.listens_for(ForumPost, 'after_update')
+def _post_search_updated(mapper, connection, target):
+    # 回复计数等字段变化不需要重建索引
+    if _content_changed(target, 'title', 'content', 'course_id'):
+        index_search_document(connection, 'post', target.id, target.id, target.course_id,
+                              target.title, target.content)
+
+
+@event.listens_for(ForumPost, 'after_delete')
+def _post_search_deleted(mapper, connection, target):
+    remove_search_document(connection, 'post', target.id)
+
+
+@event.listens_for(ForumReply, 'after_insert')
+def _reply_search_inserted(mapper, connection, target):
+    _index_reply(connection, target)
+
+
+@event.listens_for(ForumReply, 'after_update')
+def _reply_search_updated(mapper, connection, target):
+    if _content_changed(target, 'content', 'post_id'):
+        _index_reply(connection, target)
+
+
+@event.listens_for(ForumReply, 'after_delete')
+def _reply_search_deleted(mapper, connection, target):
+    remove_search_document(connection, 'reply', target.id)
@@ -23,6 +23,11 @@ class ActivityResponse(db.Model):
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     time_spent_seconds = db.Column(db.Integer, nullable=True)
     
+    # 按活动统计和查重（每个学生每个活动一份响应）都按这两列过滤
+    __table_args__ = (
+        db.Index('ix_activity_response_activity_student', 'activity_id', 'student_id'),
+    )
+    
     def set_response_data(self, data_dict):
         """设置响应数据"""
         self.response_data = data_dict
@@ -3,6 +3,10 @@ from src.models.activity import Activity
 from src.models.course import Course, course_enrollments
 from src.models.user import User
 from src.database import db
+from src.utils.leaderboard import invalidate_standings
+from src.utils.activity_analytics import refresh_activity_snapshot
+from src.utils.word_cloud import word_cloud_summary, get_word_cloud_registry
+from src.utils.live_tally import seed_tally, drop_tally, get_live_tally, tally_summary
 from src.ai.ai_service import AIService
 from datetime import datetime
 import os
@@ -156,8 +160,11 @@ def delete_activity(activity_id):
     if activity.creator_id != user.id:
         return jsonify({'error': '权限不足'}), 403
     
+    # 活动的响应随之删除，排行榜需要重建
+    invalidate_standings(activity.course_id)
     db.session.delete(activity)
     db.session.commit()
+    get_word_cloud_registry().drop(activity_id)
     
     return jsonify({'message': '活动删除成功'})
 
@@ -181,6 +188,9 @@ def start_activity(activity_id):
     
     db.session.commit()
     
+    # 建立实时统计，之后的提交直接累加
+    seed_tally(activity)
+    
     return jsonify({
         'message': '活动已开始',
         'activity': activity.to_dict()
@@ -200,13 +210,56 @@ def stop_activity(activity_id):
     activity.status = 'completed'
     activity.end_time = datetime.utcnow()
     
+    # 活动结束时生成分析快照，之后查看分析数据无需重新统计
+    refresh_activity_snapshot(activity.id)
+    
     db.session.commit()
+    drop_tally(activity.id)
     
     return jsonify({
         'message': '活动已结束',
         'activity': activity.to_dict()
     })
 
+@activity_bp.route('/<int:activity_id>/tally', methods=['GET'])
+def get_activity_tally(activity_id):
+    """获取进行中活动的实时统计（选项计数、分数段、响应数）"""
+    user = require_auth()
+    if not user or user.role not in ['teacher', 'admin']:
+        return jsonify({'error': '权限不足'}), 403
+    
+    activity = Activity.query.get_or_404(activity_id)
+    if user.role == 'teacher' and activity.creator_id != user.id and activity.course.teacher_id != user.id:
+        return jsonify({'error': '权限不足'}), 403
+    
+    if activity.status != 'active':
+        return jsonify({'error': '活动未进行中'}), 400
+    
+    return jsonify(tally_summary(get_live_tally(activity)))
+
+@activity_bp.route('/<int:activity_id>/word-cloud', methods=['GET'])
+def get_word_cloud(activity_id):
+    """获取词云活动的词频统计（频率最高的关键词）"""
+    user = require_auth()
+    if not user or user.role not in ['teacher', 'admin']:
+        return jsonify({'error': '权限不足'}), 403
+    
+    activity = Activity.query.get_or_404(activity_id)
+    if user.role == 'teacher' and activity.creator_id != user.id and activity.course.teacher_id != user.id:
+        return jsonify({'error': '权限不足'}), 403
+    
+    if activity.activity_type != 'word_cloud':
+        return jsonify({'error': '该活动不是词云活动'}), 400
+    
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({'error': '无效的数量'}), 400
+    if limit < 1:
+        return jsonify({'error': '无效的数量'}), 400
+    
+    return jsonify(word_cloud_summary(activity, min(limit, 200)))
+
 @activity_bp.route('/ai/generate', methods=['POST'])
 def generate_ai_activity():
     """AI生成活动（仅教师）"""
@@ -227,7 +280,7 @@ def generate_ai_activity():
     
     # 处理选中的文档
     document_ids = data.get('document_ids', [])
-    document_content = ""
+    document_parts = []
     if document_ids:
         from src.models.document import Document
         
@@ -236,7 +289,10 @@ def generate_ai_activity():
             if document and document.course_id == course_id and document.is_active:
                 content = extract_document_content(document)
                 if content:
-                    document_content += f"\n\n文档：{document.title or document.filename}\n{content}"
+                    document_parts.append(f"\n\n文档：{document.title or document.filename}\n{content}")
+        # 保存首次提取的文档文本
+        db.session.commit()
+    document_content = ''.join(document_parts)
     
     # 合并文档内容到课程内容
     full_course_content = data['course_content']
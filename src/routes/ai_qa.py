@@ -5,13 +5,15 @@ from src.models.activity import Activity
 from src.models.user import User
 from src.database import db
 from src.ai.ai_service import AIService
-import os
-import PyPDF2
-import docx
+from src.ai.retrieval import retrieve_chunks
+from src.utils.document_text import TEXT_FILE_TYPES, get_document_text, read_pdf_text, read_docx_text, read_txt_text
 
 ai_qa_bp = Blueprint('ai_qa', __name__)
 ai_service = AIService()
 
+# 尚未分块的文档在问答中只使用开头部分（与 AIService.answer_question 的摘要长度一致）
+DOCUMENT_EXCERPT_CHARS = 2000
+
 def require_auth():
     """验证用户是否已登录"""
     user_id = session.get('user_id')
@@ -19,54 +21,42 @@ def require_auth():
         return None
     return User.query.get(user_id)
 
-def extract_text_from_pdf(file_path):
-    """从PDF文件提取文本"""
+def extract_text_from_pdf(file_path, first_page=1, last_page=None, max_chars=None):
+    """从PDF文件提取文本（内存映射逐页读取，可指定页码范围和字符上限）"""
     try:
-        text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+        return read_pdf_text(file_path, first_page=first_page, last_page=last_page, max_chars=max_chars)
     except Exception as e:
         return f"无法读取PDF文件: {str(e)}"
 
 def extract_text_from_docx(file_path):
     """从DOCX文件提取文本"""
     try:
-        doc = docx.Document(file_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        return text
+        return read_docx_text(file_path)
     except Exception as e:
         return f"无法读取DOCX文件: {str(e)}"
 
 def extract_text_from_txt(file_path):
     """从TXT文件提取文本"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        return read_txt_text(file_path)
     except Exception as e:
         return f"无法读取TXT文件: {str(e)}"
 
-def extract_document_content(document):
-    """提取文档内容"""
-    if not os.path.exists(document.file_path):
-        return None
-    
+def extract_document_content(document, max_chars=None):
+    """提取文档内容（PDF/DOCX/TXT 首次完整提取后缓存在文档记录中）
+
+    max_chars 表示只需要开头部分：文本尚未缓存时只解析到字符上限为止。
+    """
     file_ext = document.file_type.lower()
-    content = None
-    
-    if file_ext == 'pdf':
-        content = extract_text_from_pdf(document.file_path)
-    elif file_ext in ['docx', 'doc']:
-        content = extract_text_from_docx(document.file_path)
-    elif file_ext == 'txt':
-        content = extract_text_from_txt(document.file_path)
-    else:
+    if file_ext not in TEXT_FILE_TYPES:
         # 对于其他格式，返回基本信息
-        content = f"文档：{document.title or document.filename}\n描述：{document.description or '无描述'}"
+        return f"文档：{document.title or document.filename}\n描述：{document.description or '无描述'}"
     
-    return content
+    try:
+        content = get_document_text(document, max_chars)
+    except Exception as e:
+        return f"无法读取{file_ext.upper()}文件: {str(e)}"
+    return content[:max_chars] if content is not None and max_chars is not None else content
 
 @ai_qa_bp.route('/course/<int:course_id>/ask', methods=['POST'])
 def ask_question(course_id):
@@ -115,17 +105,19 @@ def ask_question(course_id):
             # 教师可以看到所有文档
             documents = documents_query.all()
         
-        # 提取文档内容
+        # 只发送与问题最相关的资料片段；尚未完成分块的文档仍提取全文摘要
+        chunks, indexed_document_ids = retrieve_chunks(course_id, question)
         documents_data = []
         for doc in documents:
-            content = extract_document_content(doc)
             documents_data.append({
                 'id': doc.id,
                 'title': doc.title or doc.filename,
                 'filename': doc.filename,
                 'description': doc.description,
-                'content': content
+                'content': None if doc.id in indexed_document_ids else extract_document_content(doc, DOCUMENT_EXCERPT_CHARS)
             })
+        # 保存首次提取的文档文本
+        db.session.commit()
         
         # 获取课程活动
         activities = Activity.query.filter_by(course_id=course_id).all()
@@ -144,6 +136,7 @@ def ask_question(course_id):
         course_context = {
             'course_info': course_info,
             'documents': documents_data,
+            'chunks': chunks,
             'activities': activities_data
         }
         
@@ -1,10 +1,18 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, make_response
 from src.models.analytics import Leaderboard, ActivityAnalytics
-from src.models.course import Course
+from src.models.course import Course, course_enrollments
 from src.models.activity import Activity
 from src.models.response import ActivityResponse
 from src.models.user import User
 from src.database import db
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from src.utils.system_overview import parse_date_range, compute_course_breakdown
+from src.utils.leaderboard import get_course_leaderboard, read_standings, rebuild_standings
+from src.utils.analytics_cache import cached_analytics
+from src.utils.activity_analytics import refresh_activity_snapshot, snapshot_summary
+from src.utils.response_listing import wants_pagination, list_activity_responses
+from src.utils.student_dashboard import student_dashboard_etag, compute_student_dashboard
 from datetime import datetime, timedelta
 
 analytics_bp = Blueprint('analytics', __name__)
@@ -17,6 +25,7 @@ def require_auth():
     return User.query.get(user_id)
 
 @analytics_bp.route('/dashboard', methods=['GET'])
+@cached_analytics(per_user=True)
 def get_dashboard_data():
     """获取仪表板数据"""
     user = require_auth()
@@ -65,35 +74,17 @@ def get_dashboard_data():
         })
     
     elif user.role == 'student':
-        # 学生仪表板数据
-        enrolled_courses = Course.query.join(Course.students).filter(
-            User.id == user.id
-        ).all()
+        # 学生仪表板数据：数据未变化时返回304
+        etag = student_dashboard_etag(user.id)
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
         
-        # 参与的活动
-        participated_activities = db.session.query(Activity)\
-            .join(ActivityResponse)\
-            .filter(ActivityResponse.student_id == user.id)\
-            .all()
-        
-        # 统计信息
-        total_courses = len(enrolled_courses)
-        total_participations = len(participated_activities)
-        avg_score = db.session.query(db.func.avg(ActivityResponse.score)).filter(ActivityResponse.student_id == user.id).scalar() or 0
-        
-        # 最近参与的活动
-        recent_responses = ActivityResponse.query.filter_by(student_id=user.id)\
-            .order_by(ActivityResponse.submitted_at.desc()).limit(5).all()
-        
-        return jsonify({
-            'role': 'student',
-            'stats': {
-                'total_courses': total_courses,
-                'total_participations': total_participations,
-                'avg_score': round(avg_score, 2)
-            },
-            'recent_responses': [response.to_dict() for response in recent_responses]
-        })
+        response = make_response(jsonify(compute_student_dashboard(user.id)))
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     
     elif user.role == 'admin':
         # 管理员仪表板数据
@@ -146,46 +137,98 @@ def get_leaderboard(course_id):
         return jsonify({'error': '权限不足'}), 403
     elif user.role == 'student':
         # 检查学生是否注册了该课程
-        enrollment = db.session.query(course.students).filter(
-            User.id == user.id
+        enrollment = db.session.query(course_enrollments).filter(
+            course_enrollments.c.course_id == course_id,
+            course_enrollments.c.user_id == user.id
         ).first()
         if not enrollment:
             return jsonify({'error': '未注册该课程'}), 403
     
-    # 计算学生积分
-    student_scores = []
-    for student in course.students:
-        # 计算参与度分数
-        participation_count = ActivityResponse.query.join(Activity)\
-            .filter(Activity.course_id == course_id)\
-            .filter(ActivityResponse.student_id == student.id)\
-            .count()
-        
-        # 计算平均分数
-        avg_score = db.session.query(db.func.avg(ActivityResponse.score))\
-            .join(Activity)\
-            .filter(Activity.course_id == course_id)\
-            .filter(ActivityResponse.student_id == student.id)\
-            .scalar() or 0
-        
-        total_score = participation_count * 10 + avg_score
-        
-        student_scores.append({
-            'student_id': student.id,
-            'student_name': student.full_name,
-            'student_id_number': student.student_id,
-            'participation_count': participation_count,
-            'avg_score': round(avg_score, 2),
-            'total_score': round(total_score, 2)
-        })
+    # 分页参数（默认返回全部学生）
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if (limit is not None and limit < 0) or offset < 0:
+        return jsonify({'error': '分页参数无效'}), 400
     
-    # 按总分排序
-    student_scores.sort(key=lambda x: x['total_score'], reverse=True)
+    # 读取物化排名（指定 leaderboard_id 时使用对应时间范围的排行榜）
+    leaderboard = get_course_leaderboard(course_id, request.args.get('leaderboard_id', type=int))
+    if not leaderboard:
+        return jsonify({'error': '排行榜不存在'}), 404
     
-    return jsonify({
+    student_id = user.id if user.role == 'student' else None
+    student_scores, total, my_standing = read_standings(leaderboard, limit=limit, offset=offset, student_id=student_id)
+    
+    result = {
         'course_name': course.course_name,
-        'leaderboard': student_scores
-    })
+        'leaderboard_id': leaderboard.id,
+        'leaderboard_name': leaderboard.name,
+        'start_date': leaderboard.start_date.isoformat() if leaderboard.start_date else None,
+        'end_date': leaderboard.end_date.isoformat() if leaderboard.end_date else None,
+        'leaderboard': student_scores,
+        'total': total,
+        'limit': limit,
+        'offset': offset
+    }
+    
+    # 学生额外返回自己的名次
+    if user.role == 'student':
+        result['my_rank'] = my_standing
+    
+    return jsonify(result)
+
+@analytics_bp.route('/leaderboard/<int:course_id>/boards', methods=['GET'])
+def get_leaderboard_boards(course_id):
+    """获取课程的所有排行榜（仅教师）"""
+    user = require_auth()
+    if not user or user.role != 'teacher':
+        return jsonify({'error': '权限不足'}), 403
+    
+    course = Course.query.get_or_404(course_id)
+    if course.teacher_id != user.id:
+        return jsonify({'error': '权限不足'}), 403
+    
+    boards = Leaderboard.query.filter_by(course_id=course_id).order_by(Leaderboard.id).all()
+    return jsonify([board.to_dict() for board in boards])
+
+@analytics_bp.route('/leaderboard/<int:course_id>/boards', methods=['POST'])
+def create_leaderboard_board(course_id):
+    """创建带时间范围的排行榜（仅教师）"""
+    user = require_auth()
+    if not user or user.role != 'teacher':
+        return jsonify({'error': '权限不足'}), 403
+    
+    course = Course.query.get_or_404(course_id)
+    if course.teacher_id != user.id:
+        return jsonify({'error': '权限不足'}), 403
+    
+    data = request.get_json()
+    if not data or not data.get('name'):
+        return jsonify({'error': '缺少必要字段'}), 400
+    
+    try:
+        start_date = datetime.fromisoformat(data['start_date']) if data.get('start_date') else None
+        end_date = datetime.fromisoformat(data['end_date']) if data.get('end_date') else None
+    except ValueError:
+        return jsonify({'error': '无效的日期格式，请使用ISO格式 (YYYY-MM-DDTHH:MM:SS)'}), 400
+    if start_date and end_date and start_date > end_date:
+        return jsonify({'error': '开始日期不能晚于结束日期'}), 400
+    
+    leaderboard = Leaderboard(
+        course_id=course_id,
+        name=data['name'],
+        description=data.get('description', ''),
+        start_date=start_date,
+        end_date=end_date,
+        config={}
+    )
+    db.session.add(leaderboard)
+    rebuild_standings(leaderboard)
+    db.session.commit()
+    
+    return jsonify({
+        'message': '排行榜创建成功',
+        'leaderboard': leaderboard.to_dict()
+    }), 201
 
 @analytics_bp.route('/activity/<int:activity_id>/analytics', methods=['GET'])
 def get_activity_analytics(activity_id):
@@ -198,35 +241,31 @@ def get_activity_analytics(activity_id):
     if activity.creator_id != user.id:
         return jsonify({'error': '权限不足'}), 403
     
-    responses = ActivityResponse.query.filter_by(activity_id=activity_id).all()
-    
-    # 基本统计
-    total_responses = len(responses)
-    avg_score = sum(r.score or 0 for r in responses) / total_responses if total_responses > 0 else 0
-    avg_time = sum(r.time_spent_seconds or 0 for r in responses) / total_responses if total_responses > 0 else 0
+    # 读取分析快照，响应数变化时才更新并提交；refresh=true 时全量重算
+    rebuild = request.args.get('refresh', 'false').lower() == 'true'
+    snapshot = refresh_activity_snapshot(activity_id, rebuild=rebuild)
+    if snapshot in db.session.new or snapshot in db.session.dirty:
+        db.session.commit()
     
-    # 按时间分布
-    time_distribution = {}
-    for response in responses:
-        hour = response.submitted_at.hour
-        time_distribution[hour] = time_distribution.get(hour, 0) + 1
+    result = {'activity_title': activity.title}
+    result.update(snapshot_summary(snapshot))
     
-    # 分数分布
-    score_distribution = {}
-    for response in responses:
-        if response.score is not None:
-            score_range = int(response.score // 10) * 10
-            score_distribution[f"{score_range}-{score_range+9}"] = score_distribution.get(f"{score_range}-{score_range+9}", 0) + 1
+    if wants_pagination(request.args):
+        # 分页列表：按 (submitted_at, id) 游标分页，fields= 指定返回字段
+        try:
+            page = list_activity_responses(activity, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        result['responses'] = page['responses']
+        result['next_cursor'] = page['next_cursor']
+    elif request.args.get('include_responses', 'true').lower() != 'false':
+        # 预加载学生信息，避免逐条序列化时懒加载
+        responses = ActivityResponse.query.filter_by(activity_id=activity_id)\
+            .options(joinedload(ActivityResponse.student))\
+            .order_by(ActivityResponse.id).all()
+        result['responses'] = [response.to_dict() for response in responses]
     
-    return jsonify({
-        'activity_title': activity.title,
-        'total_responses': total_responses,
-        'avg_score': round(avg_score, 2),
-        'avg_time_seconds': round(avg_time, 2),
-        'time_distribution': time_distribution,
-        'score_distribution': score_distribution,
-        'responses': [response.to_dict() for response in responses]
-    })
+    return jsonify(result)
 
 @analytics_bp.route('/course/<int:course_id>/analytics', methods=['GET'])
 def get_course_analytics(course_id):
@@ -239,45 +278,71 @@ def get_course_analytics(course_id):
     if course.teacher_id != user.id:
         return jsonify({'error': '权限不足'}), 403
     
-    # 课程活动统计
-    activities = Activity.query.filter_by(course_id=course_id).all()
-    activity_stats = []
-    
-    for activity in activities:
-        responses = ActivityResponse.query.filter_by(activity_id=activity.id).all()
-        activity_stats.append({
-            'activity_id': activity.id,
-            'activity_title': activity.title,
-            'activity_type': activity.activity_type,
-            'response_count': len(responses),
-            'avg_score': sum(r.score or 0 for r in responses) / len(responses) if responses else 0,
-            'status': activity.status
-        })
+    # 课程活动统计：一次分组聚合得到每个活动的响应数和平均分（未评分按0计）
+    activity_rows = db.session.query(
+        Activity.id,
+        Activity.title,
+        Activity.activity_type,
+        Activity.status,
+        func.count(ActivityResponse.id).label('response_count'),
+        func.avg(func.coalesce(ActivityResponse.score, 0)).label('avg_score')
+    ).outerjoin(
+        ActivityResponse, ActivityResponse.activity_id == Activity.id
+    ).filter(
+        Activity.course_id == course_id
+    ).group_by(
+        Activity.id, Activity.title, Activity.activity_type, Activity.status
+    ).order_by(Activity.id).all()
     
-    # 学生参与度
-    student_participation = []
-    for student in course.students:
-        participation_count = ActivityResponse.query.join(Activity)\
-            .filter(Activity.course_id == course_id)\
-            .filter(ActivityResponse.student_id == student.id)\
-            .count()
-        
-        student_participation.append({
-            'student_id': student.id,
-            'student_name': student.full_name,
-            'participation_count': participation_count,
-            'participation_rate': participation_count / len(activities) if activities else 0
-        })
+    activity_stats = [{
+        'activity_id': row.id,
+        'activity_title': row.title,
+        'activity_type': row.activity_type,
+        'response_count': row.response_count,
+        'avg_score': float(row.avg_score) if row.response_count else 0,
+        'status': row.status
+    } for row in activity_rows]
+    total_activities = len(activity_rows)
+    
+    # 学生参与度：按学生聚合课程内的响应数，再从选课表左连接
+    participation = db.session.query(
+        ActivityResponse.student_id.label('student_id'),
+        func.count(ActivityResponse.id).label('participation_count')
+    ).join(
+        Activity, Activity.id == ActivityResponse.activity_id
+    ).filter(
+        Activity.course_id == course_id
+    ).group_by(ActivityResponse.student_id).subquery()
+    
+    student_rows = db.session.query(
+        User.id,
+        User.full_name,
+        func.coalesce(participation.c.participation_count, 0).label('participation_count')
+    ).join(
+        course_enrollments, course_enrollments.c.user_id == User.id
+    ).outerjoin(
+        participation, participation.c.student_id == User.id
+    ).filter(
+        course_enrollments.c.course_id == course_id
+    ).order_by(User.id).all()
+    
+    student_participation = [{
+        'student_id': row.id,
+        'student_name': row.full_name,
+        'participation_count': row.participation_count,
+        'participation_rate': row.participation_count / total_activities if total_activities else 0
+    } for row in student_rows]
     
     return jsonify({
         'course_name': course.course_name,
-        'total_activities': len(activities),
-        'total_students': len(course.students),
+        'total_activities': total_activities,
+        'total_students': len(student_rows),
         'activity_stats': activity_stats,
         'student_participation': student_participation
     })
 
 @analytics_bp.route('/teacher/system-overview', methods=['GET'])
+@cached_analytics(per_user=True)
 def get_teacher_system_overview():
     """获取教师系统概览数据分析（仅教师）"""
     user = require_auth()
@@ -286,107 +351,16 @@ def get_teacher_system_overview():
     if user.role != 'teacher':
         return jsonify({'error': '权限不足'}), 403
     
-    from sqlalchemy import func
-    
     # 获取日期范围参数
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    
-    # 解析日期参数
     try:
-        if start_date_str:
-            start_date = datetime.fromisoformat(start_date_str.replace('Z', '+00:00'))
-        else:
-            start_date = datetime.utcnow().replace(day=1) - timedelta(days=365)  # 默认过去12个月
-        
-        if end_date_str:
-            end_date = datetime.fromisoformat(end_date_str.replace('Z', '+00:00'))
-        else:
-            end_date = datetime.utcnow()  # 默认当前时间
-    except ValueError:
-        return jsonify({'error': '无效的日期格式，请使用ISO格式 (YYYY-MM-DDTHH:MM:SS)'}), 400
-    
-    # 确保开始日期不晚于结束日期
-    if start_date > end_date:
-        return jsonify({'error': '开始日期不能晚于结束日期'}), 400
-    
-    # 获取教师的课程
-    courses = Course.query.filter_by(teacher_id=user.id).all()
+        start_date, end_date = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    course_data = []
-    total_completion_rate = 0
-    total_time_spent = 0
-    total_quiz_score = 0
-    course_count = 0
-    
-    for course in courses:
-        # 课程活动总数
-        total_activities = Activity.query.filter_by(course_id=course.id).count()
-        
-        if total_activities == 0:
-            continue
-        
-        # 已完成的活动数（有响应的活动）
-        completed_activities = db.session.query(Activity.id).join(
-            ActivityResponse, Activity.id == ActivityResponse.activity_id
-        ).filter(Activity.course_id == course.id).distinct().count()
-        
-        completion_rate = (completed_activities / total_activities) * 100 if total_activities > 0 else 0
-        
-        # 时间花费统计
-        time_stats = db.session.query(
-            func.sum(ActivityResponse.time_spent_seconds).label('total_time'),
-            func.avg(ActivityResponse.time_spent_seconds).label('avg_time'),
-            func.count(ActivityResponse.student_id.distinct()).label('user_count')
-        ).filter(
-            ActivityResponse.activity_id.in_(
-                db.session.query(Activity.id).filter_by(course_id=course.id)
-            )
-        ).first()
-        
-        total_time = time_stats.total_time or 0
-        avg_time_per_user = time_stats.avg_time or 0
-        users_with_responses = time_stats.user_count or 0
-        
-        # 测验分数统计（仅测验活动）
-        quiz_stats = db.session.query(
-            func.avg(ActivityResponse.score).label('avg_score'),
-            func.count(ActivityResponse.id).label('response_count')
-        ).filter(
-            ActivityResponse.activity_id.in_(
-                db.session.query(Activity.id).filter_by(course_id=course.id, activity_type='quiz')
-            )
-        ).first()
-        
-        avg_quiz_score = quiz_stats.avg_score or 0
-        quiz_responses = quiz_stats.response_count or 0
-        
-        course_data.append({
-            'course_id': course.id,
-            'course_code': course.course_code,
-            'course_name': course.course_name,
-            'completion_rate': round(completion_rate, 2),
-            'total_activities': total_activities,
-            'completed_activities': completed_activities,
-            'total_time_spent_seconds': total_time,
-            'avg_time_per_user_seconds': float(round(avg_time_per_user, 2)),
-            'users_with_responses': users_with_responses,
-            'avg_quiz_score': round(avg_quiz_score, 2),
-            'quiz_responses': quiz_responses
-        })
-        
-        total_completion_rate += completion_rate
-        total_time_spent += total_time
-        total_quiz_score += avg_quiz_score
-        course_count += 1
-    
-    # 系统级汇总
-    system_aggregates = {
-        'avg_completion_rate': round(total_completion_rate / course_count, 2) if course_count > 0 else 0,
-        'total_time_spent_seconds': total_time_spent,
-        'avg_quiz_score': round(total_quiz_score / course_count, 2) if course_count > 0 else 0,
-        'total_courses_analyzed': course_count
-    }
+    # 教师课程的统计（分组聚合，只统计日期范围内的响应）
+    course_data, system_aggregates = compute_course_breakdown(
+        teacher_id=user.id, start_date=start_date, end_date=end_date
+    )
     
     return jsonify({
         'system_aggregates': system_aggregates,
@@ -1,5 +1,5 @@
-from flask import Blueprint, request, jsonify, session, redirect
-from src.models.document import Document
+from flask import Blueprint, request, jsonify, session, redirect, send_file
+from src.models.document import Document, DocumentChunk
 from src.models.course import Course, course_enrollments
 from src.models.user import User
 from src.database import db
@@ -7,7 +7,9 @@ from datetime import datetime
 import os
 import uuid
 from werkzeug.utils import secure_filename
-from src.utils.supabase_storage import supabase, BUCKET_NAME
+from src.utils.storage import get_storage
+from src.utils.document_text import hash_stream
+from src.utils.document_ingestion import get_ingestion_service, job_to_dict
 
 document_bp = Blueprint('document', __name__)
 
@@ -97,19 +99,16 @@ def upload_document(course_id):
         file_ext = file.filename.rsplit('.', 1)[1].lower()
         stored_filename = f"{uuid.uuid4().hex}.{file_ext}"
         
-        # 上传到Supabase
-        supabase_path = f"{course_id}/{stored_filename}"
-        file_data = file.read()  # Read file data
+        # 按块计算内容哈希并上传到存储后端，不把整个文件读入内存
+        storage_path = f"{course_id}/{stored_filename}"
+        file_hash = hash_stream(file.stream)
+        file.stream.seek(0)
         
+        storage = get_storage()
         try:
-            bucket = supabase.storage.from_(BUCKET_NAME)
-            response = bucket.upload(
-                supabase_path, 
-                file_data, 
-                file_options={"content-type": f"application/{file_ext}"}
-            )
+            storage.upload(storage_path, file.stream, content_type=f"application/{file_ext}", size=file_size)
         except Exception as upload_error:
-            return jsonify({'error': f'上传到Supabase失败: {str(upload_error)}'}), 500
+            return jsonify({'error': f'上传文件失败: {str(upload_error)}'}), 500
         
         # 获取标题和描述
         title = request.form.get('title', '').strip() or file.filename
@@ -121,9 +120,10 @@ def upload_document(course_id):
             uploader_id=user.id,
             filename=secure_filename(file.filename),
             stored_filename=stored_filename,
-            file_path=supabase_path,  # Store Supabase path
+            file_path=storage_path,  # 存储后端中的路径
             file_size=file_size,
             file_type=file_ext,
+            content_hash=file_hash,
             title=title,
             description=description,
             is_active=True
@@ -132,18 +132,31 @@ def upload_document(course_id):
         db.session.add(document)
         db.session.commit()
         
-        return jsonify(document.to_dict()), 201
+        # 文本提取和分块由文档处理流水线在后台完成，上传请求立即返回
+        result = document.to_dict()
+        result['ingestion_job'] = submit_ingestion(document)
+        return jsonify(result), 201
         
     except Exception as e:
         db.session.rollback()
-        # 如果文件已保存，删除它
-        if 'file_path' in locals() and os.path.exists(file_path):
+        # 如果文件已上传，删除它
+        if 'storage' in locals():
             try:
-                os.remove(file_path)
+                storage.delete(storage_path)
             except:
                 pass
         return jsonify({'error': f'上传失败: {str(e)}'}), 500
 
+def submit_ingestion(document):
+    """登记文档处理任务，返回任务状态；未启用或登记失败时返回None（文本在首次使用时提取）"""
+    service = get_ingestion_service()
+    if service is None:
+        return None
+    try:
+        return job_to_dict(service.submit(document))
+    except Exception:
+        return None
+
 @document_bp.route('/<int:document_id>', methods=['GET'])
 def get_document(document_id):
     """获取文档信息"""
@@ -200,11 +213,10 @@ def download_document(document_id):
     else:
         return jsonify({'error': '权限不足'}), 403
     
-    # 检查文件是否存在（通过Supabase）
+    # 检查文件是否存在
+    storage = get_storage()
     try:
-        bucket = supabase.storage.from_(BUCKET_NAME)
-        # Check if file exists
-        bucket.info(document.file_path)
+        storage.info(document.file_path)
     except Exception:
         return jsonify({'error': '文件不存在'}), 404
     
@@ -212,10 +224,12 @@ def download_document(document_id):
     document.download_count += 1
     db.session.commit()
     
-    # 生成签名URL
+    # 生成签名URL；本地存储没有外部链接，权限检查通过后直接发送文件
     try:
-        signed_url_dict = bucket.create_signed_url(document.file_path, expires_in=3600)  # 1 hour expiry
-        signed_url = signed_url_dict['signedURL']
+        signed_url = storage.sign(document.file_path, expires_in=3600)  # 1 hour expiry
+        if signed_url is None:
+            return send_file(storage.local_path(document.file_path), as_attachment=True,
+                             download_name=document.filename)
         return redirect(signed_url)
     except Exception as e:
         return jsonify({'error': f'生成下载链接失败: {str(e)}'}), 500
@@ -262,14 +276,48 @@ def delete_document(document_id):
     
     # 删除文件
     try:
-        bucket = supabase.storage.from_(BUCKET_NAME)
-        bucket.remove([document.file_path])
+        get_storage().delete(document.file_path)
     except Exception as e:
         pass  # 即使文件删除失败，也继续删除数据库记录
     
     # 删除数据库记录
+    DocumentChunk.query.filter_by(document_id=document.id).delete(synchronize_session=False)
     db.session.delete(document)
     db.session.commit()
     
     return jsonify({'message': '文档已删除'}), 200
 
+@document_bp.route('/<int:document_id>/ingest', methods=['POST'])
+def ingest_document(document_id):
+    """重新处理文档（提取文本和分块，仅教师）"""
+    user = require_auth()
+    if not user or user.role != 'teacher':
+        return jsonify({'error': '权限不足'}), 403
+    
+    document = Document.query.get_or_404(document_id)
+    if document.course.teacher_id != user.id:
+        return jsonify({'error': '权限不足'}), 403
+    
+    service = get_ingestion_service()
+    if service is None:
+        return jsonify({'error': '文档处理未启用'}), 503
+    
+    return jsonify(job_to_dict(service.submit(document))), 202
+
+@document_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_ingestion_job(job_id):
+    """查询文档处理任务的状态（教师和管理员）"""
+    user = require_auth()
+    if not user or user.role not in ['teacher', 'admin']:
+        return jsonify({'error': '权限不足'}), 403
+    
+    service = get_ingestion_service()
+    job = service.queue.get(job_id) if service else None
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    document = Document.query.get(job['document_id'])
+    if user.role == 'teacher' and (document is None or document.course.teacher_id != user.id):
+        return jsonify({'error': '权限不足'}), 403
+    
+    return jsonify(job_to_dict(job))
@@ -0,0 +1,61 @@
+from flask import Blueprint, Response, current_app, jsonify, request, session
+from src.models.user import User
+from src.models.course import Course
+from src.routes.forum import check_course_access
+from src.utils.events import TEACHER_ONLY_EVENTS, course_channel, format_sse, get_event_broker
+import time
+
+events_bp = Blueprint('events', __name__)
+
+# 心跳间隔和单个连接的最长时间（秒）；连接结束后浏览器会带 Last-Event-ID 自动重连
+HEARTBEAT_SECONDS = 15
+STREAM_SECONDS = 300
+
+@events_bp.route('/course/<int:course_id>', methods=['GET'])
+def stream_course_events(course_id):
+    """订阅课程实时事件（Server-Sent Events）"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': '未登录'}), 401
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'error': '用户不存在'}), 404
+
+    course = Course.query.get_or_404(course_id)
+    if not check_course_access(user, course_id):
+        return jsonify({'error': '无权限访问此课程'}), 403
+
+    broker = get_event_broker()
+    if broker is None:
+        return jsonify({'error': '实时事件未启用'}), 503
+
+    # 断线重连时从 Last-Event-ID 之后继续，否则只推送连接之后的新事件
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        after_id = int(last_event_id) if last_event_id else broker.last_event_id(course_channel(course_id))
+    except ValueError:
+        return jsonify({'error': '无效的事件ID'}), 400
+
+    is_teacher = user.role == 'admin' or course.teacher_id == user.id
+    heartbeat = float(current_app.config.get('EVENTS_HEARTBEAT_SECONDS', HEARTBEAT_SECONDS))
+    duration = float(current_app.config.get('EVENTS_STREAM_SECONDS', STREAM_SECONDS))
+    channel = course_channel(course_id)
+
+    def generate(after_id):
+        yield 'retry: 3000\n\n'
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            events = broker.read(channel, after_id, min(heartbeat, max(deadline - time.monotonic(), 0)))
+            if not events:
+                yield ': keepalive\n\n'
+                continue
+            for item in events:
+                after_id = item['id']
+                if item['type'] in TEACHER_ONLY_EVENTS and not is_teacher:
+                    continue
+                yield format_sse(item)
+
+    response = Response(generate(after_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
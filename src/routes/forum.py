@@ -1,8 +1,12 @@
 from flask import Blueprint, request, jsonify, session
-from src.models.forum import ForumPost, ForumReply, UserForumRead
+from src.models.forum import ForumPost, ForumReply, UserForumRead, ForumThreadRead
 from src.models.course import Course, course_enrollments
 from src.models.user import User
 from src.database import db
+from src.utils.forum_unread import forum_unread_status, post_unread_counts, record_post_read
+from src.utils.forum_search import search_forum
+from src.utils.forum_threads import load_reply_tree
+from src.utils.pagination import keyset_page, parse_page_size
 from datetime import datetime
 from sqlalchemy import or_, and_
 
@@ -60,16 +64,18 @@ def get_forum_posts(course_id):
     per_page = request.args.get('per_page', 20, type=int)
     search = request.args.get('q', '').strip()
     
-    query = ForumPost.query.filter_by(course_id=course_id)
-    
-    # 搜索功能
+    # 搜索功能：走全文索引，结果按相关度排序
     if search:
-        query = query.filter(
-            or_(
-                ForumPost.title.contains(search),
-                ForumPost.content.contains(search)
-            )
-        )
+        return search_forum_posts(user, course_id, search, max(page, 1), per_page if per_page > 0 else 20)
+    
+    # 游标分页：不统计总数、不做OFFSET扫描，任意一页的开销都与第一页相同
+    if 'cursor' in request.args or 'limit' in request.args:
+        try:
+            return list_forum_posts_by_cursor(user, course_id, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    query = ForumPost.query.filter_by(course_id=course_id)
     
     # 置顶帖子优先，然后按创建时间倒序
     query = query.order_by(ForumPost.is_pinned.desc(), ForumPost.created_at.desc())
@@ -77,20 +83,68 @@ def get_forum_posts(course_id):
     # 分页
     posts = query.paginate(page=page, per_page=per_page, error_out=False)
     
-    # Add can_delete field to each post
+    return jsonify({
+        'posts': _serialize_post_page(user, course_id, posts.items),
+        'total': posts.total,
+        'pages': posts.pages,
+        'current_page': posts.page,
+        'has_next': posts.has_next,
+        'has_prev': posts.has_prev
+    })
+
+def _serialize_post_page(user, course_id, posts):
+    """序列化一页帖子，附带删除权限和未读数（未读数一次算出）"""
+    unread_counts = post_unread_counts(user.id, course_id, posts)
     posts_data = []
-    for post in posts.items:
+    for post in posts:
         post_dict = post.to_dict()
         post_dict['can_delete'] = can_modify_post(user, post)
+        post_dict['unread_count'] = unread_counts.get(post.id, 0)
         posts_data.append(post_dict)
+    return posts_data
+
+def list_forum_posts_by_cursor(user, course_id, args):
+    """按 (is_pinned, created_at, id) 倒序读取一页帖子；with_total=true 时才统计总数"""
+    limit = parse_page_size(args.get('limit'), default=20, maximum=100)
+    query = ForumPost.query.filter_by(course_id=course_id)
+    posts, next_cursor = keyset_page(
+        query,
+        [ForumPost.is_pinned, ForumPost.created_at, ForumPost.id],
+        cursor=args.get('cursor'),
+        limit=limit,
+        descending=True
+    )
     
+    result = {
+        'posts': _serialize_post_page(user, course_id, posts),
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None,
+        'limit': limit
+    }
+    if args.get('with_total', 'false').lower() == 'true':
+        result['total'] = query.count()
+    return jsonify(result)
+
+def search_forum_posts(user, course_id, search, page, per_page):
+    """全文搜索帖子和回复，返回与帖子列表相同结构的分页结果，附带高亮信息"""
+    hits, total = search_forum(course_id, search, page, per_page)
+    posts_by_id = {}
+    if hits:
+        posts_by_id = {p.id: p for p in ForumPost.query.filter(ForumPost.id.in_([h['post_id'] for h in hits]))}
+    # 索引中可能残留已被物理删除的帖子，跳过
+    hits = [h for h in hits if h['post_id'] in posts_by_id]
+    posts_data = _serialize_post_page(user, course_id, [posts_by_id[h['post_id']] for h in hits])
+    for post_dict, hit in zip(posts_data, hits):
+        post_dict['search'] = {k: v for k, v in hit.items() if k != 'post_id'}
+    
+    pages = (total + per_page - 1) // per_page
     return jsonify({
         'posts': posts_data,
-        'total': posts.total,
-        'pages': posts.pages,
-        'current_page': posts.page,
-        'has_next': posts.has_next,
-        'has_prev': posts.has_prev
+        'total': total,
+        'pages': pages,
+        'current_page': page,
+        'has_next': page < pages,
+        'has_prev': page > 1
     })
 
 @forum_bp.route('/<int:course_id>', methods=['POST'])
@@ -207,37 +261,38 @@ def get_forum_replies(post_id):
     if not check_course_access(user, post.course_id):
         return jsonify({'error': 'No permission to access this course forum'}), 403
     
-    # 获取所有回复，按线程化方式组织
-    all_replies = ForumReply.query.filter_by(post_id=post_id).order_by(ForumReply.created_at).all()
-    
-    # 构建线程化结构
-    reply_dict = {reply.id: reply.to_dict() for reply in all_replies}
-    threaded_replies = []
-    
-    for reply in all_replies:
-        if reply.parent_reply_id is None:
-            # 顶级回复
-            reply_data = reply_dict[reply.id]
-            reply_data['child_replies'] = []
-            reply_data['can_delete'] = can_modify_reply(user, reply)
-            threaded_replies.append(reply_data)
-        else:
-            # 子回复
-            parent = reply_dict.get(reply.parent_reply_id)
-            if parent:
-                if 'child_replies' not in parent:
-                    parent['child_replies'] = []
-                reply_dict[reply.id]['can_delete'] = can_modify_reply(user, reply)
-                parent['child_replies'].append(reply_dict[reply.id])
+    # 顶级回复可按游标分页（limit/cursor），大帖子分批加载
+    limit = None
+    if 'cursor' in request.args or 'limit' in request.args:
+        try:
+            limit = parse_page_size(request.args.get('limit'), default=50, maximum=200)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    try:
+        roots, children, next_cursor = load_reply_tree(post_id, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 删除权限每个请求只计算一次：课程教师可删除所有回复，其他人只能删除自己的
+    is_course_teacher = user.role == 'teacher' and post.course.teacher_id == user.id
+    
+    def serialize(reply):
+        reply_data = reply.to_dict()
+        reply_data['can_delete'] = is_course_teacher or reply.user_id == user.id
+        reply_data['child_replies'] = [serialize(child) for child in children.get(reply.id, [])]
+        return reply_data
     
     # Add can_delete to post
     post_data = post.to_dict()
     post_data['can_delete'] = can_modify_post(user, post)
     
-    return jsonify({
+    result = {
         'post': post_data,
-        'replies': threaded_replies
-    })
+        'replies': [serialize(reply) for reply in roots]
+    }
+    if limit is not None:
+        result.update({'next_cursor': next_cursor, 'has_next': next_cursor is not None, 'limit': limit})
+    return jsonify(result)
 
 @forum_bp.route('/post/<int:post_id>/reply', methods=['POST'])
 def create_forum_reply(post_id):
@@ -260,31 +315,23 @@ def create_forum_reply(post_id):
         return jsonify({'error': '回复Content cannot be empty'}), 400
     
     parent_reply_id = data.get('parent_reply_id')
+    parent_reply = None
     if parent_reply_id:
         # 检查父回复是否存在且属于同一帖子
         parent_reply = ForumReply.query.filter_by(id=parent_reply_id, post_id=post_id).first()
         if not parent_reply:
             return jsonify({'error': 'Parent reply does not exist'}), 400
         
-        # 检查回复深度是否超过3层
-        def get_reply_depth(reply_id):
-            """计算回复的深度（0表示顶级回复）"""
-            reply = ForumReply.query.get(reply_id)
-            depth = 0
-            while reply and reply.parent_reply_id:
-                depth += 1
-                reply = ForumReply.query.get(reply.parent_reply_id)
-            return depth
-        
-        parent_depth = get_reply_depth(parent_reply_id)
-        if parent_depth >= 2:  # 如果父回复已经是第3层，则不能再回复
+        # 检查回复深度是否超过3层（深度在插入时已记录，0表示顶级回复）
+        if parent_reply.depth >= 2:  # 如果父回复已经是第3层，则不能再回复
             return jsonify({'error': 'Cannot reply to this comment. Maximum nesting depth (3 levels) exceeded.'}), 400
     
     reply = ForumReply(
         post_id=post_id,
         user_id=user.id,
         content=content,
-        parent_reply_id=parent_reply_id
+        parent_reply_id=parent_reply_id,
+        parent_reply=parent_reply
     )
     
     db.session.add(reply)
@@ -375,27 +422,20 @@ def get_forum_notifications(course_id):
     if not check_course_access(user, course_id):
         return jsonify({'error': 'No permission to access this course forum'}), 403
     
-    # 获取用户的最后阅读时间
-    read_record = UserForumRead.query.filter_by(user_id=user.id, course_id=course_id).first()
-    last_read_at = read_record.last_read_at if read_record else datetime.min
+    # 与课程列表共用同一个批量未读查询
+    status = forum_unread_status(user.id, [course_id])[course_id]
+    last_read_at = status['last_read_at']
     
-    # 检查是否有新的帖子或回复 (排除用户自己的内容)
-    has_new_posts = ForumPost.query.filter(
-        ForumPost.course_id == course_id,
-        ForumPost.created_at > last_read_at,
-        ForumPost.user_id != user.id  # 排除用户自己的帖子
-    ).count() > 0
+    result = {
+        'has_unread': status['has_unread'],
+        'last_read_at': last_read_at.isoformat() if last_read_at else None
+    }
     
-    has_new_replies = ForumReply.query.join(ForumPost).filter(
-        ForumPost.course_id == course_id,
-        ForumReply.created_at > last_read_at,
-        ForumReply.user_id != user.id  # 排除用户自己的回复
-    ).count() > 0
+    # 未读条数需要统计课程所有帖子和回复，只在请求时计算（轮询只用 has_unread）
+    if request.args.get('include_count', 'false').lower() == 'true':
+        result['unread_count'] = sum(post_unread_counts(user.id, course_id).values()) if status['has_unread'] else 0
     
-    return jsonify({
-        'has_unread': has_new_posts or has_new_replies,
-        'last_read_at': last_read_at.isoformat() if last_read_at != datetime.min else None
-    })
+    return jsonify(result)
 
 @forum_bp.route('/<int:course_id>/mark-read', methods=['POST'])
 def mark_forum_read(course_id):
@@ -419,6 +459,36 @@ def mark_forum_read(course_id):
         )
         db.session.add(read_record)
     
+    # 课程级已读覆盖所有帖子级记录
+    ForumThreadRead.query.filter_by(user_id=user.id, course_id=course_id).delete()
+    
     db.session.commit()
     
     return jsonify({'message': 'Forum marked as read'})
+
+@forum_bp.route('/post/<int:post_id>/read', methods=['POST'])
+def mark_post_read(post_id):
+    """标记帖子已读（可只标记部分回复）"""
+    user = require_auth()
+    if not user:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    post = ForumPost.query.get_or_404(post_id)
+    
+    if not check_course_access(user, post.course_id):
+        return jsonify({'error': 'No permission to access this course forum'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    reply_ids = data.get('reply_ids')
+    if reply_ids is not None and (
+        not isinstance(reply_ids, list) or not all(isinstance(i, int) for i in reply_ids)
+    ):
+        return jsonify({'error': 'reply_ids must be a list of integers'}), 400
+    
+    record_post_read(user.id, post, reply_ids)
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Post marked as read',
+        'unread_count': post_unread_counts(user.id, post.course_id, [post])[post.id]
+    })
@@ -3,7 +3,12 @@ from src.models.response import ActivityResponse
 from src.models.activity import Activity
 from src.models.user import User
 from src.database import db
+from sqlalchemy.orm import joinedload
 from src.ai.ai_service import AIService
+from src.utils.leaderboard import record_response, record_score_change
+from src.utils.activity_analytics import record_snapshot_score_change
+from src.utils.live_tally import record_tally_response, record_tally_score_change
+from src.utils.response_listing import wants_pagination, list_activity_responses
 from datetime import datetime
 
 response_bp = Blueprint('response', __name__)
@@ -54,6 +59,11 @@ def submit_response():
         response.score = data['response_data']['score']
     
     db.session.add(response)
+    db.session.flush()
+    
+    # 增量更新课程排行榜和进行中活动的实时统计
+    record_response(response, activity.course_id)
+    record_tally_response(activity, response)
     db.session.commit()
     
     return jsonify({
@@ -91,7 +101,14 @@ def get_activity_responses(activity_id):
         # 教师可以查看所有响应
         if activity.creator_id != user.id:
             return jsonify({'error': '权限不足'}), 403
-        responses = ActivityResponse.query.filter_by(activity_id=activity_id).all()
+        if wants_pagination(request.args):
+            # 分页列表：按 (submitted_at, id) 游标分页，fields= 指定返回字段
+            try:
+                return jsonify(list_activity_responses(activity, request.args))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        responses = ActivityResponse.query.filter_by(activity_id=activity_id)\
+            .options(joinedload(ActivityResponse.student)).all()
         return jsonify([response.to_dict() for response in responses])
     elif user.role == 'student':
         # 学生只能查看自己的响应
@@ -122,7 +139,12 @@ def add_feedback(response_id):
     
     response.feedback = data['feedback']
     if 'score' in data:
+        old_score = response.score
         response.score = data['score']
+        # 分数变化时增量更新课程排行榜
+        record_score_change(response, response.activity.course_id, old_score)
+        record_snapshot_score_change(response, old_score)
+        record_tally_score_change(response, old_score)
     
     db.session.commit()
     
@@ -0,0 +1,144 @@
+"""活动分析快照工具
+
+分析结果以累计值（响应数、分数和、用时和、分布）的形式保存在 ActivityAnalytics 中，
+并记录已统计的最大响应ID。读取时先比较活动的响应数：与快照一致时直接返回快照，不加锁也不写入；
+不一致时合并ID更大的新响应，合并后仍不一致（晚提交的较小ID、删除的响应）则全量重算。
+评分变化时按新旧分数差值直接修正快照。
+"""
+
+import copy
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm.attributes import flag_modified
+from src.database import db
+from src.models.response import ActivityResponse
+from src.models.analytics import ActivityAnalytics
+
+
+def _empty_snapshot():
+    return {
+        'total_responses': 0,
+        'score_sum': 0.0,
+        'time_sum': 0,
+        'time_distribution': {},
+        'score_distribution': {},
+        'last_response_id': 0
+    }
+
+
+def score_bucket(score):
+    """分数所在的分数段，例如 85 -> '80-89'"""
+    score_range = int(score // 10) * 10
+    return f"{score_range}-{score_range+9}"
+
+
+def _adjust(distribution, key, delta):
+    count = distribution.get(key, 0) + delta
+    if count > 0:
+        distribution[key] = count
+    else:
+        distribution.pop(key, None)
+
+
+def _merge_new_responses(data, activity_id):
+    """把快照之后提交的响应合并进快照，返回合并的响应数"""
+    rows = db.session.query(
+        ActivityResponse.id,
+        ActivityResponse.score,
+        ActivityResponse.time_spent_seconds,
+        ActivityResponse.submitted_at
+    ).filter(
+        ActivityResponse.activity_id == activity_id,
+        ActivityResponse.id > data['last_response_id']
+    ).all()
+
+    for row in rows:
+        data['total_responses'] += 1
+        data['score_sum'] += row.score or 0
+        data['time_sum'] += row.time_spent_seconds or 0
+        if row.submitted_at is not None:
+            _adjust(data['time_distribution'], str(row.submitted_at.hour), 1)
+        if row.score is not None:
+            _adjust(data['score_distribution'], score_bucket(row.score), 1)
+        data['last_response_id'] = max(data['last_response_id'], row.id)
+    return len(rows)
+
+
+def _snapshot_row(activity_id, lock=False):
+    """获取活动的分析快照记录，不存在返回None；lock=True 时加锁并重新读取"""
+    query = ActivityAnalytics.query.filter_by(activity_id=activity_id).order_by(ActivityAnalytics.id)
+    if lock:
+        query = query.with_for_update().populate_existing()
+    return query.first()
+
+
+def _response_count(activity_id):
+    return db.session.query(func.count(ActivityResponse.id))\
+        .filter(ActivityResponse.activity_id == activity_id).scalar()
+
+
+def refresh_activity_snapshot(activity_id, rebuild=False):
+    """获取活动的分析快照，响应数变化时更新快照
+
+    ID在提交前就已分配，较小ID的响应可能晚于较大ID提交，因此不能只按ID水位线合并：
+    合并后响应数仍与快照不一致时全量重算。rebuild=True 时直接全量重算。
+    快照有更新时调用方负责提交事务。
+    """
+    count = _response_count(activity_id)
+    if not rebuild:
+        snapshot = _snapshot_row(activity_id)
+        if snapshot is not None and snapshot.get_analytics_data()['total_responses'] == count:
+            return snapshot
+
+    snapshot = _snapshot_row(activity_id, lock=True)
+    if snapshot is None:
+        snapshot = ActivityAnalytics(activity_id=activity_id, analytics_data=_empty_snapshot())
+        db.session.add(snapshot)
+        rebuild = True
+
+    data = _empty_snapshot() if rebuild else copy.deepcopy(snapshot.get_analytics_data())
+    _merge_new_responses(data, activity_id)
+    if data['total_responses'] != count:
+        data = _empty_snapshot()
+        _merge_new_responses(data, activity_id)
+    snapshot.analytics_data = data
+    snapshot.analyzed_at = datetime.utcnow()
+    flag_modified(snapshot, 'analytics_data')
+    return snapshot
+
+
+def record_snapshot_score_change(response, old_score):
+    """响应分数变化后修正已统计过该响应的快照"""
+    if old_score == response.score:
+        return
+    snapshot = _snapshot_row(response.activity_id, lock=True)
+    if snapshot is None:
+        return
+    data = copy.deepcopy(snapshot.get_analytics_data())
+    # 尚未统计的响应会在下次读取时按新分数合并（晚提交的较小ID会在响应数不一致时全量重算）
+    if response.id > data.get('last_response_id', 0):
+        return
+
+    data['score_sum'] += (response.score or 0) - (old_score or 0)
+    if old_score is not None:
+        _adjust(data['score_distribution'], score_bucket(old_score), -1)
+    if response.score is not None:
+        _adjust(data['score_distribution'], score_bucket(response.score), 1)
+
+    snapshot.analytics_data = data
+    snapshot.analyzed_at = datetime.utcnow()
+    flag_modified(snapshot, 'analytics_data')
+
+
+def snapshot_summary(snapshot):
+    """把快照累计值转换为接口返回的统计结果"""
+    data = snapshot.get_analytics_data()
+    total = data['total_responses']
+    return {
+        'total_responses': total,
+        'avg_score': round(data['score_sum'] / total, 2) if total > 0 else 0,
+        'avg_time_seconds': round(data['time_sum'] / total, 2) if total > 0 else 0,
+        'time_distribution': data['time_distribution'],
+        'score_distribution': data['score_distribution'],
+        'analyzed_at': snapshot.analyzed_at.isoformat() if snapshot.analyzed_at else None
+    }
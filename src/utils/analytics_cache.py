@@ -0,0 +1,264 @@
+"""仪表板统计结果缓存
+
+按 (端点, 角色, 范围, 查询参数) 缓存统计接口的响应，带过期时间；
+用户、课程、活动或响应数据提交后整体失效（用户表只有统计读取的列变化时才失效，登录时间等由过期时间兜底）。
+
+后端通过 ANALYTICS_CACHE_BACKEND 配置：
+- memory（默认）：进程内LRU缓存
+- sqlite：多进程共享的本地文件缓存（可替换为Redis等共享缓存的本地替身），
+  默认放在数据库文件旁边（见 app_data_path），缓存键按数据库标识区分
+- none：关闭缓存
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, has_app_context, request, session
+from src.database import app_data_path, database_key, db, prepare_data_path
+from src.models.user import User
+from src.models.course import Course, course_enrollments
+from src.models.activity import Activity
+from src.models.response import ActivityResponse
+from src.utils.commit_hooks import on_commit
+
+DEFAULT_TTL_SECONDS = 60
+DEFAULT_MAX_ENTRIES = 256
+
+# 这些表的数据变化会影响统计结果
+WATCHED_TABLES = (
+    User.__table__.name,
+    Course.__table__.name,
+    course_enrollments.name,
+    Activity.__table__.name,
+    ActivityResponse.__table__.name,
+)
+
+# 用户表中统计结果读取的列；last_login（每次登录更新）和密码不在其中，
+# 管理员概览里的登录人数在缓存过期后更新即可，登录不会清空所有人的统计缓存
+WATCHED_COLUMNS = {
+    User.__table__.name: ('username', 'email', 'role', 'student_id', 'full_name', 'department', 'created_at'),
+}
+
+
+class MemoryBackend:
+    """进程内LRU缓存，条目超过TTL后失效"""
+
+    name = 'memory'
+
+    def __init__(self, ttl, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """基于本地SQLite文件的共享缓存，同一台机器上的多个工作进程共用"""
+
+    name = 'sqlite'
+
+    def __init__(self, ttl, path, max_entries=DEFAULT_MAX_ENTRIES, scope=''):
+        self.ttl = ttl
+        self.path = path
+        self.max_entries = max_entries
+        # 所属数据库的标识（十六进制）：共用同一文件的应用只读取和清除自己的条目
+        self.scope = scope
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS analytics_cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _key(self, key):
+        return f'{self.scope}:{key}'
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value FROM analytics_cache WHERE key = ? AND expires_at > ?',
+                (self._key(key), time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO analytics_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (self._key(key), value, now + self.ttl)
+            )
+            conn.execute('DELETE FROM analytics_cache WHERE expires_at <= ?', (now,))
+            conn.execute(
+                'DELETE FROM analytics_cache WHERE key LIKE ? AND key NOT IN '
+                '(SELECT key FROM analytics_cache WHERE key LIKE ? ORDER BY expires_at DESC LIMIT ?)',
+                (self._key('%'), self._key('%'), self.max_entries)
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM analytics_cache WHERE key LIKE ?', (self._key('%'),))
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM analytics_cache WHERE key LIKE ? AND expires_at > ?',
+                (self._key('%'), time.time())
+            ).fetchone()[0]
+
+
+class AnalyticsCache:
+    """统计缓存：包装具体后端并记录命中/未命中次数"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        value = self.backend.get(key) if self.backend is not None else None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if self.backend is not None:
+            self.backend.set(key, value)
+
+    def invalidate(self):
+        if self.backend is not None:
+            self.backend.clear()
+        self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name if self.backend is not None else 'none',
+            'ttl_seconds': self.backend.ttl if self.backend is not None else 0,
+            'entries': len(self.backend) if self.backend is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'invalidations': self.invalidations
+        }
+
+
+def init_analytics_cache(app):
+    """根据应用配置创建统计缓存"""
+    backend_name = app.config.get('ANALYTICS_CACHE_BACKEND', os.environ.get('ANALYTICS_CACHE_BACKEND', 'memory'))
+    ttl = int(app.config.get('ANALYTICS_CACHE_TTL', DEFAULT_TTL_SECONDS))
+    max_entries = int(app.config.get('ANALYTICS_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+
+    if backend_name == 'none':
+        backend = None
+    elif backend_name == 'sqlite':
+        path = app.config.get('ANALYTICS_CACHE_PATH') or app_data_path(app, 'analytics_cache.db')
+        prepare_data_path(path)
+        backend = SQLiteBackend(ttl, path, max_entries, scope=database_key(app))
+    elif backend_name == 'memory':
+        backend = MemoryBackend(ttl, max_entries)
+    else:
+        raise ValueError(f'未知的统计缓存后端: {backend_name}')
+
+    cache = AnalyticsCache(backend)
+    app.extensions['analytics_cache'] = cache
+    return cache
+
+
+def get_analytics_cache():
+    """获取当前应用的统计缓存"""
+    return current_app.extensions.get('analytics_cache')
+
+
+def _invalidate_on_commit(changed_tables):
+    if not has_app_context():
+        return
+    cache = get_analytics_cache()
+    if cache:
+        cache.invalidate()
+
+
+on_commit(WATCHED_TABLES, _invalidate_on_commit, WATCHED_COLUMNS)
+
+
+def cached_analytics(per_user=False):
+    """缓存统计接口的成功响应
+
+    缓存键包含端点、当前用户角色、范围（per_user 时为用户ID，否则为全局）和排序后的查询参数。
+    角色不同的用户不会共用缓存，因此无权访问的请求仍会进入视图函数被拒绝。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_analytics_cache()
+            user_id = session.get('user_id')
+            user = db.session.get(User, user_id) if user_id else None
+            if cache is None or cache.backend is None or user is None:
+                return view(*args, **kwargs)
+
+            key = json.dumps([
+                request.endpoint,
+                user.role,
+                user.id if per_user else 'all',
+                sorted(request.args.items(multi=True)),
+                kwargs
+            ], sort_keys=True, default=str)
+
+            cached = cache.get(key)
+            if cached is not None:
+                entry = json.loads(cached)
+                response = current_app.response_class(entry['body'], mimetype='application/json')
+                if entry['etag']:
+                    response.set_etag(entry['etag'])
+                    response.make_conditional(request)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == 'application/json':
+                # 视图设置的ETag一并缓存，命中时仍可返回304
+                etag, _ = response.get_etag()
+                cache.set(key, json.dumps({
+                    'etag': etag,
+                    'body': response.get_data(as_text=True)
+                }).encode('utf-8'))
+                response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,106 @@
+"""事务提交钩子：在事务成功提交后，按被修改的数据表通知订阅者，或执行本次事务登记的回调"""
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import ColumnProperty, Session
+from sqlalchemy.orm.attributes import get_history, PASSIVE_NO_INITIALIZE
+
+# (关注的表名集合, 回调函数, {表名: 关注的列}) 列表；回调参数为本次提交修改过的表名集合
+_subscribers = []
+
+_CHANGED_TABLES_KEY = 'changed_tables'
+# 表名 -> 本次事务中通过ORM更新过的列名集合；新增、删除或批量语句修改的表记为 ALL_COLUMNS
+_CHANGED_COLUMNS_KEY = 'changed_columns'
+ALL_COLUMNS = None
+_PENDING_CALLBACKS_KEY = 'after_commit_callbacks'
+
+
+def on_commit(tables, callback, columns=None):
+    """订阅提交事件：本次提交修改了 tables 中任一张表时调用 callback(changed_tables)
+
+    columns 可以为部分表指定关注的列（{表名: 列名集合}）：这些表只有其他列被更新时不触发回调。
+    """
+    _subscribers.append((frozenset(tables), callback,
+                         {table: frozenset(names) for table, names in (columns or {}).items()}))
+
+
+def run_after_commit(session, callback):
+    """登记一个在当前事务提交后执行的回调（无参数）；事务回滚时丢弃"""
+    session.info.setdefault(_PENDING_CALLBACKS_KEY, []).append(callback)
+
+
+def _changed_tables(session):
+    return session.info.setdefault(_CHANGED_TABLES_KEY, set())
+
+
+def _mark_columns(session, table_name, names):
+    """记录表中被修改的列，names 为 ALL_COLUMNS 时表示整行变化"""
+    changed = session.info.setdefault(_CHANGED_COLUMNS_KEY, {})
+    if names is ALL_COLUMNS or changed.get(table_name, set()) is ALL_COLUMNS:
+        changed[table_name] = ALL_COLUMNS
+    else:
+        changed.setdefault(table_name, set()).update(names)
+
+
+def _updated_columns(instance):
+    state = inspect(instance)
+    return {
+        prop.columns[0].name for prop in state.mapper.iterate_properties
+        if isinstance(prop, ColumnProperty) and state.attrs[prop.key].history.has_changes()
+    }
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    """记录本次flush中新增、修改、删除的对象所属的表"""
+    changed = _changed_tables(session)
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(instance, '__table__', None)
+        if table is not None:
+            changed.add(table.name)
+            if instance in session.dirty and instance not in session.deleted:
+                _mark_columns(session, table.name, _updated_columns(instance))
+            else:
+                _mark_columns(session, table.name, ALL_COLUMNS)
+    # 多对多关联表的变化体现为父对象集合属性的变化（after_flush 时历史记录尚未重置）
+    for instance in list(session.new) + list(session.dirty):
+        for prop in instance.__mapper__.relationships:
+            if prop.secondary is None:
+                continue
+            if get_history(instance, prop.key, passive=PASSIVE_NO_INITIALIZE).has_changes():
+                changed.add(prop.secondary.name)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_tables(orm_execute_state):
+    """记录通过 session.execute 执行的批量 INSERT/UPDATE/DELETE 语句涉及的表"""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is not None and getattr(table, 'name', None):
+        _changed_tables(orm_execute_state.session).add(table.name)
+        _mark_columns(orm_execute_state.session, table.name, ALL_COLUMNS)
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_subscribers(session):
+    for callback in session.info.pop(_PENDING_CALLBACKS_KEY, []):
+        callback()
+    changed = session.info.pop(_CHANGED_TABLES_KEY, None)
+    changed_columns = session.info.pop(_CHANGED_COLUMNS_KEY, {})
+    if not changed:
+        return
+    for tables, callback, columns in _subscribers:
+        relevant = {
+            table for table in tables & changed
+            if table not in columns or changed_columns.get(table, ALL_COLUMNS) is ALL_COLUMNS
+            or changed_columns[table] & columns[table]
+        }
+        if relevant:
+            callback(changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_CHANGED_TABLES_KEY, None)
+    session.info.pop(_CHANGED_COLUMNS_KEY, None)
+    session.info.pop(_PENDING_CALLBACKS_KEY, None)
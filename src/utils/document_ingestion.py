@@ -0,0 +1,366 @@
+"""课程文档处理流水线
+
+上传文档后只登记一个处理任务，请求立即返回。后台线程从任务队列领取任务，
+在进程池中完成文本提取、分页和分块（CPU密集，不占用请求线程），
+再把全文缓存和 DocumentChunk 分块写入数据库，并预先构建课程的检索索引（src/ai/retrieval.py）。
+
+任务队列保存在本地SQLite文件中（多个gunicorn worker共享，可替换为Redis等任务队列），
+默认放在数据库文件旁边（见 app_data_path）。每个任务记录所属数据库的标识，
+worker只领取本应用数据库的任务；任务的状态（pending/running/completed/failed）和当前阶段通过接口查询。
+
+运行中的任务定期更新心跳，超过 INGESTION_STALE_SECONDS 没有心跳的任务视为所在进程已退出，重新领取；
+失败的任务按指数退避延迟后重试，最多 MAX_ATTEMPTS 次。
+
+处理模式通过 INGESTION_MODE 配置：
+- background（默认）：后台线程 + 进程池，线程在第一次提交任务时启动
+- inline（测试时的默认值）：在提交任务的线程中直接处理（单进程开发和测试）
+- none：不处理，文本在首次使用时提取；未配置模式且任务队列所在目录不可写时
+  （如Vercel等无服务器平台的只读文件系统）使用该模式
+"""
+
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app
+from src.ai.retrieval import get_course_index
+from src.database import app_data_path, database_key, db, prepare_data_path
+from src.models.document import Document, DocumentChunk
+from src.utils.document_text import (
+    TEXT_FILE_TYPES, document_file, extract_pages, hash_file, join_pages, store_extracted_text
+)
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
+DEFAULT_WORKERS = 2
+DEFAULT_POLL_INTERVAL = 2.0
+# 超过该时间没有心跳的运行中任务视为所在进程已退出，重新领取
+DEFAULT_STALE_SECONDS = 300
+HEARTBEAT_INTERVAL = 30.0
+MAX_ATTEMPTS = 3
+# 失败任务的重试延迟：第n次失败后等待 RETRY_BACKOFF_SECONDS * 2^(n-1) 秒
+RETRY_BACKOFF_SECONDS = 30
+
+# 分块边界，按优先级：段落、换行、句末标点、空格
+_CHUNK_BREAKS = (
+    ('\n\n',),
+    ('\n',),
+    ('。', '！', '？', '. ', '! ', '? ', '；', '; '),
+    (' ',),
+)
+
+
+def _cut_point(text, start, end):
+    """在 [start, end) 的后半段寻找最合适的分块位置，找不到时在 end 处截断"""
+    window = text[start:end]
+    min_offset = len(window) // 2
+    for separators in _CHUNK_BREAKS:
+        offset = max(window.rfind(separator) + len(separator) if separator in window else -1
+                     for separator in separators)
+        if offset >= min_offset:
+            return start + offset
+    return end
+
+
+def split_into_chunks(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """把文本切成不超过 size 个字符的分块，相邻分块重叠约 overlap 个字符"""
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        cut = _cut_point(text, start, end) if end < len(text) else end
+        chunk = text[start:cut].strip()
+        if chunk:
+            chunks.append(chunk)
+        if cut >= len(text):
+            break
+        start = cut - overlap if cut - overlap > start else cut
+    return chunks
+
+
+def process_document_file(path, file_type):
+    """在进程池中运行：返回 (内容哈希, 全文, [(页码, 分块文本)])"""
+    pages = extract_pages(path, file_type)
+    chunks = [(number, chunk) for number, text in pages for chunk in split_into_chunks(text)]
+    return hash_file(path), join_pages(pages, file_type), chunks
+
+
+class SQLiteJobQueue:
+    """基于本地SQLite文件的任务队列；scope 是所属数据库的标识，只能领取和查询同一 scope 的任务"""
+
+    def __init__(self, path, stale_seconds=DEFAULT_STALE_SECONDS, scope=''):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self.scope = scope
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS ingestion_jobs ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, document_id INTEGER NOT NULL, '
+                "status TEXT NOT NULL DEFAULT 'pending', stage TEXT NOT NULL DEFAULT 'queued', "
+                'error TEXT, chunk_count INTEGER, attempts INTEGER NOT NULL DEFAULT 0, '
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, scope TEXT NOT NULL DEFAULT '', "
+                'available_at REAL NOT NULL DEFAULT 0)'
+            )
+            # 旧版本创建的队列文件
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(ingestion_jobs)')}
+            if 'scope' not in columns:
+                conn.execute("ALTER TABLE ingestion_jobs ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+            if 'available_at' not in columns:
+                conn.execute('ALTER TABLE ingestion_jobs ADD COLUMN available_at REAL NOT NULL DEFAULT 0')
+            conn.execute('DROP INDEX IF EXISTS ix_ingestion_jobs_status')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_ingestion_jobs_scope_status ON ingestion_jobs (scope, status, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_ingestion_jobs_document ON ingestion_jobs (document_id, id)')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, document_id):
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                'INSERT INTO ingestion_jobs (document_id, created_at, updated_at, scope) VALUES (?, ?, ?, ?)',
+                (document_id, now, now, self.scope)
+            ).lastrowid
+
+    def claim(self, job_id=None):
+        """领取最早的待处理任务（或心跳超时的任务），没有时返回None；指定 job_id 时只领取该任务
+
+        等待重试的任务在 available_at 之前不会被领取。
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE 持有写锁，多个进程不会领取同一个任务
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                "SELECT * FROM ingestion_jobs WHERE scope = ? "
+                "AND ((status = 'pending' AND available_at <= ?) OR (status = 'running' AND updated_at < ?)) "
+                'AND attempts < ? AND (? IS NULL OR id = ?) ORDER BY id LIMIT 1',
+                (self.scope, now, now - self.stale_seconds, MAX_ATTEMPTS, job_id, job_id)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                "UPDATE ingestion_jobs SET status = 'running', stage = 'extracting', attempts = attempts + 1, "
+                'updated_at = ? WHERE id = ?',
+                (now, row['id'])
+            )
+            conn.execute('COMMIT')
+            return dict(row, status='running', stage='extracting', attempts=row['attempts'] + 1)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as conn:
+            conn.execute(f'UPDATE ingestion_jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    def heartbeat(self, job_id):
+        """更新运行中任务的心跳时间"""
+        with self._connect() as conn:
+            conn.execute("UPDATE ingestion_jobs SET updated_at = ? WHERE id = ? AND status = 'running'",
+                         (time.time(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM ingestion_jobs WHERE id = ? AND scope = ?',
+                               (job_id, self.scope)).fetchone()
+        return dict(row) if row else None
+
+    def latest_for_document(self, document_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT * FROM ingestion_jobs WHERE scope = ? AND document_id = ? ORDER BY id DESC LIMIT 1',
+                (self.scope, document_id)
+            ).fetchone()
+        return dict(row) if row else None
+
+
+def save_document_chunks(document, file_hash, text, chunks):
+    """写入全文缓存并替换文档的分块（调用方负责提交）"""
+    store_extracted_text(document, text, file_hash)
+    DocumentChunk.query.filter_by(document_id=document.id).delete(synchronize_session=False)
+    db.session.add_all([
+        DocumentChunk(document_id=document.id, course_id=document.course_id, chunk_index=index,
+                      page_number=page_number, content=content)
+        for index, (page_number, content) in enumerate(chunks)
+    ])
+    return len(chunks)
+
+
+def run_ingestion_job(job, queue, run=None, retry=True):
+    """处理一个任务；run(func, *args) 决定提取和分块在哪里执行（默认当前线程）
+
+    处理失败且 retry 为真时，未达到最大尝试次数的任务重新排队。
+    """
+    run = run or (lambda func, *args: func(*args))
+    try:
+        document = db.session.get(Document, job['document_id'])
+        if document is None:
+            queue.update(job['id'], status='failed', stage='failed', error='文档不存在')
+            return
+        if document.file_type.lower() not in TEXT_FILE_TYPES:
+            queue.update(job['id'], status='completed', stage='completed', chunk_count=0)
+            return
+
+        # 进程池按路径读取文件，不在进程间传递文件内容
+        with document_file(document) as path:
+            file_hash, text, chunks = run(process_document_file, path, document.file_type)
+
+        queue.update(job['id'], stage='indexing')
+        chunk_count = save_document_chunks(document, file_hash, text, chunks)
+        db.session.commit()
+        # 预先构建课程检索索引（启用向量时写入磁盘），问答请求不必等待
+        get_course_index(document.course_id)
+        queue.update(job['id'], status='completed', stage='completed', chunk_count=chunk_count, error=None)
+    except Exception as e:
+        db.session.rollback()
+        if retry and job['attempts'] < MAX_ATTEMPTS:
+            delay = RETRY_BACKOFF_SECONDS * 2 ** (job['attempts'] - 1)
+            queue.update(job['id'], status='pending', stage='queued', error=str(e), available_at=time.time() + delay)
+        else:
+            queue.update(job['id'], status='failed', stage='failed', error=str(e))
+
+
+class IngestionWorker:
+    """后台线程：从队列领取任务，把提取和分块交给进程池"""
+
+    def __init__(self, app, queue, max_workers=DEFAULT_WORKERS, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.app = app
+        self.queue = queue
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self._executor = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                # spawn 启动子进程，避免在多线程进程中 fork
+                self._executor = ProcessPoolExecutor(self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self._thread = threading.Thread(target=self._run, name='document-ingestion', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _run_in_pool(self, func, *args):
+        return self._executor.submit(func, *args).result()
+
+    @contextmanager
+    def _heartbeat(self, job_id):
+        """处理任务期间在单独的线程中定期更新心跳，长时间运行的任务不会被当作超时"""
+        done = threading.Event()
+
+        def beat():
+            while not done.wait(HEARTBEAT_INTERVAL):
+                try:
+                    self.queue.heartbeat(job_id)
+                except sqlite3.Error:
+                    pass
+
+        thread = threading.Thread(target=beat, name=f'document-ingestion-heartbeat-{job_id}', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error:
+                # 队列文件暂时不可用（被锁定等），稍后重试
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            with self.app.app_context(), self._heartbeat(job['id']):
+                try:
+                    run_ingestion_job(job, self.queue, self._run_in_pool)
+                finally:
+                    db.session.remove()
+
+
+class IngestionService:
+    """登记文档处理任务并按配置的模式执行"""
+
+    def __init__(self, app, mode, queue, max_workers=DEFAULT_WORKERS):
+        self.mode = mode
+        self.queue = queue
+        self.worker = IngestionWorker(app, queue, max_workers) if mode == 'background' else None
+
+    def submit(self, document):
+        """登记文档的处理任务，返回任务信息（需在文档提交之后调用）"""
+        job_id = self.queue.enqueue(document.id)
+        if self.mode == 'inline':
+            job = self.queue.claim(job_id)
+            if job is not None:
+                run_ingestion_job(job, self.queue, retry=False)
+        else:
+            self.worker.start()
+            self.worker.wake()
+        return self.queue.get(job_id)
+
+
+def init_ingestion(app):
+    """根据应用配置创建文档处理服务"""
+    path = app.config.get('INGESTION_QUEUE_PATH') or app_data_path(app, 'ingestion.db')
+    mode = app.config.get('INGESTION_MODE', os.environ.get('INGESTION_MODE'))
+    if mode is None:
+        if not prepare_data_path(path):
+            # 只读文件系统（无服务器平台）上无法保存任务队列，也无法保持后台线程
+            app.logger.warning('Document ingestion disabled: %s is not writable', os.path.dirname(path))
+            mode = 'none'
+        else:
+            mode = 'inline' if app.testing else 'background'
+    if mode == 'none':
+        service = None
+    elif mode in ('background', 'inline'):
+        prepare_data_path(path)
+        queue = SQLiteJobQueue(path, int(app.config.get('INGESTION_STALE_SECONDS', DEFAULT_STALE_SECONDS)),
+                               scope=database_key(app))
+        service = IngestionService(app, mode, queue, int(app.config.get('INGESTION_WORKERS', DEFAULT_WORKERS)))
+    else:
+        raise ValueError(f'未知的文档处理模式: {mode}')
+    app.extensions['document_ingestion'] = service
+    return service
+
+
+def get_ingestion_service():
+    """获取当前应用的文档处理服务（未启用时返回None）"""
+    return current_app.extensions.get('document_ingestion')
+
+
+def job_to_dict(job):
+    """接口返回的任务状态"""
+    return {
+        'id': job['id'],
+        'document_id': job['document_id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'error': job['error'],
+        'chunk_count': job['chunk_count'],
+        'attempts': job['attempts'],
+        'created_at': datetime.utcfromtimestamp(job['created_at']).isoformat(),
+        'updated_at': datetime.utcfromtimestamp(job['updated_at']).isoformat()
+    }
@@ -0,0 +1,281 @@
+"""课程文档的文本提取与缓存
+
+PDF/DOCX/TXT 文档的文本只提取一次，保存在 Document.extracted_text 中，
+之后的AI问答和活动生成直接读取缓存，不再下载和解析原文件。
+文件内容的SHA-256保存在 Document.content_hash 中：同一文件上传到多个课程时复用已提取的文本。
+
+PDF按页流式提取：本地文件通过只读内存映射交给PyPDF2，按需读取页面，
+可以只提取部分页码、达到字符上限后提前停止；指定 parallel=True 时把页码区间分给进程池并行提取
+（请求处理中不使用，避免在Web进程里启动子进程）。
+只需要开头部分且尚无全文缓存时，提取结果保存在进程内缓存中，之后的请求不再下载和解析文件。
+"""
+
+import hashlib
+import io
+import mmap
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+
+import PyPDF2
+import docx
+from src.models.document import Document
+from src.utils.storage import StorageError, get_storage
+
+# 可以提取文本的文件类型
+TEXT_FILE_TYPES = {'pdf', 'docx', 'doc', 'txt'}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+PARALLEL_MAX_WORKERS = 4
+# 进程内缓存开头部分文本的文档数
+MAX_CACHED_PREVIEWS = 64
+
+
+def content_hash(data):
+    """文件内容的SHA-256（十六进制）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_stream(stream):
+    """分块计算二进制流剩余内容的SHA-256"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    """分块计算本地文件的SHA-256"""
+    with open(path, 'rb') as file:
+        return hash_stream(file)
+
+
+@contextmanager
+def _open_binary(source):
+    """把文件路径、字节内容或文件对象统一打开为可读的二进制流；文件路径使用只读内存映射"""
+    if isinstance(source, (bytes, bytearray)):
+        yield io.BytesIO(source)
+    elif hasattr(source, 'read'):
+        yield source
+    else:
+        with open(source, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                # 空文件不能映射
+                yield file
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+
+def iter_pdf_pages(source, first_page=1, last_page=None):
+    """逐页生成 (页码, 文本)，页码从1开始，last_page 包含在内"""
+    with _open_binary(source) as stream:
+        reader = PyPDF2.PdfReader(stream)
+        total = len(reader.pages)
+        last_page = total if last_page is None else min(last_page, total)
+        for number in range(max(first_page, 1), last_page + 1):
+            yield number, reader.pages[number - 1].extract_text() or ''
+
+
+def pdf_page_count(source):
+    with _open_binary(source) as stream:
+        return len(PyPDF2.PdfReader(stream).pages)
+
+
+def _join_pages_with_budget(pages, max_chars=None):
+    """把 (页码, 文本) 按页拼接，每页后加换行；达到 max_chars 后停止读取后面的页"""
+    buffer = io.StringIO()
+    size = 0
+    for _, text in pages:
+        buffer.write(text)
+        buffer.write('\n')
+        size += len(text) + 1
+        if max_chars is not None and size >= max_chars:
+            break
+    text = buffer.getvalue()
+    return text[:max_chars] if max_chars is not None else text
+
+
+def _extract_page_range(path, first_page, last_page):
+    """在进程池中运行：提取一个页码区间的文本"""
+    return _join_pages_with_budget(iter_pdf_pages(path, first_page, last_page))
+
+
+def _read_pdf_parallel(path, first_page, last_page, workers):
+    size = -(-(last_page - first_page + 1) // workers)
+    starts = list(range(first_page, last_page + 1, size))
+    ends = [min(start + size - 1, last_page) for start in starts]
+    with ProcessPoolExecutor(len(starts), mp_context=multiprocessing.get_context('spawn')) as pool:
+        return ''.join(pool.map(_extract_page_range, [path] * len(starts), starts, ends))
+
+
+def read_pdf_text(source, first_page=1, last_page=None, max_chars=None, parallel=False):
+    """提取PDF文本（每页后加换行）
+
+    source 可以是文件路径、字节内容或文件对象。max_chars 限制返回的字符数，达到后不再解析后面的页。
+    parallel=True 时本地文件（没有字符上限）按页码区间在进程池中并行提取，只用于离线处理。
+    """
+    if parallel and max_chars is None and isinstance(source, (str, os.PathLike)):
+        total = pdf_page_count(source)
+        last = total if last_page is None else min(last_page, total)
+        workers = min(PARALLEL_MAX_WORKERS, os.cpu_count() or 1, max(last - first_page + 1, 1))
+        return _read_pdf_parallel(os.fspath(source), first_page, last, workers)
+
+    pages = iter_pdf_pages(source, first_page, last_page)
+    try:
+        return _join_pages_with_budget(pages, max_chars)
+    finally:
+        pages.close()
+
+
+def read_docx_text(source):
+    with _open_binary(source) as stream:
+        return '\n'.join(paragraph.text for paragraph in docx.Document(stream).paragraphs)
+
+
+def read_txt_text(source):
+    with _open_binary(source) as stream:
+        return bytes(stream.read()).decode('utf-8')
+
+
+def extract_text(source, file_type, max_chars=None):
+    """从文件路径或文件内容提取文本，不支持的类型返回None，解析失败时抛出异常"""
+    file_type = file_type.lower()
+    if file_type == 'pdf':
+        return read_pdf_text(source, max_chars=max_chars)
+    if file_type in ('docx', 'doc'):
+        text = read_docx_text(source)
+    elif file_type == 'txt':
+        text = read_txt_text(source)
+    else:
+        return None
+    return text[:max_chars] if max_chars is not None else text
+
+
+def extract_pages(source, file_type):
+    """按页提取文本，返回 [(页码, 文本)]
+
+    PDF按页；TXT按换页符分页；DOCX没有分页信息，整篇作为一页，页码为None。
+    """
+    file_type = file_type.lower()
+    if file_type == 'pdf':
+        return list(iter_pdf_pages(source))
+    if file_type == 'txt':
+        pages = read_txt_text(source).split('\f')
+        return list(enumerate(pages, 1)) if len(pages) > 1 else [(None, pages[0])]
+    if file_type in ('docx', 'doc'):
+        return [(None, read_docx_text(source))]
+    return []
+
+
+def join_pages(pages, file_type):
+    """把分页文本合并为与 extract_text 相同的全文"""
+    if file_type.lower() == 'pdf':
+        return _join_pages_with_budget(pages)
+    return '\f'.join(text for _, text in pages)
+
+
+@contextmanager
+def document_file(document):
+    """得到文档文件的本地路径：旧数据保存在本地路径，其余由存储后端提供（必要时按块下载到临时文件）"""
+    if os.path.exists(document.file_path):
+        yield document.file_path
+        return
+    with get_storage().local_file(document.file_path) as path:
+        yield path
+
+
+def store_extracted_text(document, text, file_hash=None):
+    if file_hash:
+        document.content_hash = file_hash
+    document.extracted_text = text
+    document.text_extracted_at = datetime.utcnow()
+
+
+def _text_from_same_file(document):
+    """已提取过相同内容文件的文本（按内容哈希查找）"""
+    if not document.content_hash:
+        return None
+    return Document.query.with_entities(Document.extracted_text).filter(
+        Document.content_hash == document.content_hash,
+        Document.file_type == document.file_type,
+        Document.extracted_text.isnot(None),
+        Document.id != document.id
+    ).limit(1).scalar()
+
+
+class PreviewCache:
+    """进程内的文档开头部分文本缓存（最近使用的保留）"""
+
+    def __init__(self, max_size=MAX_CACHED_PREVIEWS):
+        self.max_size = max_size
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, max_chars):
+        """缓存的文本足够 max_chars 个字符时返回，否则返回None"""
+        with self._lock:
+            entry = self._texts.get(key)
+            if entry is None:
+                return None
+            text, complete = entry
+            if not complete and len(text) < max_chars:
+                return None
+            self._texts.move_to_end(key)
+            return text[:max_chars]
+
+    def put(self, key, max_chars, text):
+        with self._lock:
+            # 文本不足 max_chars 说明已经读到文件末尾
+            self._texts[key] = (text, len(text) < max_chars)
+            self._texts.move_to_end(key)
+            while len(self._texts) > self.max_size:
+                self._texts.popitem(last=False)
+
+
+def get_preview_cache():
+    return current_app.extensions.setdefault('document_previews', PreviewCache())
+
+
+def get_document_text(document, max_chars=None):
+    """获取文档文本，首次使用时提取并写入缓存（调用方负责提交）
+
+    只需要开头部分（max_chars）且PDF尚未缓存时，只解析到字符上限所在的页为止，结果保存在进程内缓存中
+    （完整文本由文档处理流水线写入）。文件无法读取时返回None；解析失败时抛出异常，不写入缓存。
+    """
+    if document.file_type.lower() not in TEXT_FILE_TYPES:
+        return None
+    if document.extracted_text is not None:
+        return document.extracted_text
+
+    text = _text_from_same_file(document)
+    if text is not None:
+        store_extracted_text(document, text)
+        return text
+
+    preview = max_chars is not None and document.file_type.lower() == 'pdf'
+    if preview:
+        previews = get_preview_cache()
+        preview_key = (document.id, document.file_path)
+        text = previews.get(preview_key, max_chars)
+        if text is not None:
+            return text
+
+    # 按本地路径读取（PDF使用内存映射）
+    try:
+        with document_file(document) as path:
+            if preview:
+                text = read_pdf_text(path, max_chars=max_chars)
+                previews.put(preview_key, max_chars, text)
+                return text
+            text = extract_text(path, document.file_type)
+            file_hash = hash_file(path)
+    except StorageError:
+        return None
+    store_extracted_text(document, text, file_hash)
+    return text
@@ -0,0 +1,253 @@
+"""课程实时事件
+
+论坛发帖/回复、活动状态变化和新提交的响应在事务提交后发布到课程频道（course:<id>），
+客户端通过 Server-Sent Events 订阅（见 src/routes/events.py），不再轮询通知和列表接口。
+
+后端通过 EVENTS_BACKEND 配置：
+- memory（默认）：进程内代理，每个频道保留最近的事件用于断线续传
+- sqlite：多进程共享的本地文件代理（多个gunicorn worker时使用，可替换为Redis等发布订阅服务），
+  默认放在数据库文件旁边（见 app_data_path），频道按数据库标识区分
+- none：关闭事件推送
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import get_history
+from src.database import app_data_path, database_key, prepare_data_path
+from src.models.activity import Activity
+from src.models.forum import ForumPost, ForumReply
+from src.models.response import ActivityResponse
+from src.utils.commit_hooks import run_after_commit
+
+DEFAULT_BUFFER_SIZE = 200
+DEFAULT_RETENTION_SECONDS = 300
+DEFAULT_POLL_INTERVAL = 0.5
+
+# 只推送给课程教师的事件类型
+TEACHER_ONLY_EVENTS = frozenset({'activity.response', 'activity.tally'})
+
+
+def course_channel(course_id):
+    return f'course:{course_id}'
+
+
+class MemoryBroker:
+    """进程内事件代理，每个频道保留最近 buffer_size 条事件"""
+
+    name = 'memory'
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self._channels = {}
+        self._condition = threading.Condition()
+
+    def publish(self, channel, event_type, data):
+        with self._condition:
+            event_id = next(self._ids)
+            self._last_id = event_id
+            buffer = self._channels.setdefault(channel, deque(maxlen=self.buffer_size))
+            buffer.append({'id': event_id, 'type': event_type, 'data': data})
+            self._condition.notify_all()
+        return event_id
+
+    def last_event_id(self, channel):
+        return self._last_id
+
+    def read(self, channel, after_id, timeout):
+        """返回频道中ID大于 after_id 的事件，没有新事件时最多等待 timeout 秒"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                events = [e for e in self._channels.get(channel, ()) if e['id'] > after_id]
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events
+                self._condition.wait(remaining)
+
+
+class SQLiteBroker:
+    """基于本地SQLite文件的事件代理，同一台机器上的多个进程共享事件"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, retention=DEFAULT_RETENTION_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL, scope=''):
+        self.path = path
+        self.retention = retention
+        self.poll_interval = poll_interval
+        # 所属数据库的标识：共用同一文件的其他应用即使课程ID相同也不会收到本应用的事件
+        self.scope = scope
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+                'type TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_events_channel ON events (channel, id)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _channel(self, channel):
+        return f'{self.scope}/{channel}' if self.scope else channel
+
+    def publish(self, channel, event_type, data):
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO events (channel, type, data, created_at) VALUES (?, ?, ?, ?)',
+                (self._channel(channel), event_type, json.dumps(data), now)
+            )
+            conn.execute('DELETE FROM events WHERE created_at < ?', (now - self.retention,))
+            return cursor.lastrowid
+
+    def last_event_id(self, channel):
+        with self._connect() as conn:
+            return conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+
+    def read(self, channel, after_id, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    'SELECT id, type, data FROM events WHERE channel = ? AND id > ? ORDER BY id',
+                    (self._channel(channel), after_id)
+                ).fetchall()
+            if rows:
+                return [{'id': row[0], 'type': row[1], 'data': json.loads(row[2])} for row in rows]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(self.poll_interval, remaining))
+
+
+def init_events(app):
+    """根据应用配置创建事件代理"""
+    backend_name = app.config.get('EVENTS_BACKEND', os.environ.get('EVENTS_BACKEND', 'memory'))
+    if backend_name == 'none':
+        broker = None
+    elif backend_name == 'sqlite':
+        path = app.config.get('EVENTS_SQLITE_PATH') or app_data_path(app, 'events.db')
+        prepare_data_path(path)
+        broker = SQLiteBroker(path, int(app.config.get('EVENTS_RETENTION_SECONDS', DEFAULT_RETENTION_SECONDS)),
+                              scope=database_key(app))
+    elif backend_name == 'memory':
+        broker = MemoryBroker(int(app.config.get('EVENTS_BUFFER_SIZE', DEFAULT_BUFFER_SIZE)))
+    else:
+        raise ValueError(f'未知的事件后端: {backend_name}')
+    app.extensions['event_broker'] = broker
+    return broker
+
+
+def get_event_broker():
+    """获取当前应用的事件代理（未配置时返回None）"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('event_broker')
+
+
+def publish_after_commit(target, course_id, event_type, data):
+    """在 target 所在事务提交后向课程频道发布事件，事务回滚时不发布"""
+    broker = get_event_broker()
+    session = object_session(target)
+    if broker is None or session is None or course_id is None:
+        return
+    channel = course_channel(course_id)
+    run_after_commit(session, lambda: broker.publish(channel, event_type, data))
+
+
+def _post_course_id(connection, post_id):
+    table = ForumPost.__table__
+    return connection.execute(select(table.c.course_id).where(table.c.id == post_id)).scalar()
+
+
+def _content_changed(target, *keys):
+    return any(get_history(target, key).has_changes() for key in keys)
+
+
+@event.listens_for(ForumPost, 'after_insert')
+def _forum_post_created(mapper, connection, target):
+    publish_after_commit(target, target.course_id, 'forum.post', {
+        'post_id': target.id,
+        'user_id': target.user_id,
+        'title': target.title
+    })
+
+
+@event.listens_for(ForumPost, 'after_update')
+def _forum_post_updated(mapper, connection, target):
+    if _content_changed(target, 'title', 'content', 'is_pinned'):
+        publish_after_commit(target, target.course_id, 'forum.post_updated', {
+            'post_id': target.id,
+            'title': target.title,
+            'is_pinned': target.is_pinned
+        })
+
+
+@event.listens_for(ForumReply, 'after_insert')
+def _forum_reply_created(mapper, connection, target):
+    publish_after_commit(target, _post_course_id(connection, target.post_id), 'forum.reply', {
+        'post_id': target.post_id,
+        'reply_id': target.id,
+        'parent_reply_id': target.parent_reply_id,
+        'user_id': target.user_id
+    })
+
+
+@event.listens_for(ForumReply, 'after_update')
+def _forum_reply_updated(mapper, connection, target):
+    if _content_changed(target, 'content'):
+        publish_after_commit(target, _post_course_id(connection, target.post_id), 'forum.reply_updated', {
+            'post_id': target.post_id,
+            'reply_id': target.id
+        })
+
+
+@event.listens_for(Activity, 'after_insert')
+def _activity_created(mapper, connection, target):
+    publish_after_commit(target, target.course_id, 'activity.created', {
+        'activity_id': target.id,
+        'title': target.title,
+        'status': target.status
+    })
+
+
+@event.listens_for(Activity, 'after_update')
+def _activity_status_changed(mapper, connection, target):
+    history = get_history(target, 'status')
+    if not history.has_changes():
+        return
+    publish_after_commit(target, target.course_id, 'activity.status', {
+        'activity_id': target.id,
+        'status': target.status,
+        'previous_status': history.deleted[0] if history.deleted else None
+    })
+
+
+@event.listens_for(ActivityResponse, 'after_insert')
+def _response_submitted(mapper, connection, target):
+    table = Activity.__table__
+    course_id = connection.execute(
+        select(table.c.course_id).where(table.c.id == target.activity_id)
+    ).scalar()
+    publish_after_commit(target, course_id, 'activity.response', {
+        'activity_id': target.activity_id,
+        'response_id': target.id,
+        'student_id': target.student_id
+    })
+
+
+def format_sse(event_item):
+    """把事件编码为 text/event-stream 格式"""
+    payload = json.dumps(event_item['data'], ensure_ascii=False)
+    return f"id: {event_item['id']}\nevent: {event_item['type']}\ndata: {payload}\n\n"
@@ -0,0 +1,255 @@
+"""论坛全文搜索
+
+索引表 forum_search_index 由 ForumPost/ForumReply 的模型事件维护（见 src/models/forum.py）。
+搜索同时匹配帖子和回复，按帖子聚合：每个帖子取相关度最高的一条匹配生成高亮片段，
+结果按相关度排序并在数据库端分页。PostgreSQL 使用 ts_rank/ts_headline，
+SQLite 使用 FTS5 的 bm25/highlight/snippet；过短的搜索词退回对索引表的 LIKE 匹配。
+PostgreSQL 的 'simple' 分词不切分中日韩文字（整句成为一个词），含这些文字的搜索词退回 ILIKE 匹配
+（有 pg_trgm 时由 trigram 索引支持）。
+"""
+
+import html
+import re
+from sqlalchemy import text, union_all, select, literal
+from src.database import db
+from src.models.forum import (
+    ForumPost, ForumReply, FORUM_SEARCH_TABLE, SQLITE_TRIGRAM, DELETED_CONTENT_MESSAGES, index_search_document
+)
+
+# 高亮标记先用私有区字符占位，转义HTML后再替换为<mark>，避免用户内容注入标签
+_OPEN, _CLOSE = '\ue000', '\ue001'
+
+# 标题匹配的权重（相对正文）
+TITLE_WEIGHT = 4.0
+
+# 片段长度（SQLite为词元数，LIKE回退为字符数）
+SNIPPET_TOKENS = 16
+SNIPPET_CHARS = 80
+
+# 中日韩文字（PostgreSQL 全文检索无法按词匹配）
+_CJK_PATTERN = re.compile('[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]')
+
+
+def parse_search_terms(q):
+    """把搜索字符串拆分为搜索词（按空白分隔，去重并保持顺序）"""
+    terms = []
+    for term in q.split():
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def render_highlight(value):
+    """转义HTML并把占位标记替换为<mark>标签"""
+    if not value:
+        return value
+    return html.escape(value).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
+
+
+def _like_snippet(value, terms):
+    """在Python端为LIKE匹配生成高亮片段"""
+    if not value:
+        return ''
+    lowered = value.lower()
+    positions = [lowered.find(t.lower()) for t in terms if t.lower() in lowered]
+    start = max(min(positions) - SNIPPET_CHARS // 4, 0) if positions else 0
+    fragment = value[start:start + SNIPPET_CHARS]
+    pattern = re.compile('|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    fragment = pattern.sub(lambda m: f'{_OPEN}{m.group(0)}{_CLOSE}', fragment)
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if start + SNIPPET_CHARS < len(value) else ''
+    return f'{prefix}{fragment}{suffix}'
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+# 软删除的帖子（内容已替换为删除提示）
+_DELETED_CONTENT_SQL = ', '.join(f"'{message}'" for message in sorted(DELETED_CONTENT_MESSAGES))
+
+# 每个帖子只保留最佳匹配，并附带匹配数和结果总数；跳过软删除的帖子（包括索引中尚未清除的旧记录）
+_RANK_AND_PAGE = f"""
+ranked AS (
+    SELECT hits.*,
+           ROW_NUMBER() OVER (PARTITION BY hits.post_id ORDER BY hits.score DESC, hits.doc_type) AS rn,
+           COUNT(*) OVER (PARTITION BY hits.post_id) AS match_count
+    FROM hits JOIN forum_post p ON p.id = hits.post_id AND p.course_id = :course_id
+        AND p.content NOT IN ({_DELETED_CONTENT_SQL})
+),
+page AS (
+    SELECT post_id, doc_type, doc_id, score, match_count, title, body, COUNT(*) OVER () AS total
+    FROM ranked WHERE rn = 1
+    ORDER BY score DESC, post_id DESC
+    LIMIT :limit OFFSET :offset
+)
+"""
+
+
+def _search_postgres(course_id, terms, limit, offset):
+    # 每个词做前缀匹配，所有词都需要出现（'simple' 配置不做词干化，适合中英文混合内容）
+    words = [w for t in terms for w in re.findall(r'\w+', t)]
+    if not words:
+        return []
+    headline_options = f'StartSel={_OPEN}, StopSel={_CLOSE}'
+    sql = f"""
+WITH q AS (SELECT to_tsquery('simple', :tsquery) AS query),
+hits AS (
+    SELECT i.post_id, i.doc_type, i.doc_id, i.title, i.body,
+           ts_rank(i.document, q.query) AS score
+    FROM {FORUM_SEARCH_TABLE} i, q
+    WHERE i.course_id = :course_id AND i.document @@ q.query
+),
+{_RANK_AND_PAGE}
+SELECT page.post_id, page.doc_type, page.doc_id, page.score, page.match_count, page.total,
+       CASE WHEN page.title <> '' THEN ts_headline('simple', page.title, q.query, :title_options) END
+           AS title_highlight,
+       ts_headline('simple', page.body, q.query, :body_options) AS snippet
+FROM page, q
+ORDER BY page.score DESC, page.post_id DESC
+"""
+    return db.session.execute(text(sql), {
+        'tsquery': ' & '.join(f"'{w}':*" for w in words),
+        'course_id': course_id,
+        'limit': limit,
+        'offset': offset,
+        'title_options': f'{headline_options}, HighlightAll=true',
+        'body_options': f'{headline_options}, MaxWords=30, MinWords=10',
+    }).all()
+
+
+def _search_sqlite_fts(course_id, terms, limit, offset):
+    # 每个词作为短语匹配（trigram 分词下即子串匹配），所有词都需要出现
+    phrases = ['"' + t.replace('"', '""') + '"' + ('' if SQLITE_TRIGRAM else '*') for t in terms]
+    sql = f"""
+WITH hits AS (
+    SELECT CAST(post_id AS INTEGER) AS post_id, doc_type, CAST(doc_id AS INTEGER) AS doc_id,
+           -bm25({FORUM_SEARCH_TABLE}, {TITLE_WEIGHT}, 1.0) AS score,
+           highlight({FORUM_SEARCH_TABLE}, 0, :open, :close) AS title,
+           snippet({FORUM_SEARCH_TABLE}, 1, :open, :close, '…', {SNIPPET_TOKENS}) AS body
+    FROM {FORUM_SEARCH_TABLE}
+    WHERE {FORUM_SEARCH_TABLE} MATCH :query AND course_id = :course_id
+),
+{_RANK_AND_PAGE}
+SELECT post_id, doc_type, doc_id, score, match_count, total,
+       NULLIF(title, '') AS title_highlight, body AS snippet
+FROM page
+ORDER BY score DESC, post_id DESC
+"""
+    return db.session.execute(text(sql), {
+        'query': ' AND '.join(phrases),
+        'course_id': course_id,
+        'open': _OPEN,
+        'close': _CLOSE,
+        'limit': limit,
+        'offset': offset,
+    }).all()
+
+
+def _search_like(course_id, terms, limit, offset, operator='LIKE'):
+    """全文检索无法处理搜索词时的回退：在索引表上逐词（不区分大小写）子串匹配，新帖子在前"""
+    conditions = []
+    params = {'course_id': course_id, 'limit': limit, 'offset': offset}
+    for i, term in enumerate(terms):
+        params[f'term{i}'] = f'%{_escape_like(term)}%'
+        conditions.append(
+            f"(title {operator} :term{i} ESCAPE '\\' OR body {operator} :term{i} ESCAPE '\\')"
+        )
+    sql = f"""
+WITH hits AS (
+    SELECT CAST(post_id AS INTEGER) AS post_id, doc_type, CAST(doc_id AS INTEGER) AS doc_id,
+           CAST(post_id AS INTEGER) AS score, title, body  -- 没有相关度，以帖子ID排序
+    FROM {FORUM_SEARCH_TABLE}
+    WHERE course_id = :course_id AND {' AND '.join(conditions)}
+),
+{_RANK_AND_PAGE}
+SELECT post_id, doc_type, doc_id, score, match_count, total, title, body
+FROM page
+ORDER BY score DESC, post_id DESC
+"""
+    rows = db.session.execute(text(sql), params).all()
+    return [
+        (row.post_id, row.doc_type, row.doc_id, 0.0, row.match_count, row.total,
+         _like_snippet(row.title, terms) or None, _like_snippet(row.body, terms))
+        for row in rows
+    ]
+
+
+def use_like_search(dialect_name, terms):
+    """是否退回子串匹配：SQLite trigram 分词下有少于3个字符的词，或 PostgreSQL 下有中日韩文字的词"""
+    if dialect_name == 'postgresql':
+        return any(_CJK_PATTERN.search(t) for t in terms)
+    return SQLITE_TRIGRAM and any(len(t) < 3 for t in terms)
+
+
+def search_forum(course_id, q, page=1, per_page=20):
+    """在课程论坛中搜索帖子和回复，返回 (结果列表, 匹配的帖子总数)
+
+    每个结果对应一个帖子：post_id、最佳匹配的类型 matched（post/reply）和回复ID、
+    相关度 score、匹配数 match_count，以及转义后带<mark>高亮的 title_highlight 和 snippet。
+    """
+    terms = parse_search_terms(q)
+    if not terms:
+        return [], 0
+    limit = per_page
+    offset = (page - 1) * per_page
+
+    dialect_name = db.session.get_bind().dialect.name
+    if use_like_search(dialect_name, terms):
+        # PostgreSQL 的 LIKE 区分大小写，使用 ILIKE（SQLite 的 LIKE 本身不区分ASCII大小写）
+        rows = _search_like(course_id, terms, limit, offset, 'ILIKE' if dialect_name == 'postgresql' else 'LIKE')
+    elif dialect_name == 'postgresql':
+        rows = _search_postgres(course_id, terms, limit, offset)
+    else:
+        rows = _search_sqlite_fts(course_id, terms, limit, offset)
+
+    results = []
+    total = 0
+    for post_id, doc_type, doc_id, score, match_count, row_total, title_highlight, snippet in rows:
+        total = row_total
+        results.append({
+            'post_id': post_id,
+            'matched': doc_type,
+            'reply_id': doc_id if doc_type == 'reply' else None,
+            'score': round(float(score), 4),
+            'match_count': match_count,
+            'title_highlight': render_highlight(title_highlight),
+            'snippet': render_highlight(snippet)
+        })
+    if not results and page > 1:
+        # 页码超出范围时单独统计总数
+        total = search_forum(course_id, q, 1, 1)[1]
+    return results, total
+
+
+def rebuild_search_index(course_ids=None):
+    """根据已有帖子和回复重建搜索索引（用于回填旧数据），返回写入的记录数
+
+    course_ids 为空时处理所有课程。调用方负责提交事务。
+    """
+    posts = select(
+        literal('post').label('doc_type'), ForumPost.id.label('doc_id'), ForumPost.id.label('post_id'),
+        ForumPost.course_id, ForumPost.title, ForumPost.content
+    )
+    replies = select(
+        literal('reply').label('doc_type'), ForumReply.id.label('doc_id'), ForumReply.post_id,
+        ForumPost.course_id, literal('').label('title'), ForumReply.content
+    ).join(ForumPost, ForumPost.id == ForumReply.post_id)
+    if course_ids is not None:
+        posts = posts.where(ForumPost.course_id.in_(course_ids))
+        replies = replies.where(ForumPost.course_id.in_(course_ids))
+
+    connection = db.session.connection()
+    if course_ids is None:
+        connection.execute(text(f"DELETE FROM {FORUM_SEARCH_TABLE}"))
+    else:
+        for course_id in course_ids:
+            connection.execute(text(f"DELETE FROM {FORUM_SEARCH_TABLE} WHERE course_id = :course_id"),
+                               {'course_id': course_id})
+
+    count = 0
+    for row in connection.execute(union_all(posts, replies)):
+        index_search_document(connection, row.doc_type, row.doc_id, row.post_id,
+                              row.course_id, row.title, row.content)
+        count += 1
+    return count
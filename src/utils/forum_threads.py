@@ -0,0 +1,90 @@
+"""论坛帖子回复树加载
+
+回复与作者用 selectinload 成批加载：顶级回复一次查询（可按游标分页），
+当前页顶级回复下的所有后代按 root_reply_id 一次查询，查询次数与回复数量和嵌套层数无关。
+"""
+
+from sqlalchemy import update
+from sqlalchemy.orm import selectinload
+from src.database import db
+from src.models.forum import ForumPost, ForumReply
+from src.utils.pagination import keyset_page
+
+# 回复排序键：创建时间，ID保证顺序唯一
+REPLY_ORDER = (ForumReply.created_at, ForumReply.id)
+
+
+def _replies_query():
+    return ForumReply.query.options(selectinload(ForumReply.user))
+
+
+def load_reply_tree(post_id, limit=None, cursor=None):
+    """加载帖子的回复树，返回 (顶级回复列表, {父回复ID: 子回复列表}, 下一页游标)
+
+    limit 为空时返回所有顶级回复；否则按 (created_at, id) 分页，只加载当前页顶级回复的子树。
+    """
+    query = _replies_query().filter(ForumReply.post_id == post_id, ForumReply.parent_reply_id.is_(None))
+    if limit is None:
+        roots, next_cursor = query.order_by(*REPLY_ORDER).all(), None
+    else:
+        roots, next_cursor = keyset_page(query, list(REPLY_ORDER), cursor=cursor, limit=limit)
+
+    children = {}
+    if roots:
+        descendants = _replies_query().filter(
+            ForumReply.post_id == post_id,
+            ForumReply.root_reply_id.in_([reply.id for reply in roots])
+        ).order_by(*REPLY_ORDER).all()
+        for reply in descendants:
+            children.setdefault(reply.parent_reply_id, []).append(reply)
+    return roots, children, next_cursor
+
+
+def descendants_query(reply):
+    """回复的所有后代（按祖先路径前缀匹配，不需要递归）"""
+    return ForumReply.query.filter(
+        ForumReply.post_id == reply.post_id,
+        ForumReply.path.startswith(reply.child_path, autoescape=True)
+    )
+
+
+def rebuild_reply_positions(course_ids=None):
+    """根据 parent_reply_id 重新计算回复的深度、顶级回复ID和祖先路径（用于回填旧数据）
+
+    course_ids 为空时处理所有回复，返回更新的回复数。调用方负责提交事务。
+    """
+    query = db.session.query(ForumReply.id, ForumReply.parent_reply_id)
+    if course_ids is not None:
+        query = query.join(ForumPost, ForumPost.id == ForumReply.post_id)\
+            .filter(ForumPost.course_id.in_(course_ids))
+    parents = dict(query.all())
+
+    positions = {}
+
+    def position(reply_id):
+        # 沿父链向上直到已计算的祖先，再自上而下填充（避免深层递归）
+        chain = []
+        current = reply_id
+        while current in parents and current not in positions and current not in chain:
+            chain.append(current)
+            current = parents[current]
+        for node in reversed(chain):
+            parent_id = parents[node]
+            if parent_id is None or parent_id not in positions:
+                # 顶级回复，或父回复已不存在（视为顶级）
+                positions[node] = {'id': node, 'depth': 0, 'root_reply_id': None, 'path': ''}
+            else:
+                parent = positions[parent_id]
+                positions[node] = {
+                    'id': node,
+                    'depth': parent['depth'] + 1,
+                    'root_reply_id': parent['root_reply_id'] or parent_id,
+                    'path': f"{parent['path']}{parent_id:010d}/"
+                }
+        return positions[reply_id]
+
+    for reply_id in parents:
+        position(reply_id)
+    if positions:
+        db.session.execute(update(ForumReply), list(positions.values()))
+    return len(positions)
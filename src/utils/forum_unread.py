@@ -0,0 +1,185 @@
+"""论坛未读状态计算
+
+每门课程的论坛动态水位保存在 ForumActivity 中（发帖/回复时由模型事件维护），
+课程是否有未读只需按主键取出水位和用户的最后阅读时间并比较，与论坛内容多少无关。
+
+帖子级已读状态保存在 ForumThreadRead 中（回复ID水位 + 水位之上的稀疏已读集合），
+未读数由分组查询一次算出整页帖子的结果。用户自己的内容始终视为已读。
+"""
+
+from collections import defaultdict
+from sqlalchemy import and_, func, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import aliased
+from src.database import db
+from src.models.course import Course
+from src.models.forum import ForumPost, ForumReply, UserForumRead, ForumActivity, ForumThreadRead
+
+
+def rebuild_forum_activity(course_ids=None):
+    """根据已有帖子和回复重建课程论坛水位（用于回填旧数据），返回处理的课程数
+
+    course_ids 为空时处理所有课程。调用方负责提交事务。
+    """
+    posts = select(ForumPost.course_id, ForumPost.user_id, ForumPost.created_at)
+    replies = select(ForumPost.course_id, ForumReply.user_id, ForumReply.created_at)\
+        .join(ForumPost, ForumPost.id == ForumReply.post_id)
+    if course_ids is not None:
+        posts = posts.where(ForumPost.course_id.in_(course_ids))
+        replies = replies.where(ForumPost.course_id.in_(course_ids))
+    content = union_all(posts, replies).subquery()
+
+    # 每门课程每位作者的最新发言时间
+    rows = db.session.execute(
+        select(content.c.course_id, content.c.user_id, func.max(content.c.created_at).label('latest'))
+        .group_by(content.c.course_id, content.c.user_id)
+    ).all()
+    by_course = defaultdict(list)
+    for row in rows:
+        by_course[row.course_id].append((row.latest, row.user_id))
+
+    if course_ids is None:
+        course_ids = [course_id for (course_id,) in db.session.query(Course.id)]
+
+    values = []
+    for course_id in course_ids:
+        # 最新的两位不同作者即为 last 和 prev
+        authors = sorted(by_course.get(course_id, []), key=lambda item: item[0], reverse=True)
+        last = authors[0] if authors else (None, None)
+        prev = authors[1] if len(authors) > 1 else (None, None)
+        values.append({
+            'course_id': course_id,
+            'last_activity_at': last[0], 'last_author_id': last[1],
+            'prev_activity_at': prev[0], 'prev_author_id': prev[1]
+        })
+    if not values:
+        return 0
+
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(ForumActivity.__table__)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['course_id'],
+        set_={name: statement.excluded[name] for name in
+              ('last_activity_at', 'last_author_id', 'prev_activity_at', 'prev_author_id')}
+    ), values)
+    return len(values)
+
+
+def forum_unread_status(user_id, course_ids):
+    """返回 {course_id: {'has_unread': bool, 'last_read_at': datetime或None}}"""
+    course_ids = list(course_ids)
+    if not course_ids:
+        return {}
+
+    read = aliased(UserForumRead)
+    query = db.session.query(Course.id, ForumActivity, read.last_read_at).outerjoin(
+        ForumActivity, ForumActivity.course_id == Course.id
+    ).outerjoin(
+        read, and_(read.course_id == Course.id, read.user_id == user_id)
+    ).filter(Course.id.in_(course_ids))
+    rows = query.all()
+
+    # 尚未建立水位的课程（升级前的数据）先回填一次
+    missing = [course_id for course_id, activity, _ in rows if activity is None]
+    if missing:
+        rebuild_forum_activity(missing)
+        db.session.commit()
+        rows = query.all()
+
+    return {
+        course_id: {
+            'has_unread': activity.has_unread_for(user_id, last_read_at) if activity else False,
+            'last_read_at': last_read_at
+        }
+        for course_id, activity, last_read_at in rows
+    }
+
+
+def _course_last_read_at(user_id, course_id):
+    return db.session.query(UserForumRead.last_read_at).filter_by(
+        user_id=user_id, course_id=course_id
+    ).scalar()
+
+
+def post_unread_counts(user_id, course_id, posts=None):
+    """计算帖子的未读数（帖子本身未读计1，加上未读回复数），返回 {post_id: count}
+
+    posts 为帖子对象或包含 id/user_id/created_at 的行，省略时统计课程所有帖子。
+    无论帖子多少，只执行固定数量的查询。
+    """
+    if posts is None:
+        posts = db.session.query(ForumPost.id, ForumPost.user_id, ForumPost.created_at)\
+            .filter(ForumPost.course_id == course_id).all()
+    post_ids = [post.id for post in posts]
+    if not post_ids:
+        return {}
+
+    # 课程级“全部已读”时间之前的内容都已读
+    last_read_at = _course_last_read_at(user_id, course_id)
+    thread_reads = {
+        read.post_id: read for read in ForumThreadRead.query.filter(
+            ForumThreadRead.user_id == user_id,
+            ForumThreadRead.post_id.in_(post_ids)
+        )
+    }
+    read_above_mark = set()
+    for read in thread_reads.values():
+        read_above_mark |= read.get_read_reply_ids()
+
+    thread = aliased(ForumThreadRead)
+    reply_query = db.session.query(ForumReply.post_id, func.count(ForumReply.id)).outerjoin(
+        thread, and_(thread.post_id == ForumReply.post_id, thread.user_id == user_id)
+    ).filter(
+        ForumReply.post_id.in_(post_ids),
+        ForumReply.user_id != user_id,
+        ForumReply.id > func.coalesce(thread.read_up_to_reply_id, 0)
+    )
+    if last_read_at is not None:
+        reply_query = reply_query.filter(ForumReply.created_at > last_read_at)
+    if read_above_mark:
+        reply_query = reply_query.filter(ForumReply.id.notin_(read_above_mark))
+    unread_replies = dict(reply_query.group_by(ForumReply.post_id).all())
+
+    counts = {}
+    for post in posts:
+        post_unread = (
+            post.user_id != user_id
+            and post.id not in thread_reads
+            and (last_read_at is None or post.created_at > last_read_at)
+        )
+        counts[post.id] = (1 if post_unread else 0) + unread_replies.get(post.id, 0)
+    return counts
+
+
+def record_post_read(user_id, post, reply_ids=None):
+    """标记帖子已读；reply_ids 为空时整个帖子（含全部回复）已读，否则只标记这些回复
+
+    单独标记的回复先放入稀疏集合，连续已读的部分再合并进水位。调用方负责提交事务。
+    """
+    read = ForumThreadRead.query.filter_by(user_id=user_id, post_id=post.id).first()
+    if read is None:
+        read = ForumThreadRead(user_id=user_id, post_id=post.id, course_id=post.course_id,
+                               read_up_to_reply_id=0, read_reply_ids=[])
+        db.session.add(read)
+    mark = read.read_up_to_reply_id or 0
+
+    if reply_ids is None:
+        latest = db.session.query(func.max(ForumReply.id)).filter(ForumReply.post_id == post.id).scalar()
+        read.read_up_to_reply_id = max(mark, latest or 0)
+        read.read_reply_ids = []
+        return read
+
+    # 水位之上的回复（按ID顺序），用于校验和推进水位
+    pending = db.session.query(ForumReply.id, ForumReply.user_id).filter(
+        ForumReply.post_id == post.id, ForumReply.id > mark
+    ).order_by(ForumReply.id).all()
+    read_ids = read.get_read_reply_ids() | ({reply_id for reply_id, _ in pending} & set(reply_ids))
+    for reply_id, author_id in pending:
+        if reply_id not in read_ids and author_id != user_id:
+            break
+        mark = reply_id
+        read_ids.discard(reply_id)
+
+    read.read_up_to_reply_id = mark
+    read.read_reply_ids = sorted(read_ids)
+    return read
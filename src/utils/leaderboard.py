@@ -0,0 +1,304 @@
+"""课程排行榜计算工具"""
+
+from datetime import datetime
+from sqlalchemy import case, delete, func, insert, literal, select, union_all, update
+from sqlalchemy.orm.attributes import flag_modified
+from src.database import db
+from src.models.user import User
+from src.models.course import course_enrollments
+from src.models.activity import Activity
+from src.models.response import ActivityResponse
+from src.models.analytics import Leaderboard, LeaderboardEntry
+
+# 每次参与计入的积分
+PARTICIPATION_POINTS = 10
+
+# 课程默认排行榜名称
+DEFAULT_LEADERBOARD_NAME = '课程排行榜'
+
+
+def _standings_subquery(course_id, start_date=None, end_date=None):
+    """构建课程所有已注册学生的积分子查询（一次分组聚合）"""
+    # 先按学生聚合课程内的响应，再从注册表左连接，保证未参与的学生也在榜上
+    response_stats = select(
+        ActivityResponse.student_id.label('student_id'),
+        func.count(ActivityResponse.id).label('participation_count'),
+        func.avg(ActivityResponse.score).label('avg_score'),
+        func.sum(ActivityResponse.score).label('score_sum'),
+        func.count(ActivityResponse.score).label('scored_count')
+    ).join(
+        Activity, Activity.id == ActivityResponse.activity_id
+    ).where(
+        Activity.course_id == course_id
+    )
+    if start_date:
+        response_stats = response_stats.where(ActivityResponse.submitted_at >= start_date)
+    if end_date:
+        response_stats = response_stats.where(ActivityResponse.submitted_at <= end_date)
+    response_stats = response_stats.group_by(ActivityResponse.student_id).subquery()
+
+    participation_count = func.coalesce(response_stats.c.participation_count, 0)
+    avg_score = func.coalesce(response_stats.c.avg_score, 0)
+    total_score = participation_count * PARTICIPATION_POINTS + avg_score
+
+    return select(
+        User.id.label('student_id'),
+        User.full_name.label('student_name'),
+        User.student_id.label('student_id_number'),
+        participation_count.label('participation_count'),
+        avg_score.label('avg_score'),
+        total_score.label('total_score'),
+        func.coalesce(response_stats.c.score_sum, 0).label('score_sum'),
+        func.coalesce(response_stats.c.scored_count, 0).label('scored_count'),
+        func.rank().over(order_by=total_score.desc()).label('rank'),
+        func.count().over().label('total_students')
+    ).select_from(
+        course_enrollments
+    ).join(
+        User, User.id == course_enrollments.c.user_id
+    ).outerjoin(
+        response_stats, response_stats.c.student_id == User.id
+    ).where(
+        course_enrollments.c.course_id == course_id
+    ).subquery()
+
+
+def _row_to_dict(row):
+    """将查询行转换为排行榜条目"""
+    return {
+        'rank': row.rank,
+        'student_id': row.student_id,
+        'student_name': row.student_name,
+        'student_id_number': row.student_id_number,
+        'participation_count': row.participation_count,
+        'avg_score': round(float(row.avg_score), 2),
+        'total_score': round(float(row.total_score), 2)
+    }
+
+
+def compute_leaderboard(course_id, limit=None, offset=0, start_date=None, end_date=None):
+    """计算课程排行榜，返回 (条目列表, 学生总数)
+
+    无论课程有多少学生，都只执行一条SQL语句。
+    """
+    standings = _standings_subquery(course_id, start_date, end_date)
+    query = select(standings).order_by(standings.c.rank, standings.c.student_id)
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+
+    rows = db.session.execute(query).all()
+    if rows:
+        total = rows[0].total_students
+    elif offset:
+        # 偏移量超出范围时单独统计总人数
+        total = db.session.query(func.count()).select_from(course_enrollments).filter(
+            course_enrollments.c.course_id == course_id
+        ).scalar()
+    else:
+        total = 0
+    return [_row_to_dict(row) for row in rows], total
+
+
+def get_student_standing(course_id, student_id, start_date=None, end_date=None):
+    """查询某个学生在课程排行榜中的名次，未注册返回None"""
+    standings = _standings_subquery(course_id, start_date, end_date)
+    row = db.session.execute(
+        select(standings).where(standings.c.student_id == student_id)
+    ).first()
+    return _row_to_dict(row) if row else None
+
+
+# ---------------------------------------------------------------------------
+# 物化排行榜：每个学生的参与次数和分数合计保存在 LeaderboardEntry 中，
+# 响应提交和评分变化时只更新该学生的一行，名次在读取时用窗口函数计算。
+# ---------------------------------------------------------------------------
+
+# 排行榜配置中记录物化时间的键，没有该键的排行榜在下次读取时全量构建
+STANDINGS_BUILT_KEY = 'standings_built_at'
+
+
+def _is_built(leaderboard):
+    return bool(leaderboard.get_config().get(STANDINGS_BUILT_KEY))
+
+
+def _insert_entries(leaderboard, student_ids=None):
+    """从响应数据统计学生的累计数据并写入排行榜（一条 INSERT ... SELECT）"""
+    standings = _standings_subquery(leaderboard.course_id, leaderboard.start_date, leaderboard.end_date)
+    source = select(
+        literal(leaderboard.id), standings.c.student_id, standings.c.participation_count,
+        standings.c.score_sum, standings.c.scored_count
+    )
+    if student_ids is not None:
+        source = source.where(standings.c.student_id.in_(student_ids))
+    db.session.execute(insert(LeaderboardEntry).from_select(
+        ['leaderboard_id', 'student_id', 'participation_count', 'score_sum', 'scored_count'], source
+    ))
+
+
+def rebuild_standings(leaderboard):
+    """从响应数据全量重建排行榜的物化数据"""
+    if leaderboard.id is None:
+        db.session.flush()
+    db.session.execute(delete(LeaderboardEntry).where(LeaderboardEntry.leaderboard_id == leaderboard.id))
+    _insert_entries(leaderboard)
+    config = dict(leaderboard.get_config())
+    config.pop('standings', None)  # 旧版本保存在配置中的排名
+    config[STANDINGS_BUILT_KEY] = datetime.utcnow().isoformat()
+    leaderboard.config = config
+    flag_modified(leaderboard, 'config')
+    return leaderboard
+
+
+def get_course_leaderboard(course_id, leaderboard_id=None):
+    """获取课程排行榜，默认排行榜不存在时自动创建"""
+    if leaderboard_id is not None:
+        return Leaderboard.query.filter_by(id=leaderboard_id, course_id=course_id).first()
+
+    leaderboard = Leaderboard.query.filter_by(
+        course_id=course_id, is_active=True, start_date=None, end_date=None
+    ).order_by(Leaderboard.id).first()
+    if not leaderboard:
+        leaderboard = Leaderboard(course_id=course_id, name=DEFAULT_LEADERBOARD_NAME, config={})
+        db.session.add(leaderboard)
+    return leaderboard
+
+
+def ensure_standings(leaderboard):
+    """确保排行榜已物化且学生集合与选课名单一致：补上新选课的学生，删除已退课的学生"""
+    if not _is_built(leaderboard):
+        rebuild_standings(leaderboard)
+        db.session.commit()
+        return
+
+    enrolled_ids = select(course_enrollments.c.user_id).where(
+        course_enrollments.c.course_id == leaderboard.course_id
+    )
+    entry_ids = select(LeaderboardEntry.student_id).where(LeaderboardEntry.leaderboard_id == leaderboard.id)
+    # 一条语句找出两边不一致的学生
+    rows = db.session.execute(union_all(
+        select(course_enrollments.c.user_id.label('student_id'), literal(True).label('missing')).where(
+            course_enrollments.c.course_id == leaderboard.course_id,
+            course_enrollments.c.user_id.notin_(entry_ids)
+        ),
+        select(LeaderboardEntry.student_id, literal(False)).where(
+            LeaderboardEntry.leaderboard_id == leaderboard.id,
+            LeaderboardEntry.student_id.notin_(enrolled_ids)
+        )
+    )).all()
+    if not rows:
+        return
+
+    missing = [row.student_id for row in rows if row.missing]
+    dropped = [row.student_id for row in rows if not row.missing]
+    if dropped:
+        db.session.execute(delete(LeaderboardEntry).where(
+            LeaderboardEntry.leaderboard_id == leaderboard.id,
+            LeaderboardEntry.student_id.in_(dropped)
+        ))
+    if missing:
+        _insert_entries(leaderboard, missing)
+    db.session.commit()
+
+
+def _ranked_entries(leaderboard_id):
+    """排行榜条目及其名次（同分同名次）和总人数"""
+    avg_score = case(
+        (LeaderboardEntry.scored_count > 0, LeaderboardEntry.score_sum / LeaderboardEntry.scored_count),
+        else_=0.0
+    )
+    total_score = LeaderboardEntry.participation_count * PARTICIPATION_POINTS + avg_score
+    return select(
+        LeaderboardEntry.student_id.label('student_id'),
+        LeaderboardEntry.participation_count.label('participation_count'),
+        avg_score.label('avg_score'),
+        total_score.label('total_score'),
+        func.rank().over(order_by=total_score.desc()).label('rank'),
+        func.count().over().label('total_students')
+    ).where(LeaderboardEntry.leaderboard_id == leaderboard_id).subquery()
+
+
+def read_standings(leaderboard, limit=None, offset=0, student_id=None):
+    """读取物化排名的一页，返回 (条目列表, 总人数, 指定学生的条目)"""
+    ensure_standings(leaderboard)
+    ranked = _ranked_entries(leaderboard.id)
+    query = select(
+        ranked, User.full_name.label('student_name'), User.student_id.label('student_id_number')
+    ).join(User, User.id == ranked.c.student_id)
+
+    page_query = query.order_by(ranked.c.rank, ranked.c.student_id)
+    if offset:
+        page_query = page_query.offset(offset)
+    if limit is not None:
+        page_query = page_query.limit(limit)
+    rows = db.session.execute(page_query).all()
+    if rows:
+        total = rows[0].total_students
+    else:
+        total = db.session.query(func.count(LeaderboardEntry.id))\
+            .filter(LeaderboardEntry.leaderboard_id == leaderboard.id).scalar()
+
+    mine = None
+    if student_id is not None:
+        mine = next((row for row in rows if row.student_id == student_id), None)
+        if mine is None:
+            mine = db.session.execute(query.where(ranked.c.student_id == student_id)).first()
+
+    return [_row_to_dict(row) for row in rows], total, _row_to_dict(mine) if mine else None
+
+
+def _built_leaderboard_ids(course_id, moment):
+    """已物化、启用且时间范围包含 moment 的排行榜ID"""
+    boards = Leaderboard.query.filter_by(course_id=course_id, is_active=True).all()
+    return [board.id for board in boards if _is_built(board) and board.covers(moment)]
+
+
+def _update_entries(leaderboard_ids, student_id, participation=0, score_delta=0.0, scored_delta=0):
+    """原地累加学生在这些排行榜中的数据，只更新该学生的行
+
+    学生还没有条目（例如物化之后才选课）时不更新，下次读取时按选课名单补上。
+    """
+    if not leaderboard_ids:
+        return
+    db.session.execute(update(LeaderboardEntry).where(
+        LeaderboardEntry.leaderboard_id.in_(leaderboard_ids),
+        LeaderboardEntry.student_id == student_id
+    ).values(
+        participation_count=LeaderboardEntry.participation_count + participation,
+        score_sum=LeaderboardEntry.score_sum + score_delta,
+        scored_count=LeaderboardEntry.scored_count + scored_delta
+    ))
+
+
+def record_response(response, course_id):
+    """新响应提交后增量更新课程排行榜（需在flush之后、commit之前调用）"""
+    scored = response.score is not None
+    _update_entries(_built_leaderboard_ids(course_id, response.submitted_at), response.student_id,
+                    participation=1, score_delta=response.score if scored else 0.0, scored_delta=int(scored))
+
+
+def record_score_change(response, course_id, old_score):
+    """响应分数变化后增量更新课程排行榜"""
+    if old_score == response.score:
+        return
+    score_delta = (response.score or 0.0) - (old_score or 0.0)
+    scored_delta = int(response.score is not None) - int(old_score is not None)
+    _update_entries(_built_leaderboard_ids(course_id, response.submitted_at), response.student_id,
+                    score_delta=score_delta, scored_delta=scored_delta)
+
+
+def invalidate_standings(course_id):
+    """清除课程排行榜的物化数据（例如删除活动后），下次读取时重建"""
+    boards = Leaderboard.query.filter_by(course_id=course_id).all()
+    if not boards:
+        return
+    db.session.execute(delete(LeaderboardEntry).where(
+        LeaderboardEntry.leaderboard_id.in_([board.id for board in boards])
+    ))
+    for leaderboard in boards:
+        config = dict(leaderboard.get_config())
+        config.pop('standings', None)
+        if config.pop(STANDINGS_BUILT_KEY, None) is not None:
+            leaderboard.config = config
+            flag_modified(leaderboard, 'config')
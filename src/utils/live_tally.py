@@ -0,0 +1,204 @@
+"""进行中活动的实时统计
+
+活动开始时从数据库统计一次已有响应，之后每个新提交的响应在事务提交后直接累加到内存中的统计，
+并把增量作为 activity.tally 事件推送给教师。读取统计只需返回各选项计数和分数段，
+与响应数量无关；活动结束时丢弃。
+
+统计保存在当前进程内。多个工作进程时，读取前用响应数核对一次，
+其他进程处理的提交会使计数不一致，此时重新统计。
+"""
+
+import copy
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import object_session
+from src.database import db
+from src.models.response import ActivityResponse
+from src.utils.activity_analytics import score_bucket
+from src.utils.commit_hooks import run_after_commit
+from src.utils.events import course_channel, get_event_broker
+
+
+class TallyRegistry:
+    """进程内的活动统计表（按活动ID）"""
+
+    def __init__(self):
+        self._tallies = {}
+        self._lock = threading.Lock()
+
+    def get(self, activity_id):
+        with self._lock:
+            tally = self._tallies.get(activity_id)
+            return copy.deepcopy(tally) if tally is not None else None
+
+    def has(self, activity_id):
+        with self._lock:
+            return activity_id in self._tallies
+
+    def put(self, activity_id, tally):
+        with self._lock:
+            self._tallies[activity_id] = tally
+
+    def drop(self, activity_id):
+        with self._lock:
+            self._tallies.pop(activity_id, None)
+
+    def apply(self, activity_id, delta):
+        """把一个响应的增量累加到统计，统计不存在时返回None"""
+        with self._lock:
+            tally = self._tallies.get(activity_id)
+            if tally is None:
+                return None
+            _apply_delta(tally, delta)
+            return tally['response_count']
+
+
+def get_tally_registry():
+    return current_app.extensions.setdefault('live_tallies', TallyRegistry())
+
+
+def response_options(response_data):
+    """响应选择的 (题号, 选项) 列表；单题投票/测验的题号为 '0'"""
+    if not isinstance(response_data, dict):
+        return []
+    answers = response_data.get('answers')
+    if isinstance(answers, list):
+        choices = [
+            (answer.get('question_index', i), answer.get('option_index'))
+            for i, answer in enumerate(answers) if isinstance(answer, dict)
+        ]
+    else:
+        choices = [(0, response_data.get('option_index'))]
+    return [(str(question), str(option)) for question, option in choices if option is not None and option != '']
+
+
+def response_delta(response_data, score):
+    return {
+        'options': response_options(response_data),
+        'score_bucket': score_bucket(score) if score is not None else None,
+        'score': score
+    }
+
+
+def _empty_tally(activity):
+    return {
+        'activity_id': activity.id,
+        'activity_type': activity.activity_type,
+        'response_count': 0,
+        'option_counts': {},
+        'score_histogram': {},
+        'score_sum': 0.0,
+        'scored_count': 0,
+        'seeded_at': datetime.utcnow().isoformat()
+    }
+
+
+def _apply_delta(tally, delta):
+    tally['response_count'] += 1
+    for question, option in delta['options']:
+        counts = tally['option_counts'].setdefault(question, {})
+        counts[option] = counts.get(option, 0) + 1
+    if delta['score_bucket'] is not None:
+        histogram = tally['score_histogram']
+        histogram[delta['score_bucket']] = histogram.get(delta['score_bucket'], 0) + 1
+        tally['score_sum'] += delta['score']
+        tally['scored_count'] += 1
+
+
+def _response_count(activity_id):
+    return db.session.query(func.count(ActivityResponse.id))\
+        .filter(ActivityResponse.activity_id == activity_id).scalar()
+
+
+def _count_tally(activity):
+    """从数据库统计活动已有的响应"""
+    tally = _empty_tally(activity)
+    rows = db.session.query(ActivityResponse.response_data, ActivityResponse.score)\
+        .filter(ActivityResponse.activity_id == activity.id)
+    for response_data, score in rows:
+        _apply_delta(tally, response_delta(response_data, score))
+    return tally
+
+
+def seed_tally(activity):
+    """从数据库统计活动已有的响应并登记到进程内统计表"""
+    tally = _count_tally(activity)
+    get_tally_registry().put(activity.id, tally)
+    return copy.deepcopy(tally)
+
+
+def drop_tally(activity_id):
+    get_tally_registry().drop(activity_id)
+
+
+def get_live_tally(activity):
+    """获取活动的实时统计；尚未统计或与数据库的响应数不一致时重新统计"""
+    tally = get_tally_registry().get(activity.id)
+    if tally is None or tally['response_count'] != _response_count(activity.id):
+        tally = seed_tally(activity)
+    return tally
+
+
+def record_tally_response(activity, response):
+    """登记新响应（需在flush之后调用）：事务提交后累加到统计并向教师推送增量
+
+    本进程还没有该活动的统计时（进程重启、评分后丢弃等），在当前事务中重新统计（已包含本次响应），
+    提交后登记，推送的响应数始终是实际的统计值。
+    """
+    session = object_session(response)
+    if session is None:
+        return
+    registry = get_tally_registry()
+    broker = get_event_broker()
+    delta = response_delta(response.get_response_data(), response.score)
+    # 提交后对象属性会过期，这里先取出需要的值（响应需已flush）
+    activity_id, course_id, response_id = activity.id, activity.course_id, response.id
+    # 提交后不能再查询数据库，需要重新统计时在提交前完成
+    seeded = _count_tally(activity) if not registry.has(activity_id) else None
+
+    def apply():
+        if seeded is not None:
+            registry.put(activity_id, seeded)
+            response_count = seeded['response_count']
+        else:
+            response_count = registry.apply(activity_id, delta)
+        # 统计在提交前被丢弃（活动结束、评分变化）时不推送
+        if broker is not None and response_count is not None:
+            broker.publish(course_channel(course_id), 'activity.tally', {
+                'activity_id': activity_id,
+                'response_id': response_id,
+                'response_count': response_count,
+                'delta': {
+                    'options': [list(choice) for choice in delta['options']],
+                    'score_bucket': delta['score_bucket']
+                }
+            })
+
+    run_after_commit(session, apply)
+
+
+def record_tally_score_change(response, old_score):
+    """评分变化后在事务提交时丢弃统计，下次读取时重新统计（评分很少发生在活动进行中）"""
+    session = object_session(response)
+    if session is None or old_score == response.score:
+        return
+    registry = get_tally_registry()
+    activity_id = response.activity_id
+    run_after_commit(session, lambda: registry.drop(activity_id))
+
+
+def tally_summary(tally):
+    """接口返回的统计结果"""
+    scored = tally['scored_count']
+    return {
+        'activity_id': tally['activity_id'],
+        'activity_type': tally['activity_type'],
+        'response_count': tally['response_count'],
+        'option_counts': tally['option_counts'],
+        'score_histogram': tally['score_histogram'],
+        'avg_score': round(tally['score_sum'] / scored, 2) if scored else None,
+        'seeded_at': tally['seeded_at']
+    }
@@ -0,0 +1,74 @@
+"""游标分页工具
+
+游标是排序键取值的 base64 编码 JSON，下一页从上一页最后一行的排序键之后开始读取，
+避免 OFFSET 随页码增大而变慢。
+"""
+
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import literal, tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values):
+    """把排序键取值编码为游标字符串"""
+    payload = [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """解析游标字符串，格式无效时抛出ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = [datetime.fromisoformat(v['dt']) if isinstance(v, dict) else v for v in payload]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('无效的分页游标')
+    if not isinstance(payload, list) or len(values) != size:
+        raise ValueError('无效的分页游标')
+    return values
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """解析每页条数参数，超出范围时截断到 [1, maximum]"""
+    if value is None or value == '':
+        return default
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit 必须是整数')
+    return max(1, min(size, maximum))
+
+
+def keyset_condition(columns, values, descending=False):
+    """构造“排序键在游标之后”的过滤条件：(c1, c2, ...) > (v1, v2, ...)（降序时为 <）
+
+    使用行值比较（SQLite 3.15+ 和 PostgreSQL 均支持），数据库可以直接在复合索引上定位到游标位置，
+    而不是从头扫描再逐行过滤。
+    """
+    row = tuple_(*columns)
+    # 以绑定参数比较，布尔列也能使用 < / >
+    cursor_row = tuple_(*[literal(value, column.type) for column, value in zip(columns, values)])
+    return row < cursor_row if descending else row > cursor_row
+
+
+def keyset_page(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """按排序键读取一页，返回 (行列表, 下一页游标或None)
+
+    columns 为排序键列（最后一列应唯一，例如主键）；多读一行用于判断是否还有下一页。
+    """
+    if cursor:
+        query = query.filter(keyset_condition(columns, decode_cursor(cursor, len(columns)), descending))
+    order = [c.desc() for c in columns] if descending else list(columns)
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return rows, next_cursor
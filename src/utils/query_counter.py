@@ -0,0 +1,27 @@
+"""SQL语句计数（测试和基准测试用于检查接口执行的语句数）"""
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """上下文管理器：记录期间在数据库引擎上执行的SQL语句"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return False
@@ -0,0 +1,83 @@
+"""活动响应分页列表
+
+按 (submitted_at, id) 游标分页，并支持 fields= 参数只返回需要的字段：
+只加载用到的列，学生信息通过 selectinload 一次性加载。
+"""
+
+from sqlalchemy.orm import load_only, selectinload
+from src.models.response import ActivityResponse
+from src.models.user import User
+from src.utils.pagination import keyset_page, parse_page_size
+
+# 字段 -> (需要额外加载的响应列, 取值函数)
+RESPONSE_FIELDS = {
+    'id': ([], lambda r, a: r.id),
+    'activity_id': ([], lambda r, a: r.activity_id),
+    'activity_title': ([], lambda r, a: a.title),
+    'student_id': ([], lambda r, a: r.student_id),
+    'student_name': ([], lambda r, a: r.student.full_name if r.student else None),
+    'student_username': ([], lambda r, a: r.student.username if r.student else None),
+    'response_data': ([ActivityResponse.response_data], lambda r, a: r.get_response_data()),
+    'ai_analysis': ([ActivityResponse.ai_analysis], lambda r, a: r.get_ai_analysis()),
+    'similarity_score': ([ActivityResponse.similarity_score], lambda r, a: r.similarity_score),
+    'score': ([ActivityResponse.score], lambda r, a: r.score),
+    'feedback': ([ActivityResponse.feedback], lambda r, a: r.feedback),
+    'submitted_at': ([], lambda r, a: r.submitted_at.isoformat() if r.submitted_at else None),
+    'time_spent_seconds': ([ActivityResponse.time_spent_seconds], lambda r, a: r.time_spent_seconds),
+}
+
+# 未指定 fields 时的默认字段（不含体积较大的 ai_analysis）
+DEFAULT_RESPONSE_FIELDS = [f for f in RESPONSE_FIELDS if f != 'ai_analysis']
+
+STUDENT_FIELDS = {'student_name', 'student_username'}
+
+# 请求中出现这些参数时使用分页列表
+PAGINATION_PARAMS = ('limit', 'cursor', 'fields')
+
+
+def wants_pagination(args):
+    """请求是否使用分页列表（否则保持原来的完整列表）"""
+    return any(name in args for name in PAGINATION_PARAMS)
+
+
+def parse_fields(value):
+    """解析 fields 参数，包含未知字段时抛出ValueError"""
+    if not value:
+        return list(DEFAULT_RESPONSE_FIELDS)
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in RESPONSE_FIELDS]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}")
+    return fields
+
+
+def list_activity_responses(activity, args):
+    """读取活动响应的一页，返回 {'responses', 'next_cursor', 'limit', 'fields'}
+
+    参数无效时抛出ValueError。无论活动有多少响应，每页只执行固定数量的查询。
+    """
+    limit = parse_page_size(args.get('limit'))
+    fields = parse_fields(args.get('fields'))
+
+    columns = [ActivityResponse.id, ActivityResponse.activity_id,
+               ActivityResponse.student_id, ActivityResponse.submitted_at]
+    for field in fields:
+        columns.extend(RESPONSE_FIELDS[field][0])
+    query = ActivityResponse.query.filter_by(activity_id=activity.id).options(load_only(*columns))
+    if STUDENT_FIELDS.intersection(fields):
+        query = query.options(
+            selectinload(ActivityResponse.student).load_only(User.full_name, User.username)
+        )
+
+    responses, next_cursor = keyset_page(
+        query,
+        [ActivityResponse.submitted_at, ActivityResponse.id],
+        cursor=args.get('cursor'),
+        limit=limit
+    )
+    return {
+        'responses': [{f: RESPONSE_FIELDS[f][1](r, activity) for f in fields} for r in responses],
+        'next_cursor': next_cursor,
+        'limit': limit,
+        'fields': fields
+    }
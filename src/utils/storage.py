@@ -0,0 +1,164 @@
+"""课程文档的文件存储
+
+路由和文档处理流水线只通过 StorageBackend 读写文件，具体的存储位置由 STORAGE_BACKEND 配置：
+- supabase：Supabase Storage（src/utils/supabase_storage.py），配置了 SUPABASE_URL 时默认使用
+- local：本地目录 STORAGE_LOCAL_DIR，没有外部下载链接，由下载接口在权限检查之后直接发送文件
+
+上传和下载都按块进行，文件内容不会整体读入内存。
+"""
+
+import os
+import shutil
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from flask import current_app
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+
+class StorageError(Exception):
+    """存储后端的错误"""
+
+
+class StorageNotFound(StorageError):
+    """文件不存在"""
+
+
+class StorageBackend(ABC):
+    """文件存储接口，path 是存储内的相对路径（如 "课程ID/文件名"）；子类需要实现全部抽象方法"""
+
+    chunk_size = DEFAULT_CHUNK_SIZE
+
+    @abstractmethod
+    def upload(self, path, stream, content_type=None, size=None):
+        """从可读的二进制流按块上传文件"""
+
+    @abstractmethod
+    def stream(self, path, chunk_size=None):
+        """按块生成文件内容，文件不存在时抛出 StorageNotFound"""
+
+    @abstractmethod
+    def info(self, path):
+        """文件信息，文件不存在时抛出 StorageNotFound"""
+
+    @abstractmethod
+    def sign(self, path, expires_in):
+        """生成 expires_in 秒内有效的下载链接；没有外部链接的后端返回None，由应用直接发送文件"""
+
+    @abstractmethod
+    def delete(self, path):
+        """删除文件，文件不存在时忽略"""
+
+    def download(self, path):
+        """读取整个文件内容（只用于小文件，大文件用 stream 或 local_file）"""
+        return b''.join(self.stream(path))
+
+    def local_path(self, path):
+        """文件在本机上的路径，不在本机时返回None"""
+        return None
+
+    @contextmanager
+    def local_file(self, path):
+        """得到可以按路径读取的本地文件：本地存储直接返回原路径，其他存储按块下载到临时文件"""
+        existing = self.local_path(path)
+        if existing is not None:
+            if not os.path.exists(existing):
+                raise StorageNotFound(path)
+            yield existing
+            return
+        fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(path)[1])
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in self.stream(path):
+                    file.write(chunk)
+            yield temp_path
+        finally:
+            os.unlink(temp_path)
+
+    def iter_chunks(self, stream):
+        for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+            yield chunk
+
+
+class LocalStorage(StorageBackend):
+    """本地目录存储"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def local_path(self, path):
+        full_path = os.path.abspath(os.path.join(self.root, path))
+        if os.path.commonpath([self.root, full_path]) != self.root:
+            raise StorageError(f'Invalid storage path: {path}')
+        return full_path
+
+    def upload(self, path, stream, content_type=None, size=None):
+        full_path = self.local_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # 先写临时文件再替换，读取方不会看到写了一半的文件
+        temp_path = f'{full_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(temp_path, 'wb') as file:
+                shutil.copyfileobj(stream, file, self.chunk_size)
+            os.replace(temp_path, full_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def stream(self, path, chunk_size=None):
+        try:
+            file = open(self.local_path(path), 'rb')
+        except FileNotFoundError:
+            raise StorageNotFound(path)
+        with file:
+            yield from iter(lambda: file.read(chunk_size or self.chunk_size), b'')
+
+    def info(self, path):
+        try:
+            stat = os.stat(self.local_path(path))
+        except FileNotFoundError:
+            raise StorageNotFound(path)
+        return {'name': path, 'size': stat.st_size, 'updated_at': stat.st_mtime}
+
+    def sign(self, path, expires_in):
+        # 不生成可以绕过权限检查的链接
+        return None
+
+    def delete(self, path):
+        try:
+            os.remove(self.local_path(path))
+        except FileNotFoundError:
+            pass
+
+
+def create_storage(app):
+    """根据应用配置创建存储后端"""
+    def setting(name, default=None):
+        return app.config.get(name, os.environ.get(name, default))
+
+    supabase_url = setting('SUPABASE_URL')
+    supabase_key = setting('SUPABASE_SERVICE_ROLE_KEY')
+    backend = setting('STORAGE_BACKEND') or ('supabase' if supabase_url and supabase_key else 'local')
+    if backend == 'supabase':
+        from src.utils.supabase_storage import BUCKET_NAME, SupabaseStorage
+        return SupabaseStorage(supabase_url, supabase_key, setting('SUPABASE_BUCKET', BUCKET_NAME))
+    if backend == 'local':
+        root = setting('STORAGE_LOCAL_DIR') or os.path.join(app.root_path, 'uploads', 'storage')
+        return LocalStorage(root)
+    raise ValueError(f'未知的文件存储后端: {backend}')
+
+
+def init_storage(app):
+    """创建存储后端并保存在应用扩展中"""
+    storage = create_storage(app)
+    app.extensions['storage'] = storage
+    return storage
+
+
+def get_storage():
+    """获取当前应用的存储后端"""
+    return current_app.extensions['storage']
@@ -0,0 +1,105 @@
+"""学生仪表板统计
+
+课程数、参与次数、平均分和按课程的明细由一条分组查询得到；
+ETag 由学生最近一次提交时间等少量聚合值生成，数据未变化时接口直接返回304。
+"""
+
+import hashlib
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import joinedload
+from src.database import db
+from src.models.course import Course, course_enrollments
+from src.models.activity import Activity
+from src.models.response import ActivityResponse
+
+RECENT_RESPONSES_LIMIT = 5
+
+
+def student_dashboard_etag(student_id):
+    """根据学生的提交和选课情况生成ETag（一条查询）"""
+    responses = select(
+        func.max(ActivityResponse.submitted_at).label('last_submitted_at'),
+        func.count(ActivityResponse.id).label('response_count'),
+        func.sum(ActivityResponse.score).label('score_sum'),
+        func.count(ActivityResponse.feedback).label('feedback_count'),
+        func.sum(func.length(ActivityResponse.feedback)).label('feedback_length')
+    ).where(ActivityResponse.student_id == student_id).subquery()
+    enrollments = select(func.count().label('enrollment_count')).select_from(course_enrollments)\
+        .where(course_enrollments.c.user_id == student_id).subquery()
+
+    row = db.session.execute(select(responses, enrollments)).one()
+    # 分数和反馈（评分）变化不会改变提交时间，也计入指纹
+    fingerprint = '|'.join(str(value) for value in (
+        student_id, row.last_submitted_at, row.response_count, row.score_sum,
+        row.feedback_count, row.feedback_length, row.enrollment_count
+    ))
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+
+def compute_student_dashboard(student_id):
+    """计算学生仪表板数据：汇总统计、按课程明细和最近的提交"""
+    # 学生在每门课程的响应统计
+    response_stats = select(
+        Activity.course_id.label('course_id'),
+        func.count(ActivityResponse.id).label('participation_count'),
+        func.sum(ActivityResponse.score).label('score_sum'),
+        func.count(ActivityResponse.score).label('scored_count')
+    ).join(
+        Activity, Activity.id == ActivityResponse.activity_id
+    ).where(
+        ActivityResponse.student_id == student_id
+    ).group_by(Activity.course_id).subquery()
+
+    # 已选课程以及有提交记录的课程
+    enrollment = course_enrollments.alias('enrollment')
+    rows = db.session.query(
+        Course.id,
+        Course.course_code,
+        Course.course_name,
+        (enrollment.c.user_id.isnot(None)).label('enrolled'),
+        func.coalesce(response_stats.c.participation_count, 0).label('participation_count'),
+        func.coalesce(response_stats.c.score_sum, 0).label('score_sum'),
+        func.coalesce(response_stats.c.scored_count, 0).label('scored_count')
+    ).outerjoin(
+        enrollment, (enrollment.c.course_id == Course.id) & (enrollment.c.user_id == student_id)
+    ).outerjoin(
+        response_stats, response_stats.c.course_id == Course.id
+    ).filter(
+        or_(enrollment.c.user_id.isnot(None), response_stats.c.course_id.isnot(None))
+    ).order_by(Course.id).all()
+
+    course_breakdown = []
+    total_courses = 0
+    total_participations = 0
+    total_score = 0.0
+    total_scored = 0
+    for row in rows:
+        total_courses += 1 if row.enrolled else 0
+        total_participations += row.participation_count
+        total_score += row.score_sum
+        total_scored += row.scored_count
+        course_breakdown.append({
+            'course_id': row.id,
+            'course_code': row.course_code,
+            'course_name': row.course_name,
+            'enrolled': bool(row.enrolled),
+            'participation_count': row.participation_count,
+            'avg_score': round(row.score_sum / row.scored_count, 2) if row.scored_count else 0
+        })
+
+    # 最近参与的活动（预加载活动，序列化时不再逐条查询）
+    recent_responses = ActivityResponse.query.filter_by(student_id=student_id)\
+        .options(joinedload(ActivityResponse.activity))\
+        .order_by(ActivityResponse.submitted_at.desc())\
+        .limit(RECENT_RESPONSES_LIMIT).all()
+
+    return {
+        'role': 'student',
+        'stats': {
+            'total_courses': total_courses,
+            'total_participations': total_participations,
+            'avg_score': round(total_score / total_scored, 2) if total_scored else 0
+        },
+        'course_breakdown': course_breakdown,
+        'recent_responses': [response.to_dict() for response in recent_responses]
+    }
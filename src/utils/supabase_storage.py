@@ -1,17 +1,100 @@
-from supabase import create_client, Client
-from dotenv import load_dotenv
-import os
+"""Supabase存储后端
 
-load_dotenv()  # Load environment variables from .env file
+直接调用Supabase Storage的REST接口：HTTP客户端在第一次使用时创建并在线程间共享（保持连接复用），
+上传时按块发送请求体，下载时按块读取响应，文件内容不会整体读入内存。
+"""
 
-# Initialize Supabase client
-supabase_url = os.environ.get('SUPABASE_URL')
-supabase_service_key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+import threading
+from urllib.parse import quote
 
-if not supabase_url or not supabase_service_key:
-    raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY environment variables must be set")
-
-supabase: Client = create_client(supabase_url, supabase_service_key)
+import httpx
+from src.utils.storage import StorageBackend, StorageError, StorageNotFound
 
 # Bucket name for course documents
-BUCKET_NAME = 'course-documents'
\ No newline at end of file
+BUCKET_NAME = 'course-documents'
+
+DEFAULT_TIMEOUT = 60.0
+MAX_CONNECTIONS = 20
+
+
+class SupabaseStorage(StorageBackend):
+    """Supabase Storage 中的一个存储桶"""
+
+    def __init__(self, url, service_key, bucket=BUCKET_NAME, timeout=DEFAULT_TIMEOUT, transport=None):
+        if not url or not service_key:
+            raise StorageError('SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set to use Supabase storage')
+        self.base_url = url.rstrip('/') + '/storage/v1'
+        self.service_key = service_key
+        self.bucket = bucket
+        self.timeout = timeout
+        self._transport = transport
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """共享的HTTP客户端（首次使用时创建）"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        base_url=self.base_url,
+                        headers={'Authorization': f'Bearer {self.service_key}', 'apikey': self.service_key},
+                        timeout=self.timeout,
+                        limits=httpx.Limits(max_connections=MAX_CONNECTIONS),
+                        transport=self._transport
+                    )
+        return self._client
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def _object_url(self, *parts):
+        return '/'.join(('/object',) + parts[:-1] + (quote(parts[-1], safe='/'),))
+
+    @staticmethod
+    def _check(response, path):
+        if response.status_code == 404 or (response.status_code == 400 and b'not found' in response.content.lower()):
+            raise StorageNotFound(path)
+        if response.is_error:
+            raise StorageError(f'Supabase storage error {response.status_code}: {response.text}')
+
+    def _request(self, method, url, path, **kwargs):
+        try:
+            response = self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            raise StorageError(f'Supabase storage request failed: {e}') from e
+        self._check(response, path)
+        return response
+
+    def upload(self, path, stream, content_type=None, size=None):
+        headers = {'Content-Type': content_type or 'application/octet-stream', 'x-upsert': 'false'}
+        if size is not None:
+            # 已知大小时发送Content-Length，否则使用分块传输编码
+            headers['Content-Length'] = str(size)
+        self._request('POST', self._object_url(self.bucket, path), path,
+                      content=self.iter_chunks(stream), headers=headers)
+
+    def stream(self, path, chunk_size=None):
+        try:
+            with self.client.stream('GET', self._object_url(self.bucket, path)) as response:
+                if response.is_error:
+                    response.read()
+                    self._check(response, path)
+                yield from response.iter_bytes(chunk_size or self.chunk_size)
+        except httpx.HTTPError as e:
+            raise StorageError(f'Supabase storage request failed: {e}') from e
+
+    def info(self, path):
+        return self._request('GET', self._object_url('info', self.bucket, path), path).json()
+
+    def sign(self, path, expires_in):
+        response = self._request('POST', self._object_url('sign', self.bucket, path), path,
+                                 json={'expiresIn': expires_in})
+        return self.base_url + response.json()['signedURL']
+
+    def delete(self, path):
+        self._request('DELETE', f'/object/{self.bucket}', path, json={'prefixes': [path]})
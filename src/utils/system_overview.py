@@ -0,0 +1,219 @@
+"""系统概览统计工具（管理员与教师仪表板共用）"""
+
+from datetime import datetime, date, timedelta, timezone
+from sqlalchemy import func, case
+from src.database import db
+from src.models.user import User
+from src.models.course import Course
+from src.models.activity import Activity
+from src.models.response import ActivityResponse
+
+
+def _parse_iso(value):
+    """解析ISO日期字符串，带时区的转换为UTC的naive时间"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_date_range(args):
+    """从请求参数解析日期范围，默认过去12个月；参数无效时抛出ValueError"""
+    start_date_str = args.get('start_date')
+    end_date_str = args.get('end_date')
+
+    try:
+        if start_date_str:
+            start_date = _parse_iso(start_date_str)
+        else:
+            start_date = datetime.utcnow().replace(day=1) - timedelta(days=365)  # 默认过去12个月
+
+        if end_date_str:
+            end_date = _parse_iso(end_date_str)
+        else:
+            end_date = datetime.utcnow()  # 默认当前时间
+    except ValueError:
+        raise ValueError('无效的日期格式，请使用ISO格式 (YYYY-MM-DDTHH:MM:SS)')
+
+    # 确保开始日期不晚于结束日期
+    if start_date > end_date:
+        raise ValueError('开始日期不能晚于结束日期')
+
+    return start_date, end_date
+
+
+def compute_course_breakdown(teacher_id=None, start_date=None, end_date=None):
+    """计算课程完成率、用时和测验分数统计，返回 (course_breakdown, system_aggregates)
+
+    teacher_id 为空时统计所有课程；响应统计只包含日期范围内提交的响应。
+    无论课程数量多少，只执行两条分组查询。
+    """
+    # 每门课程的活动总数（没有活动的课程不参与统计）
+    activity_query = db.session.query(
+        Course.id,
+        Course.course_code,
+        Course.course_name,
+        func.count(Activity.id).label('total_activities')
+    ).join(Activity, Activity.course_id == Course.id)
+    if teacher_id is not None:
+        activity_query = activity_query.filter(Course.teacher_id == teacher_id)
+    activity_rows = activity_query.group_by(
+        Course.id, Course.course_code, Course.course_name
+    ).order_by(Course.id).all()
+
+    # 每门课程的响应统计：已完成活动数、用时和测验分数（条件聚合）
+    is_quiz = Activity.activity_type == 'quiz'
+    response_query = db.session.query(
+        Activity.course_id,
+        func.count(Activity.id.distinct()).label('completed_activities'),
+        func.sum(ActivityResponse.time_spent_seconds).label('total_time'),
+        func.avg(ActivityResponse.time_spent_seconds).label('avg_time'),
+        func.count(ActivityResponse.student_id.distinct()).label('user_count'),
+        func.avg(case((is_quiz, ActivityResponse.score))).label('avg_quiz_score'),
+        func.count(case((is_quiz, ActivityResponse.id))).label('quiz_responses')
+    ).join(Activity, Activity.id == ActivityResponse.activity_id)
+    if teacher_id is not None:
+        response_query = response_query.join(Course, Course.id == Activity.course_id)\
+            .filter(Course.teacher_id == teacher_id)
+    if start_date:
+        response_query = response_query.filter(ActivityResponse.submitted_at >= start_date)
+    if end_date:
+        response_query = response_query.filter(ActivityResponse.submitted_at <= end_date)
+    response_stats = {row.course_id: row for row in response_query.group_by(Activity.course_id)}
+
+    course_data = []
+    total_completion_rate = 0
+    total_time_spent = 0
+    total_quiz_score = 0
+
+    for row in activity_rows:
+        stats = response_stats.get(row.id)
+        completed_activities = stats.completed_activities if stats else 0
+        total_time = (stats.total_time if stats else None) or 0
+        avg_time_per_user = (stats.avg_time if stats else None) or 0
+        users_with_responses = stats.user_count if stats else 0
+        avg_quiz_score = float((stats.avg_quiz_score if stats else None) or 0)
+        quiz_responses = stats.quiz_responses if stats else 0
+
+        completion_rate = (completed_activities / row.total_activities) * 100
+
+        course_data.append({
+            'course_id': row.id,
+            'course_code': row.course_code,
+            'course_name': row.course_name,
+            'completion_rate': float(round(completion_rate, 2)),
+            'total_activities': row.total_activities,
+            'completed_activities': completed_activities,
+            'total_time_spent_seconds': total_time,
+            'avg_time_per_user_seconds': float(round(avg_time_per_user, 2)),
+            'users_with_responses': users_with_responses,
+            'avg_quiz_score': float(round(avg_quiz_score, 2)),
+            'quiz_responses': quiz_responses
+        })
+
+        total_completion_rate += completion_rate
+        total_time_spent += total_time
+        total_quiz_score += avg_quiz_score
+
+    # 系统级汇总
+    course_count = len(course_data)
+    system_aggregates = {
+        'avg_completion_rate': float(round(total_completion_rate / course_count, 2)) if course_count > 0 else 0.0,
+        'total_time_spent_seconds': total_time_spent,
+        'avg_quiz_score': float(round(total_quiz_score / course_count, 2)) if course_count > 0 else 0.0,
+        'total_courses_analyzed': course_count
+    }
+
+    return course_data, system_aggregates
+
+
+# 用户活动时间序列支持的粒度
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def _bucket_start(moment, granularity):
+    """时间点所在时间段的起始日期（周以周一为起点）"""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _next_bucket(bucket, granularity):
+    """下一个时间段的起始日期"""
+    if granularity == 'month':
+        if bucket.month == 12:
+            return bucket.replace(year=bucket.year + 1, month=1)
+        return bucket.replace(month=bucket.month + 1)
+    if granularity == 'week':
+        return bucket + timedelta(days=7)
+    return bucket + timedelta(days=1)
+
+
+def _bucket_label(bucket, granularity):
+    """时间段标签：按月为 YYYY-MM，按日/周为 YYYY-MM-DD"""
+    if granularity == 'month':
+        return f"{bucket.year}-{bucket.month:02d}"
+    return bucket.isoformat()
+
+
+def _bucket_expression(column, granularity):
+    """在数据库端把时间列截断到时间段起始日期（返回 YYYY-MM-DD 字符串）"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.to_char(func.date_trunc(granularity, column), 'YYYY-MM-DD')
+    # SQLite
+    if granularity == 'month':
+        return func.strftime('%Y-%m-01', column)
+    if granularity == 'week':
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.date(column)
+
+
+def _count_by_bucket(column, granularity, window_start, window_end):
+    """按时间段分组统计时间列落在窗口内的用户数"""
+    bucket = _bucket_expression(column, granularity)
+    rows = db.session.query(bucket, func.count(User.id)).filter(
+        column >= window_start,
+        column < window_end
+    ).group_by(bucket).all()
+    return {date.fromisoformat(key): count for key, count in rows if key}
+
+
+def compute_user_activity_series(start_date, end_date, granularity='month'):
+    """计算用户注册与活跃的时间序列
+
+    注册数和活跃数在数据库端按时间段分组统计，total_users 为截至每个时间段的累计用户数
+    （包含开始日期之前注册的用户）。查询次数与用户数、时间段数无关。
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"无效的时间粒度，可选值: {', '.join(GRANULARITIES)}")
+
+    first_bucket = _bucket_start(start_date, granularity)
+    last_bucket = _bucket_start(end_date, granularity)
+    window_start = datetime.combine(first_bucket, datetime.min.time())
+    window_end = datetime.combine(_next_bucket(last_bucket, granularity), datetime.min.time())
+
+    registrations = _count_by_bucket(User.created_at, granularity, window_start, window_end)
+    logins = _count_by_bucket(User.last_login, granularity, window_start, window_end)
+    cumulative_users = db.session.query(func.count(User.id)).filter(
+        User.created_at < window_start
+    ).scalar() or 0
+
+    series = []
+    bucket = first_bucket
+    while bucket <= last_bucket:
+        new_users = registrations.get(bucket, 0)
+        cumulative_users += new_users
+        label = _bucket_label(bucket, granularity)
+        series.append({
+            'month': label,
+            'period': label,
+            'new_users': new_users,
+            'total_users': cumulative_users,
+            'active_users': logins.get(bucket, 0)
+        })
+        bucket = _next_bucket(bucket, granularity)
+
+    return series
@@ -0,0 +1,166 @@
+"""词云活动的词频统计
+
+学生提交的关键词经过规范化（NFKC、去除首尾标点和空白、英文转小写、按 min_word_length 过滤）
+后累加到进程内的词频表，并记录已统计的最大响应ID。读取时只解析ID更大的新响应，
+返回频率最高的K个词时用堆选择，不对整个词表排序。
+
+中文不做分词：每个以逗号、顿号、分号或换行分隔的条目作为一个词，长度按字符计算。
+"""
+
+import heapq
+import re
+import string
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+from flask import current_app
+from sqlalchemy import func
+from src.database import db
+from src.models.response import ActivityResponse
+
+DEFAULT_MIN_WORD_LENGTH = 1
+# 进程内最多保留的活动词频表数量（按最近使用淘汰）
+MAX_CACHED_ACTIVITIES = 256
+
+# NFKC 之后全角标点已转换为半角，这里只需列出中文特有的分隔符
+_SEPARATORS = re.compile(r'[,;\n\r\t、；]+')
+_EDGE_CHARACTERS = string.punctuation + string.whitespace + '。、；：！？“”‘’（）《》【】「」…·—'
+
+
+def normalize_term(raw):
+    """规范化单个关键词，空词返回空字符串"""
+    term = unicodedata.normalize('NFKC', str(raw))
+    return ' '.join(term.split()).strip(_EDGE_CHARACTERS).casefold()
+
+
+def response_terms(response_data, min_word_length=DEFAULT_MIN_WORD_LENGTH, max_words=None):
+    """从词云响应中提取规范化后的关键词（同一响应中重复的词只计一次）"""
+    if not isinstance(response_data, dict):
+        return []
+    words = response_data.get('words')
+    if isinstance(words, str):
+        words = [words]
+    elif not isinstance(words, list):
+        return []
+
+    terms = []
+    seen = set()
+    for word in words:
+        if not isinstance(word, (str, int, float)):
+            continue
+        for part in _SEPARATORS.split(unicodedata.normalize('NFKC', str(word))):
+            term = normalize_term(part)
+            if len(term) < min_word_length or term in seen:
+                continue
+            seen.add(term)
+            terms.append(term)
+    return terms[:max_words] if max_words else terms
+
+
+def word_cloud_settings(activity):
+    """从活动配置中读取最小词长和每个响应的最大词数"""
+    config = activity.get_config()
+    try:
+        min_word_length = max(int(config.get('min_word_length') or DEFAULT_MIN_WORD_LENGTH), 1)
+    except (TypeError, ValueError):
+        min_word_length = DEFAULT_MIN_WORD_LENGTH
+    try:
+        max_words = int(config.get('max_words') or 0) or None
+    except (TypeError, ValueError):
+        max_words = None
+    return min_word_length, max_words
+
+
+class WordCounts:
+    """单个活动的词频表"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = Counter()
+        self.total_terms = 0
+        self.response_count = 0
+        self.last_response_id = 0
+
+    def add(self, response_id, response_data):
+        min_word_length, max_words = self.settings
+        terms = response_terms(response_data, min_word_length, max_words)
+        self.counts.update(terms)
+        self.total_terms += len(terms)
+        self.response_count += 1
+        self.last_response_id = max(self.last_response_id, response_id)
+
+    def top(self, k):
+        """频率最高的k个词，频率相同时按词排序"""
+        return heapq.nsmallest(k, self.counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+class WordCloudRegistry:
+    """进程内的词频表（按活动ID，最近使用的保留）"""
+
+    def __init__(self, max_size=MAX_CACHED_ACTIVITIES):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, activity_id, settings):
+        """获取活动的词频表；配置的词长/词数变化后重新创建"""
+        with self._lock:
+            entry = self._entries.get(activity_id)
+            if entry is None or entry.settings != settings:
+                entry = WordCounts(settings)
+                self._entries[activity_id] = entry
+            self._entries.move_to_end(activity_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return entry
+
+    def drop(self, activity_id):
+        with self._lock:
+            self._entries.pop(activity_id, None)
+
+
+def get_word_cloud_registry():
+    return current_app.extensions.setdefault('word_clouds', WordCloudRegistry())
+
+
+def _merge_responses(entry, activity_id):
+    rows = db.session.query(ActivityResponse.id, ActivityResponse.response_data).filter(
+        ActivityResponse.activity_id == activity_id,
+        ActivityResponse.id > entry.last_response_id
+    )
+    for response_id, response_data in rows:
+        entry.add(response_id, response_data)
+
+
+def _catch_up(entry, activity_id):
+    """合并水位之后的新响应；与数据库的响应数对不上（水位之前有响应被删除）时从头统计"""
+    total = db.session.query(func.count(ActivityResponse.id))\
+        .filter(ActivityResponse.activity_id == activity_id).scalar()
+    if total == entry.response_count:
+        return
+    if total > entry.response_count:
+        _merge_responses(entry, activity_id)
+    if entry.response_count != total:
+        entry.reset()
+        _merge_responses(entry, activity_id)
+
+
+def word_cloud_summary(activity, limit=50):
+    """词云活动当前的词频统计，返回频率最高的 limit 个词"""
+    settings = word_cloud_settings(activity)
+    entry = get_word_cloud_registry().get(activity.id, settings)
+    with entry.lock:
+        _catch_up(entry, activity.id)
+        return {
+            'activity_id': activity.id,
+            'response_count': entry.response_count,
+            'unique_terms': len(entry.counts),
+            'total_terms': entry.total_terms,
+            'min_word_length': settings[0],
+            'terms': [{'term': term, 'count': count} for term, count in entry.top(limit)]
+        }
@@ -1,5 +1,6 @@
 import pytest
 import os
+import shutil
 import tempfile
 from main import create_app
 from src.database import db
@@ -7,14 +8,34 @@ from src.models.user import User
 from src.models.course import Course, course_enrollments
 from src.models.activity import Activity
 from src.models.response import ActivityResponse
-from src.models.analytics import Leaderboard, ActivityAnalytics
-from src.models.document import Document
-from src.models.forum import ForumPost, ForumReply, UserForumRead
+from src.models.analytics import Leaderboard, LeaderboardEntry, ActivityAnalytics
+from src.models.document import Document, DocumentChunk
+from src.models.forum import ForumPost, ForumReply, UserForumRead, ForumActivity, ForumThreadRead
+from src.utils.query_counter import QueryCounter
 from flask import session
 
 
 @pytest.fixture
-def app():
+def data_dir():
+    """Temporary directory for the app's local data files (job queue, indexes)."""
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _test_config(data_dir):
+    # Settings applied before create_app() initialises its services;
+    # TESTING also makes document ingestion run inline instead of in a background worker.
+    return {
+        'TESTING': True,
+        'SECRET_KEY': 'test-secret-key',
+        'INGESTION_QUEUE_PATH': os.path.join(data_dir, 'ingestion.db'),
+        'RETRIEVAL_INDEX_DIR': os.path.join(data_dir, 'retrieval'),
+    }
+
+
+@pytest.fixture
+def app(data_dir):
     """Create and configure a test app instance."""
     import os
     database_url = os.environ.get('DATABASE_URL')
@@ -22,9 +43,7 @@ def app():
     if database_url and database_url.startswith('postgresql'):
         # Use PostgreSQL from environment
         print("Using PostgreSQL database for tests")
-        app = create_app()
-        app.config['TESTING'] = True
-        app.config['SECRET_KEY'] = 'test-secret-key'
+        app = create_app(_test_config(data_dir))
         
         with app.app_context():
             db.create_all()
@@ -49,9 +68,7 @@ def app():
         os.path.join = patched_join
 
         try:
-            app = create_app()
-            app.config['TESTING'] = True
-            app.config['SECRET_KEY'] = 'test-secret-key'
+            app = create_app(_test_config(data_dir))
 
             # Create the database and tables
             with app.app_context():
@@ -85,12 +102,16 @@ def test_users(app):
     with app.app_context():
         # Clear existing data in correct order to respect foreign keys
         db.session.query(UserForumRead).delete()
+        db.session.query(ForumThreadRead).delete()
+        db.session.query(ForumActivity).delete()
         db.session.query(ForumReply).delete()
         db.session.query(ForumPost).delete()
         db.session.query(ActivityResponse).delete()
         db.session.query(ActivityAnalytics).delete()
         db.session.query(Activity).delete()
+        db.session.query(DocumentChunk).delete()
         db.session.query(Document).delete()  # Delete documents before courses
+        db.session.query(LeaderboardEntry).delete()
         db.session.query(Leaderboard).delete()
         db.session.query(course_enrollments).delete()
         db.session.query(Course).delete()
@@ -184,4 +205,11 @@ def auth_client(app, client, test_users):
             sess['user_id'] = test_users['student2_id']
         clients['student2'] = client2
     
-    return clients
\ No newline at end of file
+    return clients
+
+@pytest.fixture
+def query_counter(app):
+    """Return a factory for QueryCounter context managers bound to the app's engine."""
+    with app.app_context():
+        engine = db.engine
+    return lambda: QueryCounter(engine)
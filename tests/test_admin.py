@@ -15,19 +15,22 @@ def admin_user(app):
         from src.models.course import Course, course_enrollments
         from src.models.activity import Activity
         from src.models.response import ActivityResponse
-        from src.models.analytics import Leaderboard, ActivityAnalytics
+        from src.models.analytics import Leaderboard, LeaderboardEntry, ActivityAnalytics
         from src.models.document import Document
-        from src.models.forum import ForumPost, ForumReply, UserForumRead
+        from src.models.forum import ForumPost, ForumReply, UserForumRead, ForumActivity, ForumThreadRead
         from src.database import db
         
         # Clear in correct order to respect foreign keys
         db.session.query(UserForumRead).delete()
+        db.session.query(ForumThreadRead).delete()
+        db.session.query(ForumActivity).delete()
         db.session.query(ForumReply).delete()
         db.session.query(ForumPost).delete()
         db.session.query(ActivityResponse).delete()
         db.session.query(ActivityAnalytics).delete()
         db.session.query(Activity).delete()
         db.session.query(Document).delete()
+        db.session.query(LeaderboardEntry).delete()
         db.session.query(Leaderboard).delete()
         db.session.query(course_enrollments).delete()
         db.session.query(Course).delete()
@@ -303,4 +306,128 @@ def test_system_overview_invalid_date_range(admin_client):
     
     data = response.get_json()
     assert 'error' in data
-    assert '开始日期不能晚于结束日期' in data['error']
\ No newline at end of file
+    assert '开始日期不能晚于结束日期' in data['error']
+
+def _create_users_at(created_dates, last_login=None):
+    """Create students registered at the given datetimes."""
+    import uuid
+    for created_at in created_dates:
+        name = f'series_{uuid.uuid4().hex[:8]}'
+        user = User(
+            username=name,
+            email=f'{name}@example.com',
+            full_name='Series Student',
+            role='student',
+            created_at=created_at,
+            last_login=last_login
+        )
+        user.set_password('password123')
+        db.session.add(user)
+    db.session.commit()
+
+
+def test_system_overview_user_activity_monthly(app, admin_client):
+    """Monthly series counts registrations per month and stays cumulative."""
+    from datetime import datetime
+    with app.app_context():
+        # Admin user registered now; these users are counted by month
+        _create_users_at([datetime(2023, 12, 20)])
+        _create_users_at([datetime(2024, 1, 5), datetime(2024, 1, 31, 23, 30)],
+                         last_login=datetime(2024, 3, 2))
+        _create_users_at([datetime(2024, 3, 15)])
+
+    response = admin_client.get(
+        '/api/admin/system-overview?start_date=2024-01-10T00:00:00&end_date=2024-03-20T00:00:00'
+    )
+    assert response.status_code == 200
+    series = response.get_json()['user_activity']
+
+    assert [item['month'] for item in series] == ['2024-01', '2024-02', '2024-03']
+    assert [item['new_users'] for item in series] == [2, 0, 1]
+    # The user registered before the range is included in the running total
+    assert [item['total_users'] for item in series] == [3, 3, 4]
+    assert [item['active_users'] for item in series] == [0, 0, 2]
+
+
+def test_system_overview_user_activity_granularity(app, admin_client):
+    """Daily and weekly buckets use ISO date labels; weeks start on Monday."""
+    from datetime import datetime
+    with app.app_context():
+        _create_users_at([datetime(2024, 5, 6, 9), datetime(2024, 5, 12, 22), datetime(2024, 5, 13, 1)])
+
+    params = 'start_date=2024-05-06T00:00:00&end_date=2024-05-14T00:00:00'
+    weekly = admin_client.get(f'/api/admin/system-overview?{params}&granularity=week').get_json()
+    assert [item['period'] for item in weekly['user_activity']] == ['2024-05-06', '2024-05-13']
+    assert [item['new_users'] for item in weekly['user_activity']] == [2, 1]
+
+    daily = admin_client.get(f'/api/admin/system-overview?{params}&granularity=day').get_json()
+    assert len(daily['user_activity']) == 9
+    assert daily['user_activity'][-1]['total_users'] == 3
+
+    invalid = admin_client.get(f'/api/admin/system-overview?{params}&granularity=year')
+    assert invalid.status_code == 400
+    assert 'error' in invalid.get_json()
+
+
+def test_system_overview_user_activity_query_count(app, admin_client, query_counter):
+    """The series is computed with a fixed number of statements."""
+    from datetime import datetime
+    with app.app_context():
+        _create_users_at([datetime(2022, month, 1) for month in range(1, 13)])
+
+    with query_counter() as short_range:
+        admin_client.get('/api/admin/system-overview?start_date=2022-01-01T00:00:00&end_date=2022-03-01T00:00:00')
+    with query_counter() as long_range:
+        admin_client.get('/api/admin/system-overview?start_date=2020-01-01T00:00:00&end_date=2024-12-01T00:00:00')
+    assert short_range.count == long_range.count
+
+
+def test_course_listings_use_fixed_statement_count(app, admin_client, admin_user, query_counter):
+    """Listing 200 courses costs the same handful of statements as listing one."""
+    from src.models.course import course_enrollments
+    with app.app_context():
+        teacher = User(username='list_teacher', email='list_teacher@example.com',
+                       full_name='List Teacher', role='teacher')
+        teacher.set_password('password123')
+        student = User(username='list_student', email='list_student@example.com',
+                       full_name='List Student', role='student')
+        student.set_password('password123')
+        db.session.add_all([teacher, student])
+        db.session.commit()
+        teacher_id, student_id = teacher.id, student.id
+
+        db.session.execute(Course.__table__.insert(), [
+            {'course_code': f'LIST{i:03d}', 'course_name': f'Course {i}', 'teacher_id': teacher_id,
+             'semester': 'Fall', 'academic_year': '2025-26', 'is_active': True}
+            for i in range(200)
+        ])
+        course_ids = [c.id for c in Course.query.order_by(Course.id)]
+        db.session.execute(course_enrollments.insert(), [
+            {'course_id': course_id, 'user_id': student_id} for course_id in course_ids[:50]
+        ])
+        db.session.add_all([
+            Activity(title=f'Activity {i}', activity_type='poll', course_id=course_ids[0],
+                     creator_id=teacher_id) for i in range(3)
+        ])
+        db.session.commit()
+
+    with query_counter() as counter:
+        response = admin_client.get('/api/admin/courses')
+    assert response.status_code == 200
+    courses = {c['id']: c for c in response.get_json()}
+    assert len(courses) == 200
+    assert courses[course_ids[0]]['student_count'] == 1
+    assert courses[course_ids[0]]['activity_count'] == 3
+    assert courses[course_ids[0]]['teacher_name'] == 'List Teacher'
+    assert courses[course_ids[-1]]['student_count'] == 0
+    # admin lookup + course list + one grouped count query
+    assert counter.count == 3
+
+    student_client = app.test_client()
+    with student_client.session_transaction() as sess:
+        sess['user_id'] = student_id
+    with query_counter() as counter:
+        response = student_client.get('/api/courses/available')
+    assert response.status_code == 200
+    assert len(response.get_json()) == 200
+    assert counter.count == 3
@@ -425,4 +425,782 @@ def test_admin_dashboard_ai_activities_count(admin_client, teacher_test_data):
         stats = data['stats']
         
         # Should count only AI activities (should be initial_count + 1)
-        assert stats['ai_activities'] == initial_count + 1
\ No newline at end of file
+        assert stats['ai_activities'] == initial_count + 1
+
+def _create_course_with_students(teacher_id, num_students, code_suffix):
+    """Create a course with one quiz and `num_students` enrolled students who each responded."""
+    course = Course(
+        course_name=f'Leaderboard Course {code_suffix}',
+        course_code=f'LB_{code_suffix}',
+        teacher_id=teacher_id,
+        semester='Fall 2025',
+        academic_year='2025-26'
+    )
+    db.session.add(course)
+    db.session.commit()
+
+    activity = Activity(
+        title='Leaderboard Quiz',
+        activity_type='quiz',
+        course_id=course.id,
+        creator_id=teacher_id,
+        status='active'
+    )
+    db.session.add(activity)
+
+    students = []
+    for i in range(num_students):
+        student = User(
+            username=f'lb_{code_suffix}_{i}',
+            email=f'lb_{code_suffix}_{i}@example.com',
+            full_name=f'LB Student {code_suffix} {i}',
+            role='student'
+        )
+        student.set_password('password123')
+        students.append(student)
+    db.session.add_all(students)
+    db.session.commit()
+
+    course.students.extend(students)
+    for i, student in enumerate(students):
+        db.session.add(ActivityResponse(
+            activity_id=activity.id,
+            student_id=student.id,
+            score=float(i),
+            response_data={'score': i}
+        ))
+    db.session.commit()
+    return course.id, [s.id for s in students]
+
+
+def test_leaderboard_scores_and_ranks(teacher_client, teacher_test_data):
+    """Test leaderboard totals are participation * 10 + average score."""
+    response = teacher_client.get(f"/api/analytics/leaderboard/{teacher_test_data['course1_id']}")
+    assert response.status_code == 200
+
+    data = response.get_json()
+    assert data['total'] == 1
+    entry = data['leaderboard'][0]
+    assert entry['student_id'] == teacher_test_data['student_id']
+    assert entry['participation_count'] == 1
+    assert entry['avg_score'] == 85.0
+    assert entry['total_score'] == 95.0
+    assert entry['rank'] == 1
+
+
+def test_leaderboard_pagination_and_my_rank(app, client, teacher_user):
+    """Test limit/offset paging and the student's own rank lookup."""
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 6, 'PAGE')
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        response = client.get(f'/api/analytics/leaderboard/{course_id}?limit=2&offset=2')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['total'] == 6
+        # Scores are 0..5, so the third and fourth places are students 3 and 2
+        assert [e['student_id'] for e in data['leaderboard']] == [student_ids[3], student_ids[2]]
+        assert [e['rank'] for e in data['leaderboard']] == [3, 4]
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = student_ids[0]
+        response = client.get(f'/api/analytics/leaderboard/{course_id}?limit=1')
+        data = response.get_json()
+        assert len(data['leaderboard']) == 1
+        assert data['my_rank']['student_id'] == student_ids[0]
+        assert data['my_rank']['rank'] == 6
+
+
+def test_leaderboard_query_count_is_constant(app, client, teacher_user, query_counter):
+    """Test the leaderboard issues the same number of statements regardless of class size."""
+    with app.app_context():
+        small_course_id, _ = _create_course_with_students(teacher_user, 3, 'SMALL')
+        large_course_id, _ = _create_course_with_students(teacher_user, 30, 'LARGE')
+
+    counts = []
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        for course_id in (small_course_id, large_course_id):
+            with query_counter() as counter:
+                response = client.get(f'/api/analytics/leaderboard/{course_id}')
+            assert response.status_code == 200
+            counts.append(counter.count)
+
+    assert counts[0] == counts[1]
+
+
+def test_leaderboard_materialized_entries(app, client, teacher_user):
+    """Test per-student leaderboard totals are stored in LeaderboardEntry after the first read."""
+    from src.models.analytics import Leaderboard
+
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 3, 'MAT')
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        response = client.get(f'/api/analytics/leaderboard/{course_id}')
+        assert response.status_code == 200
+        leaderboard_id = response.get_json()['leaderboard_id']
+
+    with app.app_context():
+        leaderboard = Leaderboard.query.get(leaderboard_id)
+        entries = {e.student_id: (e.participation_count, e.score_sum) for e in leaderboard.entries}
+        assert entries == {student_id: (1, float(i)) for i, student_id in enumerate(student_ids)}
+        assert leaderboard.get_config()['standings_built_at']
+
+
+def test_leaderboard_updates_incrementally_on_submit_and_feedback(app, client, teacher_user):
+    """Test submit_response and add_feedback update the materialized ranking in place."""
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 3, 'INC')
+        activity = Activity(
+            title='Second Quiz',
+            activity_type='quiz',
+            course_id=course_id,
+            creator_id=teacher_user,
+            status='active'
+        )
+        db.session.add(activity)
+        db.session.commit()
+        activity_id = activity.id
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        client.get(f'/api/analytics/leaderboard/{course_id}')
+
+        # The lowest ranked student answers a second quiz and jumps to first place
+        with client.session_transaction() as sess:
+            sess['user_id'] = student_ids[0]
+        response = client.post('/api/responses/', json={
+            'activity_id': activity_id,
+            'response_data': {'score': 50}
+        })
+        assert response.status_code == 201
+        response_id = response.get_json()['response']['id']
+
+        data = client.get(f'/api/analytics/leaderboard/{course_id}').get_json()
+        top = data['leaderboard'][0]
+        assert top['student_id'] == student_ids[0]
+        assert top['participation_count'] == 2
+        assert top['avg_score'] == 25.0
+        assert data['my_rank']['rank'] == 1
+
+        # Teacher regrades the new answer
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        response = client.post(f'/api/responses/{response_id}/feedback', json={
+            'feedback': 'Regraded',
+            'score': 100
+        })
+        assert response.status_code == 200
+
+        data = client.get(f'/api/analytics/leaderboard/{course_id}').get_json()
+        assert data['leaderboard'][0]['avg_score'] == 50.0
+        assert data['leaderboard'][0]['total_score'] == 70.0
+
+
+def test_leaderboard_submit_updates_only_the_student_row(app, client, teacher_user, query_counter):
+    """Test a submission updates one entry row without locking or rewriting the leaderboards."""
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 3, 'ROW')
+        activity = Activity(title='Row Quiz', activity_type='quiz', course_id=course_id,
+                            creator_id=teacher_user, status='active')
+        db.session.add(activity)
+        db.session.commit()
+        activity_id = activity.id
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        client.get(f'/api/analytics/leaderboard/{course_id}')
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = student_ids[1]
+        with query_counter() as counter:
+            response = client.post('/api/responses/', json={
+                'activity_id': activity_id, 'response_data': {'score': 40}
+            })
+        assert response.status_code == 201
+        writes = [s for s in counter.statements if 'leaderboard' in s.lower() and not s.lstrip().upper().startswith('SELECT')]
+        assert len(writes) == 1 and writes[0].lstrip().upper().startswith('UPDATE LEADERBOARD_ENTRY')
+        assert not any('FOR UPDATE' in s for s in counter.statements)
+
+
+def test_leaderboard_follows_enrollment_changes(app, client, teacher_user):
+    """Test dropping one student and enrolling another keeps the board in line with enrollment."""
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 3, 'ENR')
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        client.get(f'/api/analytics/leaderboard/{course_id}')
+
+        with app.app_context():
+            course = db.session.get(Course, course_id)
+            course.students.remove(db.session.get(User, student_ids[0]))
+            newcomer = User(username='lb_enr_new', email='lb_enr_new@example.com',
+                            full_name='Newcomer', role='student')
+            newcomer.set_password('password123')
+            course.students.append(newcomer)
+            db.session.commit()
+            newcomer_id = newcomer.id
+
+        # Same number of students, but a different set
+        data = client.get(f'/api/analytics/leaderboard/{course_id}').get_json()
+        assert data['total'] == 3
+        assert {e['student_id'] for e in data['leaderboard']} == {student_ids[1], student_ids[2], newcomer_id}
+        assert data['leaderboard'][-1]['student_id'] == newcomer_id
+
+
+def test_leaderboard_date_window(app, client, teacher_user):
+    """Test a leaderboard with a date range only counts responses inside the window."""
+    from datetime import datetime, timedelta
+
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 2, 'WIN')
+        old_response = ActivityResponse.query.filter_by(student_id=student_ids[1]).first()
+        old_response.submitted_at = datetime.utcnow() - timedelta(days=30)
+        db.session.commit()
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        start = (datetime.utcnow() - timedelta(days=7)).isoformat()
+        response = client.post(f'/api/analytics/leaderboard/{course_id}/boards', json={
+            'name': 'This week',
+            'start_date': start
+        })
+        assert response.status_code == 201
+        board_id = response.get_json()['leaderboard']['id']
+
+        data = client.get(f'/api/analytics/leaderboard/{course_id}?leaderboard_id={board_id}').get_json()
+        counts = {e['student_id']: e['participation_count'] for e in data['leaderboard']}
+        assert counts == {student_ids[0]: 1, student_ids[1]: 0}
+        assert data['start_date'] == start
+
+        boards = client.get(f'/api/analytics/leaderboard/{course_id}/boards').get_json()
+        assert board_id in [b['id'] for b in boards]
+
+
+def test_course_analytics_values(teacher_client, teacher_test_data):
+    """Test per-activity and per-student aggregates of the course analytics endpoint."""
+    response = teacher_client.get(f"/api/analytics/course/{teacher_test_data['course1_id']}/analytics")
+    assert response.status_code == 200
+
+    data = response.get_json()
+    assert data['total_activities'] == 2
+    assert data['total_students'] == 1
+
+    stats = {s['activity_id']: s for s in data['activity_stats']}
+    assert stats[teacher_test_data['activity1_id']]['response_count'] == 1
+    assert stats[teacher_test_data['activity1_id']]['avg_score'] == 85.0
+    assert stats[teacher_test_data['activity2_id']]['response_count'] == 0
+    assert stats[teacher_test_data['activity2_id']]['avg_score'] == 0
+
+    participation = data['student_participation'][0]
+    assert participation['student_id'] == teacher_test_data['student_id']
+    assert participation['participation_count'] == 1
+    assert participation['participation_rate'] == 0.5
+
+
+def test_course_analytics_statement_count_is_constant(app, client, teacher_user, query_counter):
+    """Test course analytics runs a fixed number of SQL statements regardless of course size."""
+    with app.app_context():
+        small_course_id, _ = _create_course_with_students(teacher_user, 2, 'CA_SMALL')
+        large_course_id, _ = _create_course_with_students(teacher_user, 25, 'CA_LARGE')
+        for i in range(5):
+            db.session.add(Activity(
+                title=f'Extra Poll {i}',
+                activity_type='poll',
+                course_id=large_course_id,
+                creator_id=teacher_user
+            ))
+        db.session.commit()
+
+    counts = []
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        for course_id in (small_course_id, large_course_id):
+            with query_counter() as counter:
+                response = client.get(f'/api/analytics/course/{course_id}/analytics')
+            assert response.status_code == 200
+            counts.append(counter.count)
+
+    assert counts[0] == counts[1]
+
+
+def test_teacher_system_overview_values(teacher_client, teacher_test_data):
+    """Test course breakdown values computed by the shared aggregation."""
+    response = teacher_client.get('/api/analytics/teacher/system-overview')
+    breakdown = {c['course_id']: c for c in response.get_json()['course_breakdown']}
+
+    course1 = breakdown[teacher_test_data['course1_id']]
+    assert course1['total_activities'] == 2
+    assert course1['completed_activities'] == 1
+    assert course1['completion_rate'] == 50.0
+    assert course1['total_time_spent_seconds'] == 300
+    assert course1['users_with_responses'] == 1
+    assert course1['avg_quiz_score'] == 85.0
+    assert course1['quiz_responses'] == 1
+
+
+def test_teacher_system_overview_filters_responses_by_date_range(teacher_client, teacher_test_data):
+    """Test responses submitted outside the requested window are not counted."""
+    response = teacher_client.get(
+        '/api/analytics/teacher/system-overview?start_date=2000-01-01T00:00:00&end_date=2000-12-31T23:59:59'
+    )
+    assert response.status_code == 200
+
+    data = response.get_json()
+    # Courses with activities are still listed, but nothing was submitted in 2000
+    assert len(data['course_breakdown']) == 2
+    for course in data['course_breakdown']:
+        assert course['completed_activities'] == 0
+        assert course['quiz_responses'] == 0
+        assert course['total_time_spent_seconds'] == 0
+    assert data['system_aggregates']['avg_completion_rate'] == 0.0
+
+
+def test_dashboard_served_from_cache_until_data_changes(app, teacher_client, teacher_user):
+    """Dashboard responses are cached per user and invalidated on commit."""
+    first = teacher_client.get('/api/analytics/dashboard')
+    assert first.status_code == 200
+    assert first.headers['X-Cache'] == 'MISS'
+
+    second = teacher_client.get('/api/analytics/dashboard')
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_json() == first.get_json()
+
+    with app.app_context():
+        db.session.add(Course(course_code='CACHE101', course_name='Cache Course',
+                              teacher_id=teacher_user, semester='Fall', academic_year='2025-26'))
+        db.session.commit()
+
+    third = teacher_client.get('/api/analytics/dashboard')
+    assert third.headers['X-Cache'] == 'MISS'
+    assert third.get_json()['stats']['total_courses'] == first.get_json()['stats']['total_courses'] + 1
+
+
+def test_login_does_not_invalidate_analytics_cache(app, teacher_client, teacher_user):
+    """Updating last_login on sign-in keeps cached dashboards; profile changes still invalidate them."""
+    teacher_client.get('/api/analytics/dashboard')
+    with app.app_context():
+        username = db.session.get(User, teacher_user).username
+    response = app.test_client().post('/api/auth/login', json={'username': username, 'password': 'password123'})
+    assert response.status_code == 200
+    assert teacher_client.get('/api/analytics/dashboard').headers['X-Cache'] == 'HIT'
+
+    with app.app_context():
+        db.session.get(User, teacher_user).full_name = 'Renamed Teacher'
+        db.session.commit()
+    assert teacher_client.get('/api/analytics/dashboard').headers['X-Cache'] == 'MISS'
+
+
+def test_analytics_cache_is_scoped_by_role(app, admin_client):
+    """A cached admin response is never served to a user with another role."""
+    assert admin_client.get('/api/admin/stats').status_code == 200
+    assert admin_client.get('/api/admin/stats').headers['X-Cache'] == 'HIT'
+
+    with app.app_context():
+        student = User(username='cache_student', email='cache_student@example.com',
+                       full_name='Cache Student', role='student')
+        student.set_password('password123')
+        db.session.add(student)
+        db.session.commit()
+        student_id = student.id
+
+    other = app.test_client()
+    with other.session_transaction() as sess:
+        sess['user_id'] = student_id
+    assert other.get('/api/admin/stats').status_code == 403
+
+
+def test_cache_stats_endpoint(admin_client):
+    """Hit/miss counters are exposed to admins."""
+    admin_client.delete('/api/admin/cache-stats')
+    admin_client.get('/api/admin/system-overview')
+    admin_client.get('/api/admin/system-overview')
+
+    stats = admin_client.get('/api/admin/cache-stats').get_json()
+    assert stats['backend'] == 'memory'
+    assert stats['hits'] >= 1
+    assert stats['misses'] >= 1
+    assert stats['entries'] >= 1
+
+
+def test_analytics_cache_backends(tmp_path, monkeypatch):
+    """Memory backend evicts by LRU and TTL; the SQLite backend is shared across instances."""
+    from src.utils import analytics_cache
+    from src.utils.analytics_cache import MemoryBackend, SQLiteBackend
+
+    memory = MemoryBackend(ttl=60, max_entries=2)
+    memory.set('a', b'1')
+    memory.set('b', b'2')
+    memory.get('a')
+    memory.set('c', b'3')
+    assert memory.get('b') is None
+    assert memory.get('a') == b'1'
+
+    clock = [1000.0]
+    monkeypatch.setattr(analytics_cache.time, 'monotonic', lambda: clock[0])
+    memory.set('d', b'4')
+    clock[0] += 61
+    assert memory.get('d') is None
+
+    path = str(tmp_path / 'cache.db')
+    writer = SQLiteBackend(ttl=60, path=path)
+    reader = SQLiteBackend(ttl=60, path=path)
+    writer.set('key', b'payload')
+    assert reader.get('key') == b'payload'
+    reader.clear()
+    assert writer.get('key') is None
+
+    # 共用缓存文件的其他数据库的应用看不到、也不会清除本应用的条目
+    ours, theirs = SQLiteBackend(ttl=60, path=path, scope='a'), SQLiteBackend(ttl=60, path=path, scope='b')
+    theirs.set('key', b'theirs')
+    assert ours.get('key') is None
+    ours.set('key', b'ours')
+    ours.clear()
+    assert theirs.get('key') == b'theirs' and len(theirs) == 1
+
+
+def test_activity_analytics_snapshot_built_on_stop(app, client, teacher_user):
+    """Stopping an activity stores an analytics snapshot that the endpoint serves."""
+    from src.models.analytics import ActivityAnalytics
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 3, 'SNAP')
+        activity_id = Activity.query.filter_by(course_id=course_id).first().id
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        assert client.post(f'/api/activities/{activity_id}/stop').status_code == 200
+
+        with app.app_context():
+            snapshot = ActivityAnalytics.query.filter_by(activity_id=activity_id).one()
+            assert snapshot.analytics_data['total_responses'] == 3
+            assert snapshot.analytics_data['score_sum'] == 3.0
+
+        data = client.get(f'/api/analytics/activity/{activity_id}/analytics').get_json()
+        assert data['total_responses'] == 3
+        assert data['avg_score'] == 1.0
+        assert data['score_distribution'] == {'0-9': 3}
+        assert len(data['responses']) == 3
+        assert data['responses'][0]['student_name'] == 'LB Student SNAP 0'
+
+        without_responses = client.get(
+            f'/api/analytics/activity/{activity_id}/analytics?include_responses=false'
+        ).get_json()
+        assert 'responses' not in without_responses
+
+
+def test_activity_analytics_snapshot_merges_new_responses_and_regrades(app, client, teacher_user):
+    """Later responses are merged into the snapshot and regrading adjusts it in place."""
+    from src.models.analytics import ActivityAnalytics
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 2, 'MERGE')
+        activity_id = Activity.query.filter_by(course_id=course_id).first().id
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        first = client.get(f'/api/analytics/activity/{activity_id}/analytics').get_json()
+        assert first['total_responses'] == 2
+
+        with app.app_context():
+            late = User(username='late_student', email='late_student@example.com',
+                        full_name='Late Student', role='student')
+            late.set_password('password123')
+            db.session.add(late)
+            db.session.commit()
+            late_response = ActivityResponse(activity_id=activity_id, student_id=late.id,
+                                             score=95.0, time_spent_seconds=30, response_data={})
+            db.session.add(late_response)
+            db.session.commit()
+            late_response_id = late_response.id
+
+        data = client.get(f'/api/analytics/activity/{activity_id}/analytics').get_json()
+        assert data['total_responses'] == 3
+        assert data['score_distribution'] == {'0-9': 2, '90-99': 1}
+        with app.app_context():
+            snapshot = ActivityAnalytics.query.filter_by(activity_id=activity_id).one()
+            assert snapshot.analytics_data['last_response_id'] == late_response_id
+
+        response = client.post(f'/api/responses/{late_response_id}/feedback', json={
+            'feedback': 'Regraded',
+            'score': 45
+        })
+        assert response.status_code == 200
+
+        data = client.get(f'/api/analytics/activity/{activity_id}/analytics').get_json()
+        assert data['score_distribution'] == {'0-9': 2, '40-49': 1}
+        assert data['avg_score'] == round((0 + 1 + 45) / 3, 2)
+
+        rebuilt = client.get(f'/api/analytics/activity/{activity_id}/analytics?refresh=true').get_json()
+        assert rebuilt['score_distribution'] == data['score_distribution']
+        assert rebuilt['avg_score'] == data['avg_score']
+
+
+def test_activity_analytics_snapshot_counts_late_committed_lower_ids(app, client, teacher_user, query_counter):
+    """A response committed after the snapshot with a lower id is still counted; unchanged reads do not write."""
+    from src.models.analytics import ActivityAnalytics
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 3, 'LATE')
+        activity_id = Activity.query.filter_by(course_id=course_id).first().id
+        # 模拟ID已分配但尚未提交的响应：先移出，快照建立后再以原ID写回
+        in_flight = ActivityResponse.query.filter_by(activity_id=activity_id, student_id=student_ids[1]).one()
+        in_flight_values = dict(id=in_flight.id, activity_id=activity_id, student_id=student_ids[1],
+                                score=in_flight.score, time_spent_seconds=in_flight.time_spent_seconds,
+                                response_data={})
+        db.session.delete(in_flight)
+        db.session.commit()
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        first = client.get(f'/api/analytics/activity/{activity_id}/analytics').get_json()
+        assert first['total_responses'] == 2
+
+        with query_counter() as counter:
+            unchanged = client.get(f'/api/analytics/activity/{activity_id}/analytics?include_responses=false')
+        assert unchanged.get_json()['total_responses'] == 2
+        assert not [s for s in counter.statements if 'activity_analytics' in s and not s.lstrip().upper().startswith('SELECT')]
+
+        with app.app_context():
+            db.session.add(ActivityResponse(**in_flight_values))
+            db.session.commit()
+
+        data = client.get(f'/api/analytics/activity/{activity_id}/analytics').get_json()
+        assert data['total_responses'] == 3
+        assert data['avg_score'] == 1.0
+        with app.app_context():
+            snapshot = ActivityAnalytics.query.filter_by(activity_id=activity_id).one()
+            assert snapshot.analytics_data['total_responses'] == 3
+
+
+def test_activity_analytics_statement_count_is_constant(app, client, teacher_user, query_counter):
+    """Serializing responses does not lazy-load each student."""
+    with app.app_context():
+        small_course, _ = _create_course_with_students(teacher_user, 3, 'AQS')
+        large_course, _ = _create_course_with_students(teacher_user, 30, 'AQL')
+        small_activity = Activity.query.filter_by(course_id=small_course).first().id
+        large_activity = Activity.query.filter_by(course_id=large_course).first().id
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        for activity_id in (small_activity, large_activity):
+            client.get(f'/api/analytics/activity/{activity_id}/analytics')
+
+        with query_counter() as small:
+            client.get(f'/api/analytics/activity/{small_activity}/analytics')
+        with query_counter() as large:
+            client.get(f'/api/analytics/activity/{large_activity}/analytics')
+        assert small.count == large.count
+
+
+def test_activity_responses_cursor_pagination(app, client, teacher_user):
+    """Pages follow (submitted_at, id) order and cover every response exactly once."""
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 25, 'PAGE')
+        activity_id = Activity.query.filter_by(course_id=course_id).first().id
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            url = f'/api/responses/activity/{activity_id}?limit=10'
+            if cursor:
+                url += f'&cursor={cursor}'
+            data = client.get(url).get_json()
+            pages += 1
+            assert len(data['responses']) <= 10
+            assert 'ai_analysis' not in data['responses'][0]
+            seen.extend(r['student_id'] for r in data['responses'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        assert pages == 3
+        assert seen == student_ids
+
+        # The analytics endpoint shares the same listing
+        data = client.get(f'/api/analytics/activity/{activity_id}/analytics?limit=5').get_json()
+        assert data['total_responses'] == 25
+        assert len(data['responses']) == 5
+        assert data['next_cursor']
+
+        # Without paging parameters the legacy list is returned unchanged
+        legacy = client.get(f'/api/responses/activity/{activity_id}').get_json()
+        assert isinstance(legacy, list)
+        assert len(legacy) == 25
+        assert 'ai_analysis' in legacy[0]
+
+
+def test_activity_responses_field_projection(app, client, teacher_user):
+    """fields= restricts the payload and rejects unknown names."""
+    with app.app_context():
+        course_id, _ = _create_course_with_students(teacher_user, 3, 'FIELDS')
+        activity_id = Activity.query.filter_by(course_id=course_id).first().id
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+
+        data = client.get(f'/api/responses/activity/{activity_id}?fields=id,student_name,score').get_json()
+        assert data['fields'] == ['id', 'student_name', 'score']
+        assert data['responses'][0] == {
+            'id': data['responses'][0]['id'],
+            'student_name': 'LB Student FIELDS 0',
+            'score': 0.0
+        }
+
+        response = client.get(f'/api/responses/activity/{activity_id}?fields=id,password_hash')
+        assert response.status_code == 400
+        response = client.get(f'/api/responses/activity/{activity_id}?cursor=not-a-cursor')
+        assert response.status_code == 400
+
+
+def test_activity_responses_page_statement_count_is_constant(app, client, teacher_user, query_counter):
+    """A page costs the same number of statements regardless of activity size."""
+    with app.app_context():
+        small_course, _ = _create_course_with_students(teacher_user, 5, 'PQS')
+        large_course, _ = _create_course_with_students(teacher_user, 60, 'PQL')
+        small_activity = Activity.query.filter_by(course_id=small_course).first().id
+        large_activity = Activity.query.filter_by(course_id=large_course).first().id
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = teacher_user
+        url = '/api/responses/activity/{}?limit=50&fields=id,student_name,student_username,score'
+        with query_counter() as small:
+            client.get(url.format(small_activity))
+        with query_counter() as large:
+            data = client.get(url.format(large_activity)).get_json()
+        assert len(data['responses']) == 50
+        assert small.count == large.count
+
+
+def test_student_dashboard_course_breakdown(app, client, teacher_user):
+    """The student dashboard summarises enrolled courses and per-course scores."""
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 3, 'SDASH')
+        other = Course(course_name='Other Course', course_code='SDASH_OTHER', teacher_id=teacher_user,
+                       semester='Fall 2025', academic_year='2025-26')
+        db.session.add(other)
+        db.session.commit()
+        other.students.append(db.session.get(User, student_ids[2]))
+        db.session.commit()
+        other_id = other.id
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = student_ids[2]
+        data = client.get('/api/analytics/dashboard').get_json()
+
+    assert data['stats'] == {'total_courses': 2, 'total_participations': 1, 'avg_score': 2.0}
+    breakdown = {c['course_id']: c for c in data['course_breakdown']}
+    assert breakdown[course_id]['participation_count'] == 1
+    assert breakdown[course_id]['avg_score'] == 2.0
+    assert breakdown[other_id]['participation_count'] == 0
+    assert data['recent_responses'][0]['activity_title'] == 'Leaderboard Quiz'
+
+
+def test_student_dashboard_etag(app, client, teacher_user):
+    """Repeated refreshes return 304 until the student's data changes."""
+    with app.app_context():
+        course_id, student_ids = _create_course_with_students(teacher_user, 2, 'ETAG')
+        activity = Activity(title='Second Quiz', activity_type='quiz', course_id=course_id,
+                            creator_id=teacher_user, status='active')
+        db.session.add(activity)
+        db.session.commit()
+        activity_id = activity.id
+
+    with client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = student_ids[0]
+        first = client.get('/api/analytics/dashboard')
+        etag = first.headers['ETag']
+        assert etag
+
+        cached = client.get('/api/analytics/dashboard', headers={'If-None-Match': etag})
+        assert cached.status_code == 304
+
+        # The ETag is also checked when the cached analytics entry has been dropped
+        app.extensions['analytics_cache'].invalidate()
+        assert client.get('/api/analytics/dashboard', headers={'If-None-Match': etag}).status_code == 304
+
+        response = client.post('/api/responses/', json={'activity_id': activity_id,
+                                                       'response_data': {'score': 70}})
+        assert response.status_code == 201
+
+        refreshed = client.get('/api/analytics/dashboard', headers={'If-None-Match': etag})
+        assert refreshed.status_code == 200
+        assert refreshed.headers['ETag'] != etag
+        assert refreshed.get_json()['stats']['total_participations'] == 2
+
+
+def test_word_cloud_terms_are_normalized():
+    """Keywords are NFKC-normalized, lowercased, split on Chinese and English separators."""
+    from src.utils.word_cloud import response_terms
+    data = {'words': ['Machine  Learning', '机器学习，深度学习、AI', 'ＡＩ!', '“数据”', 'a', '']}
+    assert response_terms(data) == ['machine learning', '机器学习', '深度学习', 'ai', '数据', 'a']
+    assert response_terms(data, min_word_length=2, max_words=3) == ['machine learning', '机器学习', '深度学习']
+    assert response_terms({'words': 'Python; python,  PYTHON '}) == ['python']
+    assert response_terms({'selected_option': 0}) == []
+
+
+def test_word_cloud_counts_update_incrementally(app, auth_client, test_course, test_users, query_counter):
+    """New responses are merged past the watermark; top terms come back by count."""
+    with app.app_context():
+        activity = Activity(title='Keywords', activity_type='word_cloud', course_id=test_course,
+                            creator_id=test_users['teacher_id'], status='active',
+                            config={'prompt': 'Topic?', 'max_words': 5, 'min_word_length': 2})
+        db.session.add(activity)
+        db.session.commit()
+        activity_id = activity.id
+
+    teacher = auth_client['teacher']
+    auth_client['student1'].post('/api/responses/', json={
+        'activity_id': activity_id, 'response_data': {'words': ['Python', '数据', 'x']}
+    })
+    data = teacher.get(f'/api/activities/{activity_id}/word-cloud').get_json()
+    assert data['response_count'] == 1
+    assert data['terms'] == [{'term': 'python', 'count': 1}, {'term': '数据', 'count': 1}]
+
+    auth_client['student2'].post('/api/responses/', json={
+        'activity_id': activity_id, 'response_data': {'words': ['python', '数据 ', 'Flask']}
+    })
+    with query_counter() as counter:
+        data = teacher.get(f'/api/activities/{activity_id}/word-cloud?limit=2').get_json()
+    assert data['response_count'] == 2
+    assert data['unique_terms'] == 3
+    assert data['total_terms'] == 5
+    assert data['terms'] == [{'term': 'python', 'count': 2}, {'term': '数据', 'count': 2}]
+    # 只解析水位之后的新响应
+    response_queries = [s for s in counter.statements if 'response_data' in s]
+    assert len(response_queries) == 1 and 'activity_response.id >' in response_queries[0]
+
+    assert auth_client['student1'].get(f'/api/activities/{activity_id}/word-cloud').status_code == 403
+    assert teacher.get(f'/api/activities/{activity_id}/word-cloud?limit=x').status_code == 400
+
+
+def test_word_cloud_rejects_other_activity_types(app, auth_client, test_course, test_users):
+    """The word-cloud endpoint only serves word_cloud activities."""
+    with app.app_context():
+        activity = Activity(title='Poll', activity_type='poll', course_id=test_course,
+                            creator_id=test_users['teacher_id'])
+        db.session.add(activity)
+        db.session.commit()
+        activity_id = activity.id
+    assert auth_client['teacher'].get(f'/api/activities/{activity_id}/word-cloud').status_code == 400
@@ -55,4 +55,111 @@ class TestCourseForumUnread:
             db.session.commit()
 
             # 现在应该有未读通知（来自其他用户的内容）
-            assert check_forum_unread(test_users['student1_id'], test_course) == True
\ No newline at end of file
+            assert check_forum_unread(test_users['student1_id'], test_course) == True
+    def test_course_list_unread_uses_single_query(self, app, client, test_users, query_counter):
+        """测试课程列表的未读状态一次查询得到，且区分已读和未读课程"""
+        with app.app_context():
+            student = db.session.get(User, test_users['student1_id'])
+            course_ids = []
+            for i in range(8):
+                course = Course(
+                    course_name=f'Unread Course {i}',
+                    course_code=f'UNREAD{i}',
+                    teacher_id=test_users['teacher_id'],
+                    semester='Fall 2025',
+                    academic_year='2025-26'
+                )
+                course.students.append(student)
+                db.session.add(course)
+                db.session.commit()
+                course_ids.append(course.id)
+
+            # 前四门课程有教师的新帖子；其中第二门课程已读
+            for course_id in course_ids[:4]:
+                post = ForumPost(course_id=course_id, user_id=test_users['teacher_id'],
+                                 title='News', content='Teacher news',
+                                 created_at=datetime.utcnow() - timedelta(minutes=5))
+                db.session.add(post)
+            db.session.add(UserForumRead(user_id=test_users['student1_id'], course_id=course_ids[1],
+                                         last_read_at=datetime.utcnow()))
+            # 第五门课程只有一条教师回复（回复在学生自己的帖子下）
+            own_post = ForumPost(course_id=course_ids[4], user_id=test_users['student1_id'],
+                                 title='Question', content='My question')
+            db.session.add(own_post)
+            db.session.commit()
+            db.session.add(ForumReply(post_id=own_post.id, user_id=test_users['teacher_id'],
+                                      content='Answer'))
+            db.session.commit()
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = test_users['student1_id']
+        # 第一次请求为没有论坛内容的课程建立水位记录
+        client.get('/api/courses/')
+        with query_counter() as counter:
+            response = client.get('/api/courses/')
+        assert response.status_code == 200
+        unread = {c['id']: c['forum_unread'] for c in response.get_json()}
+        assert [unread[course_id] for course_id in course_ids] == [
+            True, False, True, True, True, False, False, False
+        ]
+        # 用户 + 课程列表 + 课程计数 + 未读状态
+        assert counter.count == 4
+
+        notifications = client.get(f'/api/forum/{course_ids[1]}/notifications').get_json()
+        assert notifications['has_unread'] is False
+        assert notifications['last_read_at'] is not None
+        notifications = client.get(f'/api/forum/{course_ids[0]}/notifications?include_count=true').get_json()
+        assert notifications['has_unread'] is True
+        assert notifications['last_read_at'] is None
+        assert notifications['unread_count'] == 1
+
+    def test_forum_activity_watermark_tracks_latest_authors(self, app, test_users, test_course):
+        """测试发帖和回复会更新课程论坛水位，并记录最后一位作者之外的最新内容"""
+        from src.models.forum import ForumActivity
+        from src.routes.course import check_forum_unread
+
+        with app.app_context():
+            start = datetime.utcnow() - timedelta(hours=1)
+            post = ForumPost(course_id=test_course, user_id=test_users['teacher_id'],
+                             title='Welcome', content='Hello', created_at=start)
+            db.session.add(post)
+            db.session.commit()
+            db.session.add(UserForumRead(user_id=test_users['student1_id'], course_id=test_course,
+                                         last_read_at=start + timedelta(minutes=10)))
+            db.session.commit()
+
+            # 学生1在已读之后回复：最新内容是自己的，教师的内容已读
+            db.session.add(ForumReply(post_id=post.id, user_id=test_users['student1_id'],
+                                      content='Thanks', created_at=start + timedelta(minutes=20)))
+            db.session.commit()
+
+            watermark = db.session.get(ForumActivity, test_course)
+            assert watermark.last_author_id == test_users['student1_id']
+            assert watermark.prev_author_id == test_users['teacher_id']
+            assert watermark.prev_activity_at == start
+            assert check_forum_unread(test_users['student1_id'], test_course) == False
+            assert check_forum_unread(test_users['student2_id'], test_course) == True
+
+            # 学生2在学生1已读之后回复
+            db.session.add(ForumReply(post_id=post.id, user_id=test_users['student2_id'],
+                                      content='Me too', created_at=start + timedelta(minutes=30)))
+            db.session.commit()
+            assert check_forum_unread(test_users['student1_id'], test_course) == True
+
+    def test_forum_activity_backfilled_lazily(self, app, test_users, test_course):
+        """测试没有水位记录的课程在第一次检查时根据已有内容回填"""
+        from src.models.forum import ForumActivity
+        from src.routes.course import check_forum_unread
+
+        with app.app_context():
+            post = ForumPost(course_id=test_course, user_id=test_users['teacher_id'],
+                             title='Old post', content='Before upgrade')
+            db.session.add(post)
+            db.session.commit()
+            db.session.query(ForumActivity).delete()
+            db.session.commit()
+
+            assert check_forum_unread(test_users['student1_id'], test_course) == True
+            watermark = db.session.get(ForumActivity, test_course)
+            assert watermark.last_author_id == test_users['teacher_id']
+            assert watermark.prev_activity_at is None
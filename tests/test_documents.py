@@ -0,0 +1,469 @@
+import io
+import time
+from unittest.mock import patch
+
+import httpx
+import numpy as np
+import pytest
+from src.ai.retrieval import get_course_index, retrieve_chunks, tokenize
+from src.database import db
+from src.models.document import Document, DocumentChunk
+from src.utils.document_ingestion import get_ingestion_service, init_ingestion, split_into_chunks
+from src.utils.document_text import content_hash, get_document_text, iter_pdf_pages, read_pdf_text
+from src.utils.storage import LocalStorage, StorageNotFound, create_storage, init_storage
+from src.utils.supabase_storage import SupabaseStorage
+
+
+def _create_document(course_id, teacher_id, file_path, data, file_type='txt', name='notes.txt'):
+    document = Document(course_id=course_id, uploader_id=teacher_id, filename=name,
+                        stored_filename=name, file_path=str(file_path), file_size=len(data),
+                        file_type=file_type, title=name)
+    db.session.add(document)
+    db.session.commit()
+    return document.id
+
+
+@pytest.fixture
+def local_storage(app, tmp_path):
+    app.config['STORAGE_BACKEND'] = 'local'
+    app.config['STORAGE_LOCAL_DIR'] = str(tmp_path / 'storage')
+    return init_storage(app)
+
+
+def _make_pdf(page_texts):
+    """生成每页一行文字的简单PDF（Helvetica），返回字节内容"""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in page_texts:
+        stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>')
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    output += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('latin-1')
+    output += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    return bytes(output)
+
+
+class TestDocumentTextCache:
+    """测试文档文本的提取缓存"""
+
+    def test_text_extracted_once_and_reused(self, app, auth_client, test_course, test_users, tmp_path):
+        data = 'Recursion is a function calling itself.\n递归'.encode('utf-8')
+        path = tmp_path / 'notes.txt'
+        path.write_bytes(data)
+        with app.app_context():
+            document_id = _create_document(test_course, test_users['teacher_id'], path, data)
+
+        with patch('src.routes.ai_qa.ai_service.answer_question', return_value='ok') as answer:
+            response = auth_client['student1'].post(f'/api/ai-qa/course/{test_course}/ask',
+                                                    json={'question': 'What is recursion?'})
+            assert response.status_code == 200
+            context = answer.call_args[0][1]
+            assert context['documents'][0]['content'] == data.decode('utf-8')
+
+            with app.app_context():
+                document = db.session.get(Document, document_id)
+                assert document.extracted_text == data.decode('utf-8')
+                assert document.content_hash == content_hash(data)
+                assert document.text_extracted_at is not None
+
+            # 原文件不再需要读取
+            path.unlink()
+            auth_client['student1'].post(f'/api/ai-qa/course/{test_course}/ask', json={'question': 'Again?'})
+            assert answer.call_args[0][1]['documents'][0]['content'] == data.decode('utf-8')
+
+    def test_same_content_reuses_extracted_text(self, app, test_course, test_users, tmp_path):
+        data = b'Shared handout'
+        path = tmp_path / 'handout.txt'
+        path.write_bytes(data)
+        with app.app_context():
+            first_id = _create_document(test_course, test_users['teacher_id'], path, data)
+            get_document_text(db.session.get(Document, first_id))
+            db.session.commit()
+
+            copy_id = _create_document(test_course, test_users['teacher_id'], tmp_path / 'missing.txt', data)
+            copy = db.session.get(Document, copy_id)
+            copy.content_hash = content_hash(data)
+            assert get_document_text(copy) == 'Shared handout'
+
+    def test_pdf_preview_is_cached_in_process(self, app, test_course, test_users, local_storage):
+        data = _make_pdf([f'Slide {i} content' for i in range(1, 6)])
+        local_storage.upload(f'{test_course}/slides.pdf', io.BytesIO(data))
+        with app.app_context():
+            document_id = _create_document(test_course, test_users['teacher_id'], f'{test_course}/slides.pdf',
+                                           data, file_type='pdf', name='slides.pdf')
+            document = db.session.get(Document, document_id)
+            assert get_document_text(document, max_chars=20) == 'Slide 1 content\nSlid'
+
+            # 之后的请求不再读取存储中的文件，需要更多内容时才重新读取
+            local_storage.delete(f'{test_course}/slides.pdf')
+            assert get_document_text(document, max_chars=10) == 'Slide 1 co'
+            assert get_document_text(document, max_chars=40) is None
+            assert document.extracted_text is None
+
+    def test_unreadable_file_is_not_cached(self, app, test_course, test_users, tmp_path):
+        path = tmp_path / 'broken.txt'
+        path.write_bytes(b'\xff\xfe\xfa')
+        with app.app_context():
+            document_id = _create_document(test_course, test_users['teacher_id'], path, b'\xff\xfe\xfa')
+            document = db.session.get(Document, document_id)
+            from src.routes.ai_qa import extract_document_content
+            assert extract_document_content(document).startswith('无法读取TXT文件')
+            assert document.extracted_text is None
+
+
+class TestDocumentIngestion:
+    """测试文档处理流水线"""
+
+    @pytest.fixture
+    def ingestion(self, app, tmp_path, local_storage):
+        def configure(mode):
+            app.config['INGESTION_MODE'] = mode
+            app.config['INGESTION_QUEUE_PATH'] = str(tmp_path / 'jobs.db')
+            return init_ingestion(app)
+        return configure
+
+    def test_split_into_chunks_prefers_sentence_boundaries(self):
+        text = '第一句很长。' * 100 + '\n\n' + 'Second paragraph. ' * 100
+        chunks = split_into_chunks(text, size=200, overlap=30)
+        assert all(len(chunk) <= 200 for chunk in chunks)
+        assert all(chunk.endswith(('。', '.')) for chunk in chunks[:-1])
+        # 相邻分块有重叠，拼接后覆盖全文
+        assert chunks[0][-20:] in chunks[1]
+        assert text.strip().endswith(chunks[-1])
+
+    def test_inline_ingestion_stores_chunks(self, app, auth_client, test_course, test_users, tmp_path, ingestion):
+        ingestion('inline')
+        data = ('Page one about sorting.\f' + 'Page two about graphs. ' * 80).encode('utf-8')
+        path = tmp_path / 'lecture.txt'
+        path.write_bytes(data)
+        with app.app_context():
+            document_id = _create_document(test_course, test_users['teacher_id'], path, data, name='lecture.txt')
+
+        teacher = auth_client['teacher']
+        job = teacher.post(f'/api/documents/{document_id}/ingest').get_json()
+        assert job['status'] == 'completed'
+        assert job['chunk_count'] >= 3
+        assert teacher.get(f'/api/documents/jobs/{job["id"]}').get_json() == job
+        assert auth_client['student1'].get(f'/api/documents/jobs/{job["id"]}').status_code == 403
+
+        with app.app_context():
+            chunks = DocumentChunk.query.filter_by(document_id=document_id).order_by(DocumentChunk.chunk_index).all()
+            assert len(chunks) == job['chunk_count']
+            assert (chunks[0].page_number, chunks[0].content) == (1, 'Page one about sorting.')
+            assert {chunk.page_number for chunk in chunks[1:]} == {2}
+            document = db.session.get(Document, document_id)
+            assert document.extracted_text == data.decode('utf-8')
+            assert document.content_hash == content_hash(data)
+
+        # 重新处理时替换旧的分块；删除文档时一并删除
+        job = teacher.post(f'/api/documents/{document_id}/ingest').get_json()
+        with app.app_context():
+            assert DocumentChunk.query.filter_by(document_id=document_id).count() == job['chunk_count']
+        assert teacher.delete(f'/api/documents/{document_id}').status_code == 200
+        with app.app_context():
+            assert DocumentChunk.query.count() == 0
+
+    def test_queue_is_scoped_to_the_app_database(self, app, tmp_path):
+        from src.utils.document_ingestion import SQLiteJobQueue
+        path = str(tmp_path / 'shared.db')
+        ours, theirs = SQLiteJobQueue(path, scope='a'), SQLiteJobQueue(path, scope='b')
+        job_id = theirs.enqueue(1)
+        # 共用队列文件时不会领取或看到其他数据库的任务
+        assert ours.claim() is None
+        assert ours.get(job_id) is None
+        assert theirs.claim()['id'] == job_id
+
+        # 测试时默认直接处理，不启动后台线程
+        service = app.extensions['document_ingestion']
+        assert service.mode == 'inline'
+        assert service.worker is None
+
+    def test_failed_jobs_back_off_and_running_jobs_heartbeat(self, app, test_course, test_users, tmp_path):
+        from src.utils.document_ingestion import SQLiteJobQueue, run_ingestion_job
+        queue = SQLiteJobQueue(str(tmp_path / 'jobs.db'), stale_seconds=60)
+        path = tmp_path / 'notes.txt'
+        path.write_bytes(b'Notes')
+        with app.app_context():
+            job_id = queue.enqueue(_create_document(test_course, test_users['teacher_id'], path, b'Notes'))
+            run_ingestion_job(queue.claim(), queue, run=lambda func, *args: 1 / 0)
+        # 失败的任务等待退避时间后才重新领取
+        assert queue.get(job_id)['status'] == 'pending'
+        assert queue.claim() is None
+
+        with queue._connect() as conn:
+            conn.execute('UPDATE ingestion_jobs SET available_at = 0, updated_at = 0 WHERE id = ?', (job_id,))
+        assert queue.claim()['attempts'] == 2
+        # 有心跳的运行中任务不会被当作超时重新领取
+        with queue._connect() as conn:
+            conn.execute('UPDATE ingestion_jobs SET updated_at = 0 WHERE id = ?', (job_id,))
+        queue.heartbeat(job_id)
+        assert queue.claim() is None
+
+    def test_ingestion_disabled_when_queue_path_is_not_writable(self, app, tmp_path):
+        blocker = tmp_path / 'read-only'
+        blocker.write_bytes(b'')
+        app.config['INGESTION_QUEUE_PATH'] = str(blocker / 'ingestion.db')
+        app.config.pop('INGESTION_MODE', None)
+        assert init_ingestion(app) is None
+
+    def test_chunks_deleted_with_course(self, app, auth_client, test_course, test_users, tmp_path, ingestion):
+        from src.models.course import Course
+        from src.models.user import User
+        ingestion('inline')
+        path = tmp_path / 'lecture.txt'
+        path.write_bytes(b'Chunked lecture notes. ' * 100)
+        with app.app_context():
+            document_id = _create_document(test_course, test_users['teacher_id'], path, path.read_bytes())
+            assert get_ingestion_service().submit(db.session.get(Document, document_id))['chunk_count'] > 0
+            admin = User(username='chunk_admin', email='chunk_admin@example.com', full_name='Admin', role='admin')
+            admin.set_password('password123')
+            db.session.add(admin)
+            db.session.commit()
+            admin_id = admin.id
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin_id
+        assert client.delete(f'/api/admin/courses/{test_course}').status_code == 200
+        with app.app_context():
+            assert db.session.get(Course, test_course) is None
+            assert Document.query.count() == 0
+            assert DocumentChunk.query.count() == 0
+
+    def test_failed_job_reports_error(self, app, auth_client, test_course, test_users, tmp_path, ingestion):
+        ingestion('inline')
+        with app.app_context():
+            document_id = _create_document(test_course, test_users['teacher_id'], f'{test_course}/gone.txt', b'x')
+        job = auth_client['teacher'].post(f'/api/documents/{document_id}/ingest').get_json()
+        assert job['status'] == 'failed'
+        assert 'gone.txt' in job['error']
+
+    def test_upload_returns_before_background_processing(self, app, auth_client, test_course, tmp_path, ingestion):
+        service = ingestion('background')
+        data = b'Background processed notes. ' * 50
+        response = auth_client['teacher'].post(f'/api/documents/course/{test_course}', data={
+            'file': (io.BytesIO(data), 'notes.txt'), 'title': 'Notes'
+        }, content_type='multipart/form-data')
+        assert response.status_code == 201
+        job = response.get_json()['ingestion_job']
+        assert job['status'] in ('pending', 'running')
+
+        deadline = time.monotonic() + 60
+        while service.queue.get(job['id'])['status'] in ('pending', 'running'):
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+
+        job = auth_client['teacher'].get(f'/api/documents/jobs/{job["id"]}').get_json()
+        assert job['status'] == 'completed'
+        with app.app_context():
+            document_id = response.get_json()['id']
+            assert DocumentChunk.query.filter_by(document_id=document_id).count() == job['chunk_count'] > 0
+            assert db.session.get(Document, document_id).extracted_text == data.decode('utf-8')
+
+
+class TestRetrieval:
+    """测试课程资料检索"""
+
+    def _ingest(self, app, test_course, test_users, tmp_path, name, text):
+        path = tmp_path / name
+        path.write_bytes(text.encode('utf-8'))
+        with app.app_context():
+            document_id = _create_document(test_course, test_users['teacher_id'], path,
+                                           text.encode('utf-8'), name=name)
+            get_ingestion_service().submit(db.session.get(Document, document_id))
+        return document_id
+
+    @pytest.fixture
+    def course_documents(self, app, test_course, test_users, tmp_path):
+        app.config['INGESTION_MODE'] = 'inline'
+        app.config['INGESTION_QUEUE_PATH'] = str(tmp_path / 'jobs.db')
+        app.config['RETRIEVAL_INDEX_DIR'] = str(tmp_path / 'index')
+        init_ingestion(app)
+        filler = 'General course logistics and grading policy. ' * 40
+        sorting = self._ingest(app, test_course, test_users, tmp_path, 'sorting.txt',
+                               filler + '\n\nQuicksort picks a pivot and partitions the array around it.')
+        search = self._ingest(app, test_course, test_users, tmp_path, 'search.txt',
+                              filler + '\n\n二分查找在有序数组中每次把查找范围缩小一半。')
+        return sorting, search
+
+    def test_tokenize_mixes_words_and_chinese_bigrams(self):
+        assert tokenize('Binary Search 二分查找') == ['binary', 'search', '二分', '分查', '查找']
+
+    def test_ask_sends_only_relevant_chunks(self, app, auth_client, test_course, course_documents):
+        sorting, search = course_documents
+        with patch('src.routes.ai_qa.ai_service.answer_question', return_value='ok') as answer:
+            auth_client['student1'].post(f'/api/ai-qa/course/{test_course}/ask',
+                                         json={'question': '什么是二分查找？'})
+        context = answer.call_args[0][1]
+        assert context['chunks'][0]['document_id'] == search
+        assert '二分查找' in context['chunks'][0]['content']
+        assert context['chunks'][0]['title'] == 'search.txt'
+        # 已分块的文档不再附带全文摘要
+        assert all(doc['content'] is None for doc in context['documents'])
+
+        with app.app_context():
+            chunks, _ = retrieve_chunks(test_course, 'How does quicksort choose a pivot?', k=1)
+            assert [chunk['document_id'] for chunk in chunks] == [sorting]
+
+            # 下架的文档不参与检索
+            db.session.get(Document, sorting).is_active = False
+            db.session.commit()
+            chunks, indexed = retrieve_chunks(test_course, 'quicksort pivot')
+            assert indexed == {search}
+            assert all(chunk['document_id'] == search for chunk in chunks)
+
+    def test_hashed_embeddings_are_memory_mapped(self, app, test_course, course_documents, tmp_path):
+        sorting, _ = course_documents
+        app.config['RETRIEVAL_EMBEDDINGS'] = 'hashed'
+        app.extensions.pop('retrieval_indexes', None)
+        with app.app_context():
+            chunks, _ = retrieve_chunks(test_course, 'quicksort pivot partitions', k=2)
+            assert chunks[0]['document_id'] == sorting
+            index = get_course_index(test_course)
+            assert isinstance(index.embeddings, np.memmap)
+            assert index.embeddings.shape == (len(index.chunk_ids), 512)
+        assert (tmp_path / 'index' / f'course_{test_course}' / 'embeddings.npy').exists()
+
+    def test_default_index_dir_is_per_database(self, app):
+        from flask import Flask
+        from src.ai.retrieval import _index_dir
+        other = Flask(__name__, instance_path=app.instance_path)
+        other.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:////srv/other/app.db'
+        with other.app_context():
+            assert _index_dir(7) == '/srv/other/app_retrieval/course_7'
+        with app.app_context():
+            app.config.pop('RETRIEVAL_INDEX_DIR')
+            # 默认放在当前数据库文件旁边，而不是共享的临时目录
+            db_path = app.config['SQLALCHEMY_DATABASE_URI'].split('///', 1)[1]
+            assert _index_dir(7).startswith(db_path)
+
+
+class TestPdfExtraction:
+    """测试PDF逐页流式提取"""
+
+    @pytest.fixture
+    def pdf_path(self, tmp_path):
+        path = tmp_path / 'slides.pdf'
+        path.write_bytes(_make_pdf([f'Slide {i} content' for i in range(1, 11)]))
+        return path
+
+    def test_pages_are_streamed_from_mapped_file(self, pdf_path):
+        assert list(iter_pdf_pages(str(pdf_path), 3, 4)) == [(3, 'Slide 3 content'), (4, 'Slide 4 content')]
+        assert read_pdf_text(str(pdf_path), first_page=9) == 'Slide 9 content\nSlide 10 content\n'
+        assert read_pdf_text(pdf_path.read_bytes(), last_page=1) == 'Slide 1 content\n'
+
+    def test_character_budget_stops_early(self, pdf_path):
+        import PyPDF2
+        original = PyPDF2.PageObject.extract_text
+        with patch.object(PyPDF2.PageObject, 'extract_text', autospec=True, side_effect=original) as extract:
+            text = read_pdf_text(str(pdf_path), max_chars=20)
+        assert text == 'Slide 1 content\nSlid'
+        assert extract.call_count == 2
+
+    def test_parallel_extraction_matches_sequential(self, pdf_path):
+        sequential = read_pdf_text(str(pdf_path))
+        assert read_pdf_text(str(pdf_path), parallel=True) == sequential
+        assert read_pdf_text(str(pdf_path), first_page=4, last_page=7, parallel=True) == \
+            ''.join(f'Slide {i} content\n' for i in range(4, 8))
+
+    def test_qa_excerpt_reads_only_a_prefix(self, app, test_course, test_users, pdf_path):
+        from src.routes.ai_qa import extract_document_content
+        with app.app_context():
+            document_id = _create_document(test_course, test_users['teacher_id'], pdf_path,
+                                           pdf_path.read_bytes(), file_type='pdf', name='slides.pdf')
+            document = db.session.get(Document, document_id)
+            assert extract_document_content(document, 16) == 'Slide 1 content\n'
+            # 只读取了开头部分，不写入缓存
+            assert document.extracted_text is None
+            assert extract_document_content(document).endswith('Slide 10 content\n')
+            assert document.content_hash == content_hash(pdf_path.read_bytes())
+
+
+class TestStorage:
+    """测试文件存储后端"""
+
+    def test_default_backend_without_supabase_is_local(self, app, tmp_path, monkeypatch):
+        monkeypatch.delenv('SUPABASE_URL', raising=False)
+        monkeypatch.delenv('STORAGE_BACKEND', raising=False)
+        app.config['STORAGE_LOCAL_DIR'] = str(tmp_path / 'files')
+        assert isinstance(create_storage(app), LocalStorage)
+
+    def test_incomplete_backend_cannot_be_created(self):
+        from src.utils.storage import StorageBackend
+
+        class UploadOnly(StorageBackend):
+            def upload(self, path, stream, content_type=None, size=None):
+                pass
+
+        with pytest.raises(TypeError):
+            UploadOnly()
+
+    def test_local_upload_download_and_delete(self, app, auth_client, test_course, local_storage, tmp_path):
+        data = b'Lecture notes. ' * 1000
+        teacher = auth_client['teacher']
+        response = teacher.post(f'/api/documents/course/{test_course}', data={
+            'file': (io.BytesIO(data), 'week1.txt'), 'title': 'Week 1'
+        }, content_type='multipart/form-data')
+        assert response.status_code == 201
+        document = response.get_json()
+        with app.app_context():
+            stored = db.session.get(Document, document['id'])
+            assert stored.content_hash == content_hash(data)
+            assert b''.join(local_storage.stream(stored.file_path, chunk_size=4096)) == data
+            stored_path = stored.file_path
+
+        # 本地存储在权限检查之后直接发送文件，不生成可以单独访问的链接
+        url = f'/api/documents/{document["id"]}/download'
+        download = auth_client['student1'].get(url)
+        assert download.status_code == 200
+        assert download.data == data
+        assert 'week1.txt' in download.headers['Content-Disposition']
+        assert app.test_client().get(url).status_code == 401
+
+        assert teacher.delete(f'/api/documents/{document["id"]}').status_code == 200
+        assert not (tmp_path / 'storage' / stored_path).exists()
+
+    def test_supabase_streams_with_shared_client(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            if request.url.path.startswith('/storage/v1/object/info/'):
+                return httpx.Response(400, json={'statusCode': '404', 'error': 'not_found', 'message': 'Object not found'})
+            if request.url.path.startswith('/storage/v1/object/sign/'):
+                return httpx.Response(200, json={'signedURL': '/object/sign/course-documents/1/a.pdf?token=t'})
+            if request.method == 'GET':
+                return httpx.Response(200, content=b'x' * 10000)
+            return httpx.Response(200, json={'Key': 'course-documents/1/a.pdf'})
+
+        storage = SupabaseStorage('https://project.supabase.co', 'service-key', transport=httpx.MockTransport(handler))
+        storage.chunk_size = 4096
+        assert storage._client is None
+        storage.upload('1/a.pdf', io.BytesIO(b'y' * 10000), content_type='application/pdf', size=10000)
+        upload = requests[0]
+        assert upload.url == 'https://project.supabase.co/storage/v1/object/course-documents/1/a.pdf'
+        assert upload.headers['Authorization'] == 'Bearer service-key'
+        assert upload.headers['Content-Length'] == '10000'
+        assert upload.content == b'y' * 10000
+        client = storage.client
+
+        assert [len(chunk) for chunk in storage.stream('1/a.pdf', chunk_size=4096)] == [4096, 4096, 1808]
+        assert storage.sign('1/a.pdf', 60) == \
+            'https://project.supabase.co/storage/v1/object/sign/course-documents/1/a.pdf?token=t'
+        with pytest.raises(StorageNotFound):
+            storage.info('1/missing.pdf')
+        storage.delete('1/a.pdf')
+        assert requests[-1].method == 'DELETE'
+        # 所有请求复用第一次使用时创建的HTTP客户端
+        assert storage.client is client
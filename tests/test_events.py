@@ -0,0 +1,249 @@
+import os
+import pytest
+from src.models.activity import Activity
+from src.models.forum import ForumPost
+from src.database import db
+from src.utils.events import MemoryBroker, SQLiteBroker, course_channel, get_event_broker
+
+
+def _channel_events(app, course_id):
+    with app.app_context():
+        return get_event_broker().read(course_channel(course_id), 0, 0)
+
+
+def _create_activity(test_course, test_users, activity_type='poll'):
+    activity = Activity(title='Live poll', activity_type=activity_type, course_id=test_course,
+                        creator_id=test_users['teacher_id'], config={'options': ['A', 'B']})
+    db.session.add(activity)
+    db.session.commit()
+    return activity.id
+
+
+class TestBrokers:
+    """测试事件代理后端"""
+
+    def test_memory_broker_reads_after_id(self):
+        broker = MemoryBroker(buffer_size=3)
+        ids = [broker.publish('course:1', 'test', {'n': i}) for i in range(5)]
+        broker.publish('course:2', 'test', {'n': 'other'})
+
+        events = broker.read('course:1', ids[2], timeout=0)
+        assert [e['data']['n'] for e in events] == [3, 4]
+        # 缓冲区只保留最近3条
+        assert [e['data']['n'] for e in broker.read('course:1', 0, timeout=0)] == [2, 3, 4]
+        assert broker.read('course:1', broker.last_event_id('course:1'), timeout=0.01) == []
+
+    def test_sqlite_broker_is_shared_between_instances(self, tmp_path):
+        path = str(tmp_path / 'events.db')
+        publisher = SQLiteBroker(path)
+        subscriber = SQLiteBroker(path, poll_interval=0.01)
+        start = subscriber.last_event_id('course:1')
+
+        publisher.publish('course:1', 'forum.post', {'post_id': 7})
+        publisher.publish('course:2', 'forum.post', {'post_id': 8})
+        events = subscriber.read('course:1', start, timeout=1)
+        assert [(e['type'], e['data']) for e in events] == [('forum.post', {'post_id': 7})]
+        assert subscriber.read('course:1', events[-1]['id'], timeout=0.05) == []
+
+    def test_sqlite_broker_channels_are_scoped_to_the_app_database(self, app, tmp_path):
+        from src.utils.events import init_events
+        path = str(tmp_path / 'events.db')
+        ours, theirs = SQLiteBroker(path, scope='a'), SQLiteBroker(path, scope='b')
+        theirs.publish('course:1', 'forum.post', {'title': 'Other app'})
+        assert ours.read('course:1', 0, timeout=0) == []
+
+        # 默认放在数据库文件旁边，频道以数据库标识区分
+        app.config['EVENTS_BACKEND'] = 'sqlite'
+        broker = init_events(app)
+        db_path = app.config['SQLALCHEMY_DATABASE_URI'].split('///', 1)[1]
+        try:
+            assert broker.path == f'{db_path}_events.db'
+            assert broker.scope
+        finally:
+            os.remove(broker.path)
+
+
+class TestCommitEvents:
+    """测试提交后发布课程事件"""
+
+    def test_forum_events_published_after_commit(self, app, auth_client, test_course, test_users):
+        teacher = auth_client['teacher']
+        post_id = teacher.post(f'/api/forum/{test_course}',
+                               json={'title': 'Welcome', 'content': 'Hello'}).get_json()['post']['id']
+        auth_client['student1'].post(f'/api/forum/post/{post_id}/reply', json={'content': 'Hi'})
+
+        events = _channel_events(app, test_course)
+        assert [e['type'] for e in events] == ['forum.post', 'forum.reply']
+        assert events[0]['data']['post_id'] == post_id
+        assert events[1]['data']['user_id'] == test_users['student1_id']
+
+    def test_rolled_back_changes_are_not_published(self, app, test_course, test_users):
+        with app.app_context():
+            db.session.add(ForumPost(course_id=test_course, user_id=test_users['teacher_id'],
+                                     title='Draft', content='x'))
+            db.session.flush()
+            db.session.rollback()
+        assert _channel_events(app, test_course) == []
+
+    def test_activity_status_and_response_events(self, app, auth_client, test_course, test_users):
+        with app.app_context():
+            activity_id = _create_activity(test_course, test_users)
+
+        auth_client['teacher'].post(f'/api/activities/{activity_id}/start')
+        auth_client['student1'].post('/api/responses/', json={
+            'activity_id': activity_id, 'response_data': {'selected_option': 0}
+        })
+        # 只修改标题不产生状态事件
+        auth_client['teacher'].put(f'/api/activities/{activity_id}', json={'title': 'Renamed'})
+
+        events = [e for e in _channel_events(app, test_course) if e['type'] != 'activity.tally']
+        assert [e['type'] for e in events] == ['activity.created', 'activity.status', 'activity.response']
+        assert events[1]['data'] == {'activity_id': activity_id, 'status': 'active', 'previous_status': 'draft'}
+        assert events[2]['data']['student_id'] == test_users['student1_id']
+
+
+class TestEventStream:
+    """测试课程事件的SSE接口"""
+
+    @pytest.fixture(autouse=True)
+    def short_streams(self, app):
+        app.config['EVENTS_HEARTBEAT_SECONDS'] = 0.05
+        app.config['EVENTS_STREAM_SECONDS'] = 0.2
+
+    def test_stream_requires_course_access(self, app, test_course):
+        assert app.test_client().get(f'/api/events/course/{test_course}').status_code == 401
+
+        from src.models.user import User
+        with app.app_context():
+            outsider = User(username='outsider', email='outsider@example.com',
+                            full_name='Outsider', role='student')
+            outsider.set_password('password123')
+            db.session.add(outsider)
+            db.session.commit()
+            outsider_id = outsider.id
+        other = app.test_client()
+        with other.session_transaction() as sess:
+            sess['user_id'] = outsider_id
+        assert other.get(f'/api/events/course/{test_course}').status_code == 403
+
+    def test_stream_for_unknown_course_is_404(self, app, test_course):
+        from src.models.user import User
+        with app.app_context():
+            admin = User(username='events_admin', email='events_admin@example.com',
+                         full_name='Admin', role='admin')
+            admin.set_password('password123')
+            db.session.add(admin)
+            db.session.commit()
+            admin_id = admin.id
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin_id
+        assert client.get(f'/api/events/course/{test_course + 999}').status_code == 404
+
+    def test_stream_replays_from_last_event_id(self, app, auth_client, test_course, test_users):
+        with app.app_context():
+            activity_id = _create_activity(test_course, test_users)
+        auth_client['teacher'].post(f'/api/activities/{activity_id}/start')
+        auth_client['student1'].post('/api/responses/', json={
+            'activity_id': activity_id, 'response_data': {'selected_option': 1}
+        })
+
+        response = auth_client['teacher'].get(f'/api/events/course/{test_course}',
+                                              headers={'Last-Event-ID': '0'})
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        body = response.get_data(as_text=True)
+        assert body.startswith('retry: 3000')
+        assert 'event: activity.status' in body
+        assert 'event: activity.response' in body
+
+        # 学生收不到其他学生的提交事件
+        body = auth_client['student2'].get(f'/api/events/course/{test_course}?last_event_id=0')\
+            .get_data(as_text=True)
+        assert 'event: activity.status' in body
+        assert 'event: activity.response' not in body
+        assert 'event: activity.tally' not in body
+
+    def test_stream_without_last_event_id_only_sends_new_events(self, app, auth_client, test_course):
+        auth_client['teacher'].post(f'/api/forum/{test_course}', json={'title': 'Old', 'content': 'x'})
+        body = auth_client['student1'].get(f'/api/events/course/{test_course}').get_data(as_text=True)
+        assert 'event:' not in body
+        assert ': keepalive' in body
+
+
+class TestLiveTally:
+    """测试进行中活动的实时统计"""
+
+    def _submit(self, client, activity_id, response_data):
+        response = client.post('/api/responses/', json={'activity_id': activity_id, 'response_data': response_data})
+        assert response.status_code == 201
+
+    def test_tally_seeded_updated_and_dropped(self, app, auth_client, test_course, test_users, query_counter):
+        from src.utils.live_tally import get_tally_registry
+        with app.app_context():
+            activity_id = _create_activity(test_course, test_users)
+        teacher = auth_client['teacher']
+        assert teacher.get(f'/api/activities/{activity_id}/tally').status_code == 400
+
+        teacher.post(f'/api/activities/{activity_id}/start')
+        self._submit(auth_client['student1'], activity_id, {'selected_option': 'A', 'option_index': '0'})
+        self._submit(auth_client['student2'], activity_id, {'selected_option': 'B', 'option_index': 1})
+
+        teacher.get(f'/api/activities/{activity_id}/tally')
+        with query_counter() as counter:
+            tally = teacher.get(f'/api/activities/{activity_id}/tally').get_json()
+        assert tally['response_count'] == 2
+        assert tally['option_counts'] == {'0': {'0': 1, '1': 1}}
+        # 读取统计不会加载响应内容
+        assert not any('response_data' in statement for statement in counter.statements)
+
+        events = _channel_events(app, test_course)
+        deltas = [e['data'] for e in events if e['type'] == 'activity.tally']
+        assert [d['response_count'] for d in deltas] == [1, 2]
+        assert deltas[1]['delta'] == {'options': [['0', '1']], 'score_bucket': None}
+
+        teacher.post(f'/api/activities/{activity_id}/stop')
+        with app.app_context():
+            assert get_tally_registry().get(activity_id) is None
+        assert auth_client['student1'].get(f'/api/activities/{activity_id}/tally').status_code == 403
+
+    def test_submit_seeds_missing_tally(self, app, auth_client, test_course, test_users):
+        from src.utils.live_tally import drop_tally, get_tally_registry
+        with app.app_context():
+            activity_id = _create_activity(test_course, test_users)
+        auth_client['teacher'].post(f'/api/activities/{activity_id}/start')
+        self._submit(auth_client['student1'], activity_id, {'option_index': 0})
+
+        # 统计不在本进程中（例如进程重启后），提交时重新统计而不是推送空的响应数
+        with app.app_context():
+            drop_tally(activity_id)
+        self._submit(auth_client['student2'], activity_id, {'option_index': 1})
+
+        deltas = [e['data'] for e in _channel_events(app, test_course) if e['type'] == 'activity.tally']
+        assert [d['response_count'] for d in deltas] == [1, 2]
+        with app.app_context():
+            assert get_tally_registry().get(activity_id)['option_counts'] == {'0': {'0': 1, '1': 1}}
+
+    def test_quiz_tally_reseeds_when_out_of_sync(self, app, auth_client, test_course, test_users):
+        from src.models.response import ActivityResponse
+        with app.app_context():
+            activity_id = _create_activity(test_course, test_users, activity_type='quiz')
+        teacher = auth_client['teacher']
+        teacher.post(f'/api/activities/{activity_id}/start')
+        self._submit(auth_client['student1'], activity_id, {
+            'answers': [{'question_index': 0, 'option_index': 2}, {'question_index': 1, 'option_index': 0}],
+            'score': 85
+        })
+
+        # 其他工作进程写入的响应不在本进程的统计中，读取时按响应数核对后重新统计
+        with app.app_context():
+            db.session.add(ActivityResponse(activity_id=activity_id, student_id=test_users['student2_id'],
+                                            response_data={'answers': [{'question_index': 0, 'option_index': 2}]},
+                                            score=40))
+            db.session.commit()
+
+        tally = teacher.get(f'/api/activities/{activity_id}/tally').get_json()
+        assert tally['response_count'] == 2
+        assert tally['option_counts'] == {'0': {'2': 2}, '1': {'0': 1}}
+        assert tally['score_histogram'] == {'80-89': 1, '40-49': 1}
+        assert tally['avg_score'] == 62.5
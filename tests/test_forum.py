@@ -676,6 +676,49 @@ class TestForumRoutes:
         assert data['has_next'] == True
         assert data['has_prev'] == True
 
+    def test_forum_cursor_pagination(self, app, auth_client, test_course, test_users):
+        """测试游标分页按置顶、时间倒序返回所有帖子且不重复"""
+        base = datetime(2025, 1, 1)
+        with app.app_context():
+            posts = [ForumPost(course_id=test_course, user_id=test_users['teacher_id'],
+                               title=f'Post {i}', content='c', is_pinned=(i == 1),
+                               created_at=base + timedelta(minutes=i // 2))  # 两两同一时间
+                     for i in range(7)]
+            db.session.add_all(posts)
+            db.session.commit()
+            expected = [p.id for p in sorted(posts, key=lambda p: (p.is_pinned, p.created_at, p.id),
+                                             reverse=True)]
+
+        client = auth_client['student1']
+        data = client.get(f'/api/forum/{test_course}?limit=3&with_total=true').get_json()
+        assert data['total'] == 7
+        assert data['posts'][0]['title'] == 'Post 1'
+        seen = [p['id'] for p in data['posts']]
+        while data['next_cursor']:
+            data = client.get(f'/api/forum/{test_course}',
+                              query_string={'limit': 3, 'cursor': data['next_cursor']}).get_json()
+            assert 'total' not in data
+            seen.extend(p['id'] for p in data['posts'])
+        assert seen == expected
+        assert data['has_next'] is False
+
+        response = client.get(f'/api/forum/{test_course}?cursor=not-a-cursor')
+        assert response.status_code == 400
+
+    def test_forum_cursor_pagination_uses_listing_index(self, app, test_course):
+        """测试游标分页查询走 (course_id, is_pinned, created_at, id) 复合索引"""
+        from src.utils.pagination import keyset_condition
+        with app.app_context():
+            query = ForumPost.query.filter_by(course_id=test_course).filter(
+                keyset_condition([ForumPost.is_pinned, ForumPost.created_at, ForumPost.id],
+                                 [False, datetime(2025, 1, 1), 10], descending=True)
+            ).order_by(ForumPost.is_pinned.desc(), ForumPost.created_at.desc(), ForumPost.id.desc())
+            statement = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+            plan = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {statement}')).all()
+        details = ' '.join(row[-1] for row in plan)
+        assert 'ix_forum_post_course_listing' in details
+        assert 'TEMP B-TREE' not in details
+
     def test_teacher_forum_access_and_unread_status(self, auth_client, test_course):
         """测试教师可以访问论坛功能且未读状态正确计算"""
         # 教师应该可以访问自己课程的论坛
@@ -998,6 +1041,144 @@ class TestForumRoutes:
         post = next(p for p in posts if p['id'] == post_id)
         assert post['reply_count'] == 1  # Count should remain the same
 
+    def _create_reply_tree(self, post_id, test_users, num_roots):
+        """每个顶级回复带一个子回复和一个孙回复，作者交替"""
+        authors = [test_users['student1_id'], test_users['student2_id'], test_users['teacher_id']]
+        for i in range(num_roots):
+            parent_id = None
+            for depth in range(3):
+                reply = ForumReply(post_id=post_id, user_id=authors[(i + depth) % 3],
+                                   content=f'Reply {i}.{depth}', parent_reply_id=parent_id)
+                db.session.add(reply)
+                db.session.flush()
+                parent_id = reply.id
+        db.session.commit()
+
+    def test_get_replies_uses_fixed_queries(self, app, auth_client, test_course, test_users, query_counter):
+        """测试回复树的查询次数与回复数量无关，删除权限正确"""
+        with app.app_context():
+            small = ForumPost(course_id=test_course, user_id=test_users['teacher_id'], title='Small', content='c')
+            large = ForumPost(course_id=test_course, user_id=test_users['teacher_id'], title='Large', content='c')
+            db.session.add_all([small, large])
+            db.session.commit()
+            self._create_reply_tree(small.id, test_users, 3)
+            self._create_reply_tree(large.id, test_users, 40)
+            small_id, large_id = small.id, large.id
+
+        student = auth_client['student1']
+        student.get(f'/api/forum/post/{small_id}/replies')
+        with query_counter() as few:
+            student.get(f'/api/forum/post/{small_id}/replies')
+        with query_counter() as many:
+            data = student.get(f'/api/forum/post/{large_id}/replies').get_json()
+        assert many.count == few.count
+
+        assert len(data['replies']) == 40
+        grandchild = data['replies'][0]['child_replies'][0]['child_replies'][0]
+        assert grandchild['content'] == 'Reply 0.2'
+        for reply in (data['replies'][0], grandchild):
+            assert reply['can_delete'] == (reply['user_id'] == test_users['student1_id'])
+            assert reply['user_name']
+
+        teacher_data = auth_client['teacher'].get(f'/api/forum/post/{large_id}/replies').get_json()
+        assert all(r['can_delete'] for r in teacher_data['replies'])
+
+    def test_get_replies_pages_top_level(self, app, auth_client, test_course, test_users):
+        """测试顶级回复按游标分页，每页带完整子树"""
+        with app.app_context():
+            post = ForumPost(course_id=test_course, user_id=test_users['teacher_id'], title='Paged', content='c')
+            db.session.add(post)
+            db.session.commit()
+            self._create_reply_tree(post.id, test_users, 5)
+            post_id = post.id
+
+        student = auth_client['student1']
+        data = student.get(f'/api/forum/post/{post_id}/replies?limit=2').get_json()
+        seen = []
+        while True:
+            assert len(data['replies']) <= 2
+            for reply in data['replies']:
+                assert reply['parent_reply_id'] is None
+                assert len(reply['child_replies']) == 1
+                seen.append(reply['content'])
+            if not data['has_next']:
+                break
+            data = student.get(f'/api/forum/post/{post_id}/replies',
+                               query_string={'limit': 2, 'cursor': data['next_cursor']}).get_json()
+        assert seen == [f'Reply {i}.0' for i in range(5)]
+
+        response = student.get(f'/api/forum/post/{post_id}/replies?cursor=bad')
+        assert response.status_code == 400
+
+    def test_reply_depth_and_path_are_stored(self, app, auth_client, test_course, test_users):
+        """测试回复插入时记录深度、顶级回复ID和祖先路径，可直接查询子树并回填"""
+        from src.utils.forum_threads import descendants_query, rebuild_reply_positions
+        with app.app_context():
+            post = ForumPost(course_id=test_course, user_id=test_users['teacher_id'], title='Tree', content='c')
+            db.session.add(post)
+            db.session.commit()
+            post_id = post.id
+
+        client = auth_client['student1']
+        ids = []
+        parent_id = None
+        for depth in range(3):
+            response = client.post(f'/api/forum/post/{post_id}/reply',
+                                   json={'content': f'Level {depth}', 'parent_reply_id': parent_id})
+            assert response.status_code == 201
+            assert response.get_json()['reply']['depth'] == depth
+            parent_id = response.get_json()['reply']['id']
+            ids.append(parent_id)
+
+        with app.app_context():
+            # 直接通过ORM插入的回复同样记录位置
+            sibling = ForumReply(post_id=post_id, user_id=test_users['teacher_id'],
+                                 content='Sibling', parent_reply_id=ids[0])
+            db.session.add(sibling)
+            db.session.commit()
+
+            root, child, grandchild = (db.session.get(ForumReply, i) for i in ids)
+            assert root.root_reply_id is None and root.path == ''
+            assert grandchild.depth == 2
+            assert grandchild.root_reply_id == root.id
+            assert grandchild.path == f'{root.id:010d}/{child.id:010d}/'
+            assert sibling.depth == 1 and sibling.root_reply_id == root.id
+
+            assert {r.id for r in descendants_query(root)} == {child.id, grandchild.id, sibling.id}
+            assert {r.id for r in descendants_query(child)} == {grandchild.id}
+
+            # 清空后回填得到相同结果
+            db.session.execute(db.update(ForumReply).values(depth=0, root_reply_id=None, path=''))
+            assert rebuild_reply_positions() == 4
+            db.session.commit()
+            db.session.expire_all()
+            assert db.session.get(ForumReply, grandchild.id).path == f'{root.id:010d}/{child.id:010d}/'
+            assert db.session.get(ForumReply, sibling.id).root_reply_id == root.id
+
+    def test_reply_depth_check_uses_stored_depth(self, app, auth_client, test_course, test_users, query_counter):
+        """测试创建回复时的深度检查不随嵌套层数增加查询"""
+        with app.app_context():
+            post = ForumPost(course_id=test_course, user_id=test_users['teacher_id'], title='Depth', content='c')
+            db.session.add(post)
+            db.session.commit()
+            root = ForumReply(post_id=post.id, user_id=test_users['teacher_id'], content='root')
+            db.session.add(root)
+            db.session.commit()
+            child = ForumReply(post_id=post.id, user_id=test_users['teacher_id'], content='child',
+                               parent_reply_id=root.id)
+            db.session.add(child)
+            db.session.commit()
+            post_id, root_id, child_id = post.id, root.id, child.id
+
+        client = auth_client['student1']
+        with query_counter() as shallow:
+            client.post(f'/api/forum/post/{post_id}/reply', json={'content': 'a', 'parent_reply_id': root_id})
+        with query_counter() as deep:
+            response = client.post(f'/api/forum/post/{post_id}/reply',
+                                   json={'content': 'b', 'parent_reply_id': child_id})
+        assert response.status_code == 201
+        assert deep.count == shallow.count
+
     def _find_reply_in_threaded_structure(self, replies, reply_id):
         """Helper method to find a reply in the threaded structure"""
         for reply in replies:
@@ -1008,3 +1189,249 @@ class TestForumRoutes:
                 if found:
                     return found
         return None
+
+
+class TestForumReadTracking:
+    """测试帖子级已读状态和未读数"""
+
+    def _create_thread(self, test_course, test_users, num_replies):
+        post = ForumPost(course_id=test_course, user_id=test_users['teacher_id'],
+                         title='Thread', content='Thread content')
+        db.session.add(post)
+        db.session.commit()
+        replies = []
+        for i in range(num_replies):
+            author = test_users['student2_id'] if i % 2 == 0 else test_users['teacher_id']
+            reply = ForumReply(post_id=post.id, user_id=author, content=f'Reply {i}')
+            db.session.add(reply)
+            db.session.commit()
+            replies.append(reply.id)
+        return post.id, replies
+
+    def _unread_count(self, client, test_course, post_id):
+        posts = client.get(f'/api/forum/{test_course}').get_json()['posts']
+        return next(p for p in posts if p['id'] == post_id)['unread_count']
+
+    def test_unread_count_per_post(self, app, auth_client, test_course, test_users):
+        """测试未读数包括帖子本身和他人的回复，自己的回复不计入"""
+        with app.app_context():
+            post_id, reply_ids = self._create_thread(test_course, test_users, 4)
+            db.session.add(ForumReply(post_id=post_id, user_id=test_users['student1_id'], content='Mine'))
+            db.session.commit()
+
+        student = auth_client['student1']
+        assert self._unread_count(student, test_course, post_id) == 5
+
+        # 单独阅读第1和第3条回复：第1条并入水位，第3条留在稀疏集合中
+        response = student.post(f'/api/forum/post/{post_id}/read',
+                                json={'reply_ids': [reply_ids[0], reply_ids[2]]})
+        assert response.status_code == 200
+        assert response.get_json()['unread_count'] == 2
+        with app.app_context():
+            from src.models.forum import ForumThreadRead
+            read = ForumThreadRead.query.filter_by(user_id=test_users['student1_id'], post_id=post_id).one()
+            assert read.read_up_to_reply_id == reply_ids[0]
+            assert read.read_reply_ids == [reply_ids[2]]
+
+        # 读完第2条后水位连续推进到第3条
+        student.post(f'/api/forum/post/{post_id}/read', json={'reply_ids': [reply_ids[1]]})
+        with app.app_context():
+            read = ForumThreadRead.query.filter_by(user_id=test_users['student1_id'], post_id=post_id).one()
+            assert read.read_up_to_reply_id == reply_ids[2]
+            assert read.read_reply_ids == []
+        assert self._unread_count(student, test_course, post_id) == 1
+
+        # 整个帖子标记为已读
+        student.post(f'/api/forum/post/{post_id}/read')
+        assert self._unread_count(student, test_course, post_id) == 0
+
+        # 新回复再次产生未读
+        with app.app_context():
+            db.session.add(ForumReply(post_id=post_id, user_id=test_users['teacher_id'], content='New'))
+            db.session.commit()
+        assert self._unread_count(student, test_course, post_id) == 1
+        assert student.get(f'/api/forum/{test_course}/notifications?include_count=true').get_json()['unread_count'] == 1
+
+        # 课程级全部已读清除帖子级记录
+        student.post(f'/api/forum/{test_course}/mark-read')
+        with app.app_context():
+            assert ForumThreadRead.query.filter_by(user_id=test_users['student1_id']).count() == 0
+        assert self._unread_count(student, test_course, post_id) == 0
+
+    def test_mark_post_read_validates_reply_ids(self, app, auth_client, test_course, test_users):
+        with app.app_context():
+            post_id, _ = self._create_thread(test_course, test_users, 1)
+        response = auth_client['student1'].post(f'/api/forum/post/{post_id}/read',
+                                                json={'reply_ids': 'all'})
+        assert response.status_code == 400
+
+    def test_notifications_poll_skips_unread_count(self, app, auth_client, test_course, test_users,
+                                                   query_counter):
+        """测试轮询未读状态时不统计帖子和回复"""
+        with app.app_context():
+            self._create_thread(test_course, test_users, 3)
+
+        student = auth_client['student1']
+        with query_counter() as counter:
+            data = student.get(f'/api/forum/{test_course}/notifications').get_json()
+        assert data['has_unread'] is True
+        assert 'unread_count' not in data
+        assert not any('forum_reply' in statement for statement in counter.statements)
+
+        data = student.get(f'/api/forum/{test_course}/notifications?include_count=true').get_json()
+        assert data['unread_count'] == 4
+
+    def test_listing_unread_counts_use_fixed_queries(self, app, auth_client, test_course, test_users,
+                                                     query_counter):
+        """测试帖子列表的未读数不会按帖子逐个查询"""
+        with app.app_context():
+            self._create_thread(test_course, test_users, 2)
+
+        student = auth_client['student1']
+        student.get(f'/api/forum/{test_course}')
+        with query_counter() as few:
+            student.get(f'/api/forum/{test_course}')
+
+        with app.app_context():
+            for _ in range(10):
+                self._create_thread(test_course, test_users, 2)
+        with query_counter() as many:
+            data = student.get(f'/api/forum/{test_course}').get_json()
+        assert len(data['posts']) == 11
+        assert all(p['unread_count'] == 3 for p in data['posts'])
+        assert many.count == few.count
+
+
+class TestForumSearch:
+    """测试论坛全文搜索索引"""
+
+    def _add_post(self, test_course, author_id, title, content):
+        post = ForumPost(course_id=test_course, user_id=author_id, title=title, content=content)
+        db.session.add(post)
+        db.session.commit()
+        return post.id
+
+    def _search(self, client, test_course, q, **params):
+        response = client.get(f'/api/forum/{test_course}', query_string={'q': q, **params})
+        assert response.status_code == 200
+        return response.get_json()
+
+    def test_search_matches_replies_and_ranks_title_first(self, app, auth_client, test_course, test_users):
+        with app.app_context():
+            body_id = self._add_post(test_course, test_users['teacher_id'], 'Week 3', 'We cover recursion today')
+            title_id = self._add_post(test_course, test_users['teacher_id'], 'Recursion questions', 'Ask here')
+            other_id = self._add_post(test_course, test_users['teacher_id'], 'Lab setup', 'Install the tools')
+            reply = ForumReply(post_id=other_id, user_id=test_users['student2_id'],
+                               content='Is recursion allowed in the lab?')
+            db.session.add(reply)
+            db.session.commit()
+            reply_id = reply.id
+
+        data = self._search(auth_client['student1'], test_course, 'recursion')
+        assert data['total'] == 3
+        ids = [p['id'] for p in data['posts']]
+        assert ids[0] == title_id
+        assert set(ids) == {body_id, title_id, other_id}
+
+        by_id = {p['id']: p for p in data['posts']}
+        assert by_id[title_id]['search']['title_highlight'] == '<mark>Recursion</mark> questions'
+        assert by_id[other_id]['search']['matched'] == 'reply'
+        assert by_id[other_id]['search']['reply_id'] == reply_id
+        assert '<mark>recursion</mark>' in by_id[other_id]['search']['snippet']
+
+    def test_search_index_follows_update_and_soft_delete(self, app, auth_client, test_course, test_users):
+        with app.app_context():
+            post_id = self._add_post(test_course, test_users['student1_id'], 'Homework', 'Stuck on pointers')
+        student = auth_client['student1']
+        assert self._search(student, test_course, 'pointers')['total'] == 1
+
+        student.put(f'/api/forum/post/{post_id}', json={'title': 'Homework', 'content': 'Stuck on arrays'})
+        assert self._search(student, test_course, 'pointers')['total'] == 0
+        assert self._search(student, test_course, 'arrays')['total'] == 1
+
+        reply_id = student.post(f'/api/forum/post/{post_id}/reply',
+                                json={'content': 'Solved with malloc'}).get_json()['reply']['id']
+        assert self._search(student, test_course, 'malloc')['total'] == 1
+        student.delete(f'/api/forum/reply/{reply_id}')
+        assert self._search(student, test_course, 'malloc')['total'] == 0
+
+        # 软删除后的替换文本不会被搜到
+        student.delete(f'/api/forum/post/{post_id}')
+        assert self._search(student, test_course, 'arrays')['total'] == 0
+        assert self._search(student, test_course, 'deleted')['total'] == 0
+        # 标题和回复也不再能搜到已删除的帖子（短词走LIKE回退）
+        assert self._search(student, test_course, 'Homework')['total'] == 0
+        assert self._search(student, test_course, 'Ho')['total'] == 0
+        with app.app_context():
+            from src.utils.forum_search import rebuild_search_index, search_forum
+            db.session.add(ForumReply(post_id=post_id, user_id=test_users['teacher_id'], content='Homework help'))
+            db.session.commit()
+            assert search_forum(test_course, 'Homework')[1] == 0
+            rebuild_search_index([test_course])
+            db.session.commit()
+            assert search_forum(test_course, 'Homework')[1] == 0
+
+    def test_search_escapes_content_and_supports_short_terms(self, app, auth_client, test_course, test_users):
+        with app.app_context():
+            self._add_post(test_course, test_users['teacher_id'], '期中考试', '<b>AI</b> 相关的题目')
+        student = auth_client['student1']
+
+        data = self._search(student, test_course, '考试')
+        assert data['total'] == 1
+        assert data['posts'][0]['search']['title_highlight'] == '期中<mark>考试</mark>'
+
+        data = self._search(student, test_course, 'AI')
+        assert data['total'] == 1
+        assert '&lt;b&gt;<mark>AI</mark>&lt;/b&gt;' in data['posts'][0]['search']['snippet']
+
+    def test_search_finds_chinese_words_inside_sentences(self, app, auth_client, test_course, test_users):
+        from src.utils.forum_search import use_like_search
+        with app.app_context():
+            post_id = self._add_post(test_course, test_users['teacher_id'], '第三周复习二分查找算法',
+                                     '这周我们讨论递归函数的终止条件和时间复杂度')
+        student = auth_client['student1']
+        for q in ('二分查找', '递归函数', '时间复杂度 递归'):
+            data = self._search(student, test_course, q)
+            assert [p['id'] for p in data['posts']] == [post_id], q
+        assert self._search(student, test_course, '二分查找')['posts'][0]['search']['title_highlight'] == \
+            '第三周复习<mark>二分查找</mark>算法'
+
+        # PostgreSQL 的 'simple' 分词不切分中文，含中文的搜索词走 ILIKE 子串匹配
+        assert use_like_search('postgresql', ['二分查找'])
+        assert use_like_search('postgresql', ['recursion', '递归'])
+        assert not use_like_search('postgresql', ['recursion', 'AI'])
+
+    def test_search_pagination(self, app, auth_client, test_course, test_users):
+        with app.app_context():
+            for i in range(5):
+                self._add_post(test_course, test_users['teacher_id'], f'Topic {i}', 'shared keyword')
+        student = auth_client['student1']
+
+        first = self._search(student, test_course, 'keyword', per_page=2)
+        assert first['total'] == 5 and first['pages'] == 3 and first['has_next']
+        last = self._search(student, test_course, 'keyword', per_page=2, page=3)
+        assert len(last['posts']) == 1 and not last['has_next']
+        beyond = self._search(student, test_course, 'keyword', per_page=2, page=9)
+        assert beyond['posts'] == [] and beyond['total'] == 5
+        seen = {p['id'] for page in (1, 2, 3)
+                for p in self._search(student, test_course, 'keyword', per_page=2, page=page)['posts']}
+        assert len(seen) == 5
+
+    def test_search_is_scoped_to_course_and_rebuildable(self, app, auth_client, test_course, test_users):
+        from src.utils.forum_search import rebuild_search_index, search_forum
+        with app.app_context():
+            other = Course(course_code='OTHER101', course_name='Other', teacher_id=test_users['teacher_id'],
+                           semester='Fall', academic_year='2024-2025')
+            db.session.add(other)
+            db.session.commit()
+            self._add_post(other.id, test_users['teacher_id'], 'Graphs', 'Dijkstra')
+            self._add_post(test_course, test_users['teacher_id'], 'Trees', 'Dijkstra too')
+
+            db.session.execute(db.text('DELETE FROM forum_search_index'))
+            assert search_forum(test_course, 'Dijkstra')[1] == 0
+            assert rebuild_search_index() == 2
+            db.session.commit()
+            hits, total = search_forum(test_course, 'Dijkstra')
+            assert total == 1
+
+        assert self._search(auth_client['student1'], test_course, 'Dijkstra')['posts'][0]['title'] == 'Trees'